@@ -0,0 +1,156 @@
+"""
+Recording fakes for the Discord objects an interaction touches.
+
+Every outgoing Discord API call (responses, follow-ups, message edits,
+channel sends, DMs and user fetches) is counted in a ``CallLog`` against
+the operation running in the current context, so a load test can report
+Discord calls per operation. Work that no operation started, such as the
+refresh hub's edit loop, is counted under ``background``.
+"""
+import asyncio
+import itertools
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from benchmarks.stubs import StubBot
+
+current_op: ContextVar[str] = ContextVar("current_op", default="background")
+
+_ids = itertools.count(10 ** 15)
+
+
+class CallLog:
+    def __init__(self):
+        self.counts: Counter = Counter()  # (operation, call) -> count
+
+    def record(self, call: str):
+        self.counts[(current_op.get(), call)] += 1
+
+    def for_op(self, op: str) -> Counter:
+        return Counter({call: count for (name, call), count in self.counts.items() if name == op})
+
+
+class FakeRole:
+    __slots__ = ('id',)
+
+    def __init__(self, role_id: int):
+        self.id = role_id
+
+
+class FakePermissions:
+    administrator = False
+
+
+class FakeMember:
+    def __init__(self, user_id: int, calls: CallLog, role_ids=()):
+        self.id = user_id
+        self.name = f"member{user_id}"
+        self.roles = [FakeRole(role_id) for role_id in role_ids]
+        self.guild_permissions = FakePermissions()
+        self.calls = calls
+
+    async def send(self, *args, **kwargs):
+        self.calls.record("dm")
+
+
+class FakeChannel:
+    def __init__(self, calls: CallLog):
+        self.id = next(_ids)
+        self.calls = calls
+
+    async def send(self, *args, **kwargs):
+        self.calls.record("channel.send")
+        return FakeMessage(self)
+
+
+class FakeMessage:
+    def __init__(self, channel: FakeChannel):
+        self.id = next(_ids)
+        self.channel = channel
+
+    async def edit(self, **kwargs):
+        self.channel.calls.record("message.edit")
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.modal = None
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def _respond(self, call: str):
+        if self._done:
+            raise RuntimeError("This interaction has already been responded to before")
+        self._done = True
+        self.interaction.calls.record(call)
+
+    async def send_message(self, content=None, **kwargs):
+        self._respond("response.send_message")
+        self.interaction.messages.append(content)
+
+    async def send_modal(self, modal):
+        self._respond("response.send_modal")
+        self.modal = modal
+
+    async def defer(self, *args, **kwargs):
+        self._respond("response.defer")
+
+    async def edit_message(self, **kwargs):
+        self._respond("response.edit_message")
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, wait: bool = False, **kwargs):
+        self.interaction.calls.record("followup.send")
+        self.interaction.messages.append(content)
+        return FakeMessage(self.interaction.channel) if wait else None
+
+
+class FakeInteraction:
+    """One slash command, button click or modal submit from ``user`` in ``channel``."""
+
+    def __init__(self, client, user: FakeMember, channel: FakeChannel, message: Optional[FakeMessage] = None, custom_id: Optional[str] = None):
+        self.id = next(_ids)
+        self.client = client
+        self.user = user
+        self.channel = channel
+        self.message = message or FakeMessage(channel)
+        self.data = {'custom_id': custom_id} if custom_id else {}
+        self.calls = channel.calls
+        self.messages = []  # Content of every reply, in order
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+
+class RecordingBot(StubBot):
+    """Stub bot backed by a real points manager that routes dispatched events to the loaded cog's listeners."""
+
+    def __init__(self, points_manager, calls: CallLog):
+        super().__init__()
+        self.points_manager = points_manager
+        self.calls = calls
+        self.members = {}
+        self.user = FakeMember(0, calls)
+        self._listener_tasks = set()
+
+    def get_user(self, user_id: int):
+        return self.members.get(user_id)
+
+    async def fetch_user(self, user_id: int) -> FakeMember:
+        self.calls.record("fetch_user")
+        return self.members.setdefault(user_id, FakeMember(user_id, self.calls))
+
+    def dispatch(self, event: str, *args, **kwargs):
+        for cog in self.cogs.values():
+            listener = getattr(cog, f"on_{event}", None)
+            if listener is not None:
+                task = asyncio.create_task(listener(*args, **kwargs))
+                self._listener_tasks.add(task)
+                task.add_done_callback(self._listener_tasks.discard)
@@ -0,0 +1,172 @@
+"""
+A DRIP API look-alike served from localhost, for load tests that exercise
+the real ``PointsManagerSingleton`` (connection pool, retries, breaker and
+balance cache) without a network.
+"""
+import asyncio
+import random
+import threading
+from collections import Counter, deque
+from typing import Deque, Dict, Optional, Union
+
+from aiohttp import web
+
+INITIAL_BALANCE = 1_000_000
+TIMEOUT = "timeout"
+
+Fault = Union[int, str, tuple]
+
+
+class FakeDripServer:
+    """
+    In-memory DRIP realm behind an aiohttp server on 127.0.0.1.
+
+    It serves the balance, ``tokenBalance`` and ``transfer`` endpoints the
+    bot uses, honours ``Idempotency-Key`` and can add ``latency`` (seconds)
+    to every request. Faults are injected at random, as a fraction of
+    requests that fail with 503 (``error_rate``), are rate limited with 429
+    and ``Retry-After: retry_after`` (``rate_limit_rate``) or never answer
+    (``timeout_rate``), or in order with ``inject``. The server runs on its
+    own thread and event loop so its work does not count against the bot's
+    loop. ``requests`` counts every request by endpoint, retries included.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        initial_balance: int = INITIAL_BALANCE,
+        seed: int = 1,
+        rate_limit_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        retry_after: float = 1.0
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.retry_after = retry_after
+        self.faults: Deque[Fault] = deque()
+        self.initial_balance = initial_balance
+        self.realm_id = "loadtest"
+        self.balances: Dict[int, int] = {}
+        self.requests: Counter = Counter()
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._seen_keys = set()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._ready = threading.Event()
+        self.port = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),), name="fake-drip", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+            self._thread.join()
+            self._loop = None
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        app = web.Application()
+        prefix = "/api/v4/realms/{realm}/members/{user_id}"
+        app.router.add_get(prefix, self._get_member)
+        app.router.add_patch(prefix + "/tokenBalance", self._token_balance)
+        app.router.add_patch(prefix + "/transfer", self._transfer)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        self.port = runner.addresses[0][1]
+        self._ready.set()
+        await self._stopped.wait()
+        await runner.cleanup()
+
+    def inject(self, *faults: Fault):
+        """
+        Fail the next requests in order, one fault each, before any random
+        ones: an HTTP status, ``"timeout"`` (never answer), or a
+        ``(status, retry_after)`` pair that also sends a ``Retry-After`` header.
+        """
+        self.faults.extend(faults)
+
+    def _next_fault(self) -> Optional[Fault]:
+        if self.faults:
+            return self.faults.popleft()
+        roll = self._rng.random()
+        for fault, rate in ((503, self.error_rate), ((429, self.retry_after), self.rate_limit_rate), (TIMEOUT, self.timeout_rate)):
+            if roll < rate:
+                return fault
+            roll -= rate
+        return None
+
+    async def _admit(self, endpoint: str) -> Optional[web.Response]:
+        # Count, delay and maybe fail a request; returns the failure response if it failed
+        self.requests[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        fault = self._next_fault()
+        if fault is None:
+            return None
+        self.errors += 1
+        if fault == TIMEOUT:
+            # Held open until the server stops; the client gives up first and retries as a new request
+            await self._stopped.wait()
+        status, retry_after = fault if isinstance(fault, tuple) else (fault, None)
+        headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+        return web.json_response({"error": "injected failure"}, status=status, headers=headers)
+
+    def _balance(self, user_id: int) -> int:
+        return self.balances.setdefault(user_id, self.initial_balance)
+
+    def _replayed(self, request: web.Request) -> bool:
+        key = request.headers.get("Idempotency-Key")
+        if key is None:
+            return False
+        if key in self._seen_keys:
+            return True
+        self._seen_keys.add(key)
+        return False
+
+    async def _get_member(self, request: web.Request) -> web.Response:
+        failure = await self._admit("get_balance")
+        if failure:
+            return failure
+        user_id = int(request.match_info["user_id"])
+        return web.json_response({"id": user_id, "balances": {"points": self._balance(user_id)}})
+
+    async def _token_balance(self, request: web.Request) -> web.Response:
+        failure = await self._admit("token_balance")
+        if failure:
+            return failure
+        user_id = int(request.match_info["user_id"])
+        tokens = int((await request.json())["tokens"])
+        if not self._replayed(request):
+            if self._balance(user_id) + tokens < 0:
+                return web.json_response({"error": "insufficient balance"}, status=400)
+            self.balances[user_id] += tokens
+        return web.json_response({"balance": self._balance(user_id)})
+
+    async def _transfer(self, request: web.Request) -> web.Response:
+        failure = await self._admit("transfer")
+        if failure:
+            return failure
+        user_id = int(request.match_info["user_id"])
+        body = await request.json()
+        recipient, tokens = int(body["recipientId"]), int(body["tokens"])
+        if not self._replayed(request):
+            if self._balance(user_id) < tokens:
+                return web.json_response({"error": "insufficient balance"}, status=400)
+            self.balances[user_id] -= tokens
+            self.balances[recipient] = self._balance(recipient) + tokens
+        return web.json_response({"balance": self._balance(user_id)})
@@ -0,0 +1,459 @@
+"""
+Offline load generator that drives the real Economy cog with synthetic interactions.
+
+Traffic is an open-loop Poisson stream of ``--rate`` operations per
+wall-clock second. Scenario time runs on a virtual clock ``--speed`` times
+faster than the wall clock, which shortens the run but leaves the arrival
+rate alone. The cog sees the same clock through ``datetime.utcnow()``, so
+markets close and deadlines fire on scenario time. Each operation goes through the same
+entry points Discord would call:
+
+    create   /create_prediction
+    bet      a bet button click, then the amount modal's submit
+    list     /list_predictions
+    vote     a resolution vote button click on a market whose betting has ended
+
+Discord is replaced by recording fakes (``benchmarks/fake_discord.py``) and
+DRIP by a local HTTP server (``benchmarks/fake_drip.py``) that the real
+points manager talks to, so the run needs no network. The report gives
+throughput, p50/p99 interaction latency and Discord and DRIP calls per
+operation, next to the offered and achieved rates: a harness that cannot
+keep up with ``--rate`` shows its backlog as latency.
+
+    python -m benchmarks.loadgen
+    python -m benchmarks.loadgen --users 500 --rate 50 --close-after 2 --mix bet=90,list=5,vote=5
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+import types
+from collections import Counter
+from typing import Dict, List, Optional
+
+import discord
+from tabulate import tabulate
+
+from benchmarks.fake_discord import CallLog, FakeChannel, FakeInteraction, FakeMember, FakeMessage, RecordingBot, current_op
+from benchmarks.fake_drip import FakeDripServer
+from benchmarks.run import percentile
+from benchmarks.stubs import load_economy
+from helpers.Logging import setup_logging
+from helpers.LoopWatchdog import LOOP_LAG, LoopWatchdog
+from helpers.Tracing import TRACER
+
+DEFAULT_MIX = "bet=70,list=20,vote=8,create=2"
+CATEGORIES = ("Sports", "Crypto", "Community", "Weather")
+CHANNELS = 5
+RESOLVER_POOL = 30
+BACKLOG_SHARE = 0.95  # Achieved under this share of --rate means the latencies include queueing in the harness
+STALLS_SHOWN = 5  # Longest event loop stalls listed in the report
+# Modules whose datetime.utcnow() follows the virtual clock
+CLOCKED_MODULES = ("cogs.economy", "helpers.DeadlineScheduler", "helpers.MarketRegistry")
+
+
+class VirtualClock:
+    """
+    Scenario time running ``speed`` times faster than the wall clock.
+
+    ``install`` points ``datetime.utcnow()`` in the market code at this
+    clock and shortens the deadline scheduler's longest sleep to one
+    scenario second, so deadlines fire on scenario time.
+    """
+
+    def __init__(self, speed: float):
+        self.speed = speed
+        self.origin = datetime.datetime.utcnow()
+        self._start = time.monotonic()
+        self._patched = []
+
+    def elapsed(self) -> float:
+        """Scenario seconds since the clock started."""
+        return (time.monotonic() - self._start) * self.speed
+
+    def advance(self, scenario_seconds: float):
+        """Jump the clock forward; deadlines that are now past fire on the scheduler's next wake-up."""
+        self._start -= scenario_seconds / self.speed
+
+    def utcnow(self) -> datetime.datetime:
+        return self.origin + datetime.timedelta(seconds=self.elapsed())
+
+    async def sleep_until(self, scenario_seconds: float):
+        delay = (scenario_seconds - self.elapsed()) / self.speed
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def install(self):
+        clock = self
+
+        class VirtualDatetime(datetime.datetime):
+            @classmethod
+            def utcnow(cls):
+                return clock.utcnow()
+
+        virtual = types.ModuleType("datetime")
+        virtual.__dict__.update(vars(datetime))
+        virtual.datetime = VirtualDatetime
+        for name in CLOCKED_MODULES:
+            module = sys.modules[name]
+            self._patched.append((module, "datetime", module.datetime))
+            module.datetime = virtual
+        scheduler = sys.modules["helpers.DeadlineScheduler"]
+        self._patched.append((scheduler, "MAX_SLEEP_SECONDS", scheduler.MAX_SLEEP_SECONDS))
+        scheduler.MAX_SLEEP_SECONDS = 1.0 / self.speed
+
+    def uninstall(self):
+        for module, name, value in reversed(self._patched):
+            setattr(module, name, value)
+        self._patched.clear()
+
+
+class LoadTest:
+    """One scenario run: the cog, its fakes, the traffic and what was measured."""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.calls = CallLog()
+        self.latencies: Dict[str, List[float]] = {}
+        self.outcomes: Dict[str, Counter] = {}
+        self.hot_market = None
+        self.created = 0
+        self.lead = 0.0
+        self._tasks = set()
+
+    async def run(self) -> dict:
+        from cogs.economy import RESOLVER_ROLE_IDS
+        from helpers.SimplePointsManager import PointsManagerSingleton
+
+        args = self.args
+        drip = FakeDripServer(
+            latency=args.drip_latency / 1000,
+            error_rate=args.drip_errors,
+            rate_limit_rate=args.drip_429s,
+            timeout_rate=args.drip_timeouts,
+            seed=args.seed
+        )
+        drip.start()
+        points_manager = PointsManagerSingleton(base_url=drip.base_url, api_key="loadtest", realm_id=drip.realm_id)
+        self._count_drip_calls(points_manager)
+
+        self.bot = RecordingBot(points_manager, self.calls)
+        self.channels = [FakeChannel(self.calls) for _ in range(CHANNELS)]
+        self.bettors = [self._member(user_id) for user_id in range(1, args.users + 1)]
+        resolver_role = next(iter(RESOLVER_ROLE_IDS))
+        self.resolvers = [self._member(10 ** 9 + i, [resolver_role]) for i in range(RESOLVER_POOL)]
+
+        self.clock = VirtualClock(args.speed)
+        with tempfile.TemporaryDirectory(prefix="loadgen-") as directory:
+            self.cog = await load_economy(directory, self.bot)
+            if args.trace:
+                # Keep every interaction; the buffer then holds the last TRACE_CAPACITY of them
+                TRACER.configure(sample_rate=1.0)
+            self.clock.install()
+            self.watchdog = LoopWatchdog()
+            self.watchdog.start()
+            try:
+                await self._setup()
+                started = time.perf_counter()
+                virtual_started = self.clock.elapsed()
+                await self._drive()
+                elapsed = time.perf_counter() - started
+                virtual_elapsed = self.clock.elapsed() - virtual_started
+                await self._drain()
+            finally:
+                await self.watchdog.stop()
+                self.clock.uninstall()
+                await self.cog.cog_unload()
+                await points_manager.cleanup()
+                drip.stop()
+        return self._results(elapsed, virtual_elapsed, drip, points_manager)
+
+    def _member(self, user_id: int, role_ids=()) -> FakeMember:
+        member = FakeMember(user_id, self.calls, role_ids)
+        self.bot.members[user_id] = member
+        return member
+
+    def _count_drip_calls(self, points_manager):
+        # Counted per logical call in the caller's context; the server's counts include retries
+        request = points_manager._request
+
+        async def counted(method, path, *args, **kwargs):
+            endpoint = path.rsplit("/", 1)[-1]
+            self.calls.record(f"drip.{endpoint if endpoint in ('tokenBalance', 'transfer') else 'balance'}")
+            return await request(method, path, *args, **kwargs)
+
+        points_manager._request = counted
+
+    def _interaction(self, user: FakeMember, custom_id: Optional[str] = None, message: Optional[FakeMessage] = None) -> FakeInteraction:
+        return FakeInteraction(self.bot, user, self.rng.choice(self.channels), message, custom_id)
+
+    async def _setup(self):
+        # The market everyone piles into while it closes, plus a spread of others
+        token = current_op.set("setup")
+        try:
+            await self._create(self.args.close_after)
+            self.hot_market = max(self.cog.markets, key=lambda prediction: prediction.id)
+            for i in range(self.args.markets):
+                await self._create(1 + i % max(1, int(self.args.duration // 60)))
+        finally:
+            current_op.reset(token)
+        # Markets last whole minutes, so in a short run age them until the first ones close a
+        # quarter of the way in; otherwise nothing would reach resolution voting
+        self.lead = max(0.0, 60 * min(1, self.args.close_after) - self.args.duration / 4)
+        self.clock.advance(self.lead)
+
+    async def _drive(self):
+        weights = dict(
+            (name, float(weight))
+            for name, weight in (part.split("=") for part in self.args.mix.split(","))
+        )
+        unknown = set(weights) - set(OPERATIONS)
+        if unknown:
+            raise SystemExit(f"unknown operations in --mix: {', '.join(sorted(unknown))}")
+        names = list(weights)
+
+        # --rate is per wall-clock second, so in scenario time arrivals are --speed times sparser
+        rate = self.args.rate / self.args.speed
+        now = self.clock.elapsed()
+        end = now + self.args.duration
+        while True:
+            now += self.rng.expovariate(rate)
+            if now >= end:
+                break
+            await self.clock.sleep_until(now)
+            op = self.rng.choices(names, [weights[name] for name in names])[0]
+            task = asyncio.create_task(self._run_op(op))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        await asyncio.gather(*self._tasks)
+
+    async def _run_op(self, op: str):
+        current_op.set(op)
+        outcomes = self.outcomes.setdefault(op, Counter())
+        started = time.perf_counter()
+        try:
+            outcome = await OPERATIONS[op](self)
+        except Exception as e:
+            outcome = f"error: {type(e).__name__}"
+        if outcome != "skipped":
+            self.latencies.setdefault(op, []).append((time.perf_counter() - started) * 1000)
+        outcomes[outcome or "ok"] += 1
+
+    async def _drain(self):
+        """Wait (up to --drain seconds) for settlement credits and queued panel edits to go out."""
+        deadline = time.monotonic() + self.args.drain
+        while time.monotonic() < deadline:
+            progress = self.cog.settlement.progress.values()
+            if self.cog.refresh_hub.queued_edits == 0 and all(
+                p['credited'] + p['failed'] >= p['total'] for p in progress
+            ):
+                return
+            await asyncio.sleep(0.05)
+
+    async def _create(self, minutes: int):
+        self.created += 1
+        interaction = self._interaction(self.rng.choice(self.bettors))
+        await self.cog.create_prediction.callback(
+            self.cog,
+            interaction,
+            question=f"Load test market {self.created}?",
+            options="Yes,No",
+            duration=f",,{minutes}",
+            category=self.rng.choice(CATEGORIES)
+        )
+
+    async def _click(self, custom_id: str, interaction: FakeInteraction):
+        # What discord.py's view store does for a component whose custom_id matches a DynamicItem template
+        for cls in self.bot.dynamic_items:
+            match = cls.__discord_ui_compiled_template__.fullmatch(custom_id)
+            if match:
+                item = await cls.from_custom_id(interaction, discord.ui.Button(label="option", custom_id=custom_id), match)
+                await item.callback(interaction)
+                return
+        raise LookupError(f"no component handles {custom_id}")
+
+    async def op_create(self):
+        await self._create(self.rng.randint(1, max(1, int(self.args.duration // 60))))
+
+    async def op_bet(self):
+        from cogs.economy import ACTIVE, market_custom_id
+
+        hot = self.hot_market
+        if hot is not None and hot.end_time > self.clock.utcnow() and self.rng.random() < self.args.hot_share:
+            prediction = hot
+        else:
+            active = self.cog.markets.with_status(ACTIVE)
+            if not active:
+                return "skipped"
+            prediction = self.rng.choice(active)
+        user = self.rng.choice(self.bettors)
+        option_index = self.rng.randrange(len(prediction.options))
+
+        click = self._interaction(user, market_custom_id("bet", prediction.id, option_index))
+        await self._click(click.data['custom_id'], click)
+        modal = click.response.modal
+        if modal is None:
+            return "rejected"
+        modal.amount._value = str(self.rng.randint(10, 500))
+        await modal.on_submit(self._interaction(user))
+
+    async def op_list(self):
+        await self.cog.list_predictions.callback(self.cog, self._interaction(self.rng.choice(self.bettors)))
+
+    async def op_vote(self):
+        from cogs.economy import PENDING, market_custom_id
+
+        pending = self.cog.markets.with_status(PENDING)
+        if not pending:
+            return "skipped"
+        prediction = self.rng.choice(pending)
+        # Most resolvers agree, so markets actually reach the vote threshold
+        option_index = 0 if self.rng.random() < 0.8 else self.rng.randrange(len(prediction.options))
+        interaction = self._interaction(self.rng.choice(self.resolvers), market_custom_id("vote", prediction.id, option_index))
+        await self._click(interaction.data['custom_id'], interaction)
+
+    def _results(self, elapsed: float, virtual_elapsed: float, drip: FakeDripServer, points_manager) -> dict:
+        operations = {}
+        for op in sorted(set(self.outcomes) | {"background", "setup"}):
+            latencies = sorted(self.latencies.get(op, []))
+            calls = self.calls.for_op(op)
+            count = sum(self.outcomes.get(op, Counter()).values())
+            operations[op] = {
+                'count': count,
+                'per_second': round(count / elapsed, 3) if elapsed and op in self.outcomes else None,
+                'outcomes': dict(self.outcomes.get(op, {})),
+                'p50_ms': round(percentile(latencies, 50), 3) if latencies else None,
+                'p99_ms': round(percentile(latencies, 99), 3) if latencies else None,
+                'max_ms': round(latencies[-1], 3) if latencies else None,
+                'calls': dict(calls),
+                'discord_per_op': round(sum(n for call, n in calls.items() if not call.startswith("drip.")) / count, 3) if count else None,
+                'drip_per_op': round(sum(n for call, n in calls.items() if call.startswith("drip.")) / count, 3) if count else None,
+            }
+        completed = sum(sum(outcomes.values()) for outcomes in self.outcomes.values())
+        return {
+            'config': vars(self.args),
+            'wall_seconds': round(elapsed, 3),
+            'scenario_seconds': round(virtual_elapsed, 3),
+            'scenario_lead_seconds': self.lead,
+            'operations_completed': completed,
+            'offered_per_second': self.args.rate,
+            'throughput_per_second': round(completed / elapsed, 3) if elapsed else None,
+            'operations': operations,
+            'drip_server': {'requests': dict(drip.requests), 'injected_errors': drip.errors},
+            'dead_letters': len(points_manager.dead_letters),
+            'markets': len(self.cog.markets),
+            'event_loop': {
+                'max_lag_ms': round(self.watchdog.max_lag * 1000, 3),
+                'p99_lag_ms': LOOP_LAG.labels().quantile(0.99) * 1000,
+                'stall_threshold_ms': self.watchdog.threshold * 1000,
+                'stalls': [stall.to_dict() for stall in self.watchdog.stalls],
+            },
+        }
+
+
+OPERATIONS = {
+    'create': LoadTest.op_create,
+    'bet': LoadTest.op_bet,
+    'list': LoadTest.op_list,
+    'vote': LoadTest.op_vote,
+}
+
+
+def report(results: dict) -> str:
+    achieved, offered = results['throughput_per_second'], results['offered_per_second']
+    if achieved is not None and achieved < offered * BACKLOG_SHARE:
+        lag_note = "The harness fell behind the offered rate; latencies below include that backlog.\n"
+    else:
+        lag_note = ""
+    rows = []
+    for op, stats in results['operations'].items():
+        if not stats['count'] and not stats['calls']:
+            continue
+        rows.append([
+            op,
+            stats['count'],
+            ", ".join(f"{name} {n}" for name, n in sorted(stats['outcomes'].items())),
+            stats['per_second'],
+            stats['p50_ms'],
+            stats['p99_ms'],
+            stats['discord_per_op'],
+            stats['drip_per_op'],
+            ", ".join(f"{call} {n}" for call, n in sorted(stats['calls'].items())),
+        ])
+    table = tabulate(
+        rows,
+        headers=["operation", "count", "outcomes", "ops/s", "p50 ms", "p99 ms", "Discord/op", "DRIP/op", "calls"],
+        floatfmt=",.2f",
+        missingval="-"
+    )
+    return (
+        f"{results['operations_completed']:,} operations in {results['wall_seconds']:.1f}s "
+        f"({results['scenario_seconds']:.0f}s scenario time): {results['throughput_per_second']:,.1f} ops/s achieved "
+        f"of {results['offered_per_second']:,.1f} offered\n"
+        f"{lag_note}\n"
+        f"{table}\n\n"
+        f"DRIP server requests (retries included): {results['drip_server']['requests']}, "
+        f"injected errors: {results['drip_server']['injected_errors']}, dead letters: {results['dead_letters']}\n"
+        f"{loop_report(results['event_loop'])}"
+    )
+
+
+def loop_report(event_loop: dict) -> str:
+    lines = [
+        f"Event loop lag: max {event_loop['max_lag_ms']:,.1f} ms, p99 <= {event_loop['p99_lag_ms']:g} ms, "
+        f"{len(event_loop['stalls'])} stalls over {event_loop['stall_threshold_ms']:g} ms"
+    ]
+    for stall in sorted(event_loop['stalls'], key=lambda stall: stall['duration'], reverse=True)[:STALLS_SHOWN]:
+        # The innermost frame is the code that was running when the loop was caught blocked
+        where = stall['stack'].rsplit("File ", 1)[-1].split("\n", 1)[0] if stall['stack'] else "not caught"
+        lines.append(f"  {stall['duration'] * 1000:,.0f} ms in {stall['task'] or 'a callback'}: {where}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation weights, e.g. bet=70,list=20,vote=8,create=2")
+    parser.add_argument("--rate", type=float, default=50, help="operations per wall-clock second, whatever --speed is")
+    parser.add_argument("--duration", type=float, default=300, help="scenario seconds of traffic")
+    parser.add_argument("--speed", type=float, default=10, help="scenario seconds per wall-clock second")
+    parser.add_argument("--users", type=int, default=500, help="distinct bettors")
+    parser.add_argument("--markets", type=int, default=20, help="markets created before traffic starts")
+    parser.add_argument("--close-after", type=int, default=2, help="scenario minutes until the hot market closes")
+    parser.add_argument("--hot-share", type=float, default=0.5, help="share of bets aimed at the hot market while it is open")
+    parser.add_argument("--drip-latency", type=float, default=20, help="milliseconds added to every DRIP request")
+    parser.add_argument("--drip-errors", type=float, default=0.0, help="fraction of DRIP requests that fail with 503")
+    parser.add_argument("--drip-429s", type=float, default=0.0, help="fraction of DRIP requests rate limited with 429 and Retry-After: 1")
+    parser.add_argument("--drip-timeouts", type=float, default=0.0, help="fraction of DRIP requests that never get an answer")
+    parser.add_argument("--drain", type=float, default=30, help="wall-clock seconds to wait for settlement after traffic stops")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    parser.add_argument("--trace", help="write a Chrome trace of the last interactions to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's own output")
+    args = parser.parse_args(argv)
+
+    if args.verbose:
+        listener = setup_logging(level="INFO", log_file=None)
+    else:
+        logging.disable(logging.CRITICAL)
+    try:
+        results = asyncio.run(LoadTest(args).run())
+    finally:
+        if args.verbose:
+            listener.stop()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.trace:
+        with open(args.trace, "w") as f:
+            f.write(TRACER.export_chrome())
+    print(report(results))
+
+
+if __name__ == "__main__":
+    main()
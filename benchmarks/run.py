@@ -0,0 +1,321 @@
+"""
+Offline benchmarks for the market engine, list rendering and settlement.
+
+Every size gets a fresh Economy cog with its own market store and event log
+in a temporary directory, and stubbed Discord and DRIP objects (see
+``benchmarks/stubs.py``), so runs need no token or network and are
+comparable from one machine state to the next.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 10,1000 --only place_bet,get_current_prices
+    python -m benchmarks.run --compare bench-results/20260101T000000Z.json
+
+Results are written as JSON (one record per benchmark and size, times in
+microseconds per operation) and summarized as a table; ``--compare`` adds
+the change against an earlier results file.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from tabulate import tabulate
+
+from benchmarks.stubs import load_economy
+
+DEFAULT_SIZES = (10, 1_000, 100_000)
+SEED_BATCH = 1000  # Bets per apply_bets call while seeding a market
+LIST_MARKETS = 50  # Markets in the /list_predictions benchmarks; the bettors are spread across them
+RESULTS_DIR = "bench-results"
+
+BENCHMARKS: Dict[str, Callable] = {}
+
+
+def benchmark(name: str):
+    """Register ``fn(bench, bettors)``, which returns (elapsed_ns, ops) samples."""
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+class Bench:
+    """One cog loaded with markets of a given size, created on first use and shared between benchmarks."""
+
+    def __init__(self, cog, seed: int, samples: int):
+        self.cog = cog
+        self.rng = random.Random(seed)
+        self.samples = samples
+        self._markets = {}
+        self._next_user = 1_000_000
+
+    def new_user(self) -> int:
+        self._next_user += 1
+        return self._next_user
+
+    async def market(self, name: str, bettors: int, options=("Yes", "No")):
+        """A market called ``name`` with ``bettors`` distinct bettors, created and seeded once."""
+        from cogs.economy import Prediction
+
+        if name in self._markets:
+            return self._markets[name]
+        cog = self.cog
+        end_time = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+        prediction = Prediction(f"Benchmark market {name}?", end_time, list(options), 1, cog, "Benchmarks")
+        prediction.id = await cog.store.insert_market(prediction)
+        cog.events.append(
+            'create',
+            market=prediction.id,
+            question=prediction.question,
+            category=prediction.category,
+            creator=1,
+            end_time=end_time.isoformat(),
+            options=prediction.options,
+            liquidity=prediction.liquidity
+        )
+        cog.markets.add(prediction)
+        prediction.touch()
+
+        for start in range(0, bettors, SEED_BATCH):
+            prediction.apply_bets([
+                (self.new_user(), self.rng.choice(prediction.options), self.rng.randint(10, 1000))
+                for _ in range(min(SEED_BATCH, bettors - start))
+            ])
+        # Get the seeding writes out of the way so they don't land in a timed section
+        await cog.store.flush()
+        await cog.events.flush()
+        self._markets[name] = prediction
+        return prediction
+
+    async def settled(self, market_id: int):
+        """Wait until every settlement row of a market has been credited (DMs are rate limited and not waited for)."""
+        while True:
+            progress = self.cog.settlement.progress.get(market_id)
+            if progress and progress['credited'] + progress['failed'] >= progress['total']:
+                return
+            await asyncio.sleep(0)
+
+
+def timed_calls(fn: Callable[[], object], samples: int, calls: int) -> List[Tuple[int, int]]:
+    """Time ``samples`` rounds of ``calls`` synchronous calls each, after one untimed round."""
+    for _ in range(calls):
+        fn()
+    results = []
+    for _ in range(samples):
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            fn()
+        results.append((time.perf_counter_ns() - start, calls))
+    return results
+
+
+@benchmark("calculate_shares_for_points")
+async def bench_calculate_shares(bench: Bench, bettors: int):
+    prediction = await bench.market("main", bettors)
+    return timed_calls(lambda: prediction.calculate_shares_for_points("Yes", 250), bench.samples, 200)
+
+
+@benchmark("get_current_prices")
+async def bench_current_prices(bench: Bench, bettors: int):
+    prediction = await bench.market("main", bettors)
+    return timed_calls(lambda: prediction.get_current_prices(100), bench.samples, 200)
+
+
+@benchmark("place_bet")
+async def bench_place_bet(bench: Bench, bettors: int):
+    # Bursts of concurrent bets from new users, the way a busy market sees them
+    prediction = await bench.market("main", bettors)
+    burst = 50
+    results = []
+    for _ in range(bench.samples):
+        bets = [(bench.new_user(), bench.rng.choice(prediction.options), bench.rng.randint(10, 1000)) for _ in range(burst)]
+        start = time.perf_counter_ns()
+        await asyncio.gather(*(prediction.place_bet(*bet) for bet in bets))
+        results.append((time.perf_counter_ns() - start, burst))
+    return results
+
+
+async def list_markets(bench: Bench, bettors: int):
+    markets = [await bench.market("main", bettors)]
+    for i in range(1, LIST_MARKETS):
+        markets.append(await bench.market(f"list-{i}", max(1, bettors // LIST_MARKETS)))
+    return markets
+
+
+async def render_list_page(cog):
+    from cogs.economy import MarketListPanel
+
+    start = time.perf_counter_ns()
+    await MarketListPanel(cog).render()
+    return time.perf_counter_ns() - start
+
+
+@benchmark("list_render_cold")
+async def bench_list_cold(bench: Bench, bettors: int):
+    # Every market field rendered and every page packed from scratch, as after a restart
+    from cogs.economy import MarketListing
+    from helpers.RenderCache import RenderCache
+
+    await list_markets(bench, bettors)
+    results = []
+    for _ in range(bench.samples):
+        bench.cog.listing = MarketListing(bench.cog)
+        bench.cog.render_cache = RenderCache()
+        results.append((await render_list_page(bench.cog), 1))
+    return results
+
+
+@benchmark("list_render_after_bet")
+async def bench_list_after_bet(bench: Bench, bettors: int):
+    # One market changed since the last render
+    markets = await list_markets(bench, bettors)
+    await render_list_page(bench.cog)
+    results = []
+    for _ in range(bench.samples):
+        prediction = bench.rng.choice(markets)
+        prediction.apply_bets([(bench.new_user(), prediction.options[0], 100)])
+        results.append((await render_list_page(bench.cog), 1))
+    return results
+
+
+@benchmark("list_render_cached")
+async def bench_list_cached(bench: Bench, bettors: int):
+    await list_markets(bench, bettors)
+    await render_list_page(bench.cog)
+    return [(await render_list_page(bench.cog), 1) for _ in range(bench.samples)]
+
+
+@benchmark("settle_resolve")
+async def bench_settle_resolve(bench: Bench, bettors: int):
+    # async_resolve through to the last DRIP credit, including the settlement plan write
+    prediction = await bench.market("resolve", bettors)
+    start = time.perf_counter_ns()
+    await prediction.async_resolve(prediction.options[0])
+    await bench.settled(prediction.id)
+    return [(time.perf_counter_ns() - start, 1)]
+
+
+@benchmark("settle_refund")
+async def bench_settle_refund(bench: Bench, bettors: int):
+    prediction = await bench.market("refund", bettors)
+    start = time.perf_counter_ns()
+    prediction.mark_as_refunded()
+    await bench.cog.settlement.settle(prediction, prediction.settlement_entries())
+    await bench.settled(prediction.id)
+    return [(time.perf_counter_ns() - start, 1)]
+
+
+def summarize(name: str, bettors: int, samples: List[Tuple[int, int]]) -> dict:
+    per_op = sorted(elapsed / ops / 1000 for elapsed, ops in samples)
+    total_ns = sum(elapsed for elapsed, _ in samples)
+    ops = sum(count for _, count in samples)
+    return {
+        'benchmark': name,
+        'bettors': bettors,
+        'samples': len(samples),
+        'ops': ops,
+        'mean_us': round(total_ns / ops / 1000, 3),
+        'p50_us': round(percentile(per_op, 50), 3),
+        'p95_us': round(percentile(per_op, 95), 3),
+        'min_us': round(per_op[0], 3),
+        'total_ms': round(total_ns / 1e6, 3),
+    }
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def run_size(bettors: int, names: List[str], seed: int, samples: int) -> List[dict]:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-") as directory:
+        cog = await load_economy(directory)
+        bench = Bench(cog, seed, samples)
+        try:
+            for name in names:
+                record = summarize(name, bettors, await BENCHMARKS[name](bench, bettors))
+                results.append(record)
+                print(f"{name} @ {bettors:,} bettors: {record['mean_us']:,.1f} us/op", file=sys.stderr)
+        finally:
+            await cog.cog_unload()
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.datetime.utcnow().isoformat(timespec='seconds') + "Z",
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def report(results: List[dict], baseline: dict = None) -> str:
+    headers = ["benchmark", "bettors", "mean µs", "p50 µs", "p95 µs"]
+    if baseline is not None:
+        headers += ["baseline µs", "change"]
+    rows = []
+    for record in results:
+        row = [record['benchmark'], f"{record['bettors']:,}", record['mean_us'], record['p50_us'], record['p95_us']]
+        if baseline is not None:
+            old = baseline.get((record['benchmark'], record['bettors']))
+            if old:
+                row += [old['mean_us'], f"{(record['mean_us'] / old['mean_us'] - 1) * 100:+.1f}%"]
+            else:
+                row += ["", ""]
+        rows.append(row)
+    return tabulate(rows, headers=headers, floatfmt=",.1f")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated bettor counts")
+    parser.add_argument("--only", help="comma-separated benchmark names (default: all)")
+    parser.add_argument("--samples", type=int, default=20, help="timed samples per benchmark where repeatable")
+    parser.add_argument("--seed", type=int, default=1, help="seed for bet amounts and options")
+    parser.add_argument("--output", help=f"results file (default: {RESULTS_DIR}/<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)} (choose from {', '.join(BENCHMARKS)})")
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    meta = environment()
+    results = []
+    for bettors in sizes:
+        results.extend(asyncio.run(run_size(bettors, names, args.seed, args.samples)))
+
+    output = args.output or os.path.join(RESULTS_DIR, meta['timestamp'].replace("-", "").replace(":", "") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({'meta': {**meta, 'sizes': sizes, 'samples': args.samples, 'seed': args.seed}, 'results': results}, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(record['benchmark'], record['bettors']): record for record in json.load(f)['results']}
+    print(report(results, baseline))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Offline stand-ins for Discord and DRIP, so benchmarks exercise only the
+bot's own code: no network, no tokens, and every call succeeds at once.
+"""
+import os
+from typing import List, Optional, Tuple
+
+
+class StubUser:
+    __slots__ = ('id', 'name')
+
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.name = f"user{user_id}"
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+class StubPointsManager:
+    """DRIP client stub: unlimited balances, every adjustment succeeds and is only counted."""
+
+    def __init__(self):
+        self.adjustments = 0
+        self.dead_letters = []
+
+    async def get_balance(self, user_id: int, use_cache: bool = True) -> int:
+        return 10 ** 12
+
+    def available_balance(self, user_id: int, balance: int) -> int:
+        return balance
+
+    async def reserve(self, user_id: int, amount: int) -> bool:
+        return True
+
+    def release(self, user_id: int, amount: int):
+        pass
+
+    async def add_points(self, user_id: int, amount: int, idempotency_key: Optional[str] = None, dead_letter: bool = False) -> bool:
+        self.adjustments += 1
+        return True
+
+    async def remove_points(self, user_id: int, amount: int, idempotency_key: Optional[str] = None, dead_letter: bool = False) -> bool:
+        self.adjustments += 1
+        return True
+
+    async def transfer_points(self, from_user_id: int, to_user_id: int, amount: int, idempotency_key: Optional[str] = None) -> bool:
+        self.adjustments += 1
+        return True
+
+    def dead_letter(self, user_id: int, amount: int, idempotency_key: str, on_replayed=None, from_user_id: Optional[int] = None):
+        self.dead_letters.append((user_id, amount, idempotency_key, from_user_id))
+
+    async def batch_adjust(self, adjustments: List[Tuple[int, int]], concurrency: int = 8, key_prefix: Optional[str] = None):
+        self.adjustments += len({user_id for user_id, _ in adjustments})
+        return [(user_id, delta, True) for user_id, delta in adjustments]
+
+
+class StubBot:
+    """Just enough of ``commands.Bot`` for the Economy cog to load and run."""
+
+    def __init__(self):
+        self.points_manager = StubPointsManager()
+        self.user = StubUser(0)
+        self.dynamic_items = set()
+        self.cogs = {}
+
+    def get_user(self, user_id: int):
+        return None
+
+    async def fetch_user(self, user_id: int) -> StubUser:
+        return StubUser(user_id)
+
+    def dispatch(self, event: str, *args, **kwargs):
+        pass
+
+    def get_cog(self, name: str):
+        return self.cogs.get(name)
+
+    def add_dynamic_items(self, *items):
+        self.dynamic_items.update(items)
+
+    def remove_dynamic_items(self, *items):
+        self.dynamic_items.difference_update(items)
+
+
+async def load_economy(directory: str, bot: StubBot = None):
+    """Create and load an Economy cog whose market store and event log live in ``directory``."""
+    os.environ["DATABASE_PATH"] = os.path.join(directory, "markets.db")
+    os.environ["EVENT_LOG_DIR"] = os.path.join(directory, "events")
+    from cogs.economy import Economy
+
+    bot = bot or StubBot()
+    cog = Economy(bot)
+    bot.cogs["Economy"] = cog
+    await cog.cog_load()
+    return cog
@@ -6,59 +6,15 @@ import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 
+from helpers.Logging import setup_logging
+from helpers.LoopWatchdog import LAG_THRESHOLD, LoopWatchdog
+from helpers.Metrics import MetricsServer
 from helpers.SimplePointsManager import PointsManagerSingleton
 from cogs import EXTENSIONS
 
 intents = discord.Intents.default()
 
-
-class LoggingFormatter(logging.Formatter):
-    # Colors
-    black = "\x1b[30m"
-    red = "\x1b[31m"
-    green = "\x1b[32m"
-    yellow = "\x1b[33m"
-    blue = "\x1b[34m"
-    gray = "\x1b[38m"
-    # Styles
-    reset = "\x1b[0m"
-    bold = "\x1b[1m"
-
-    COLORS = {
-        logging.DEBUG: gray + bold,
-        logging.INFO: blue + bold,
-        logging.WARNING: yellow + bold,
-        logging.ERROR: red,
-        logging.CRITICAL: red + bold,
-    }
-
-    def format(self, record):
-        log_color = self.COLORS[record.levelno]
-        format = "(black){asctime}(reset) (levelcolor){levelname:<8}(reset) (green){name}(reset) {message}"
-        format = format.replace("(black)", self.black + self.bold)
-        format = format.replace("(reset)", self.reset)
-        format = format.replace("(levelcolor)", log_color)
-        format = format.replace("(green)", self.green + self.bold)
-        formatter = logging.Formatter(format, "%Y-%m-%d %H:%M:%S", style="{")
-        return formatter.format(record)
-
-
 logger = logging.getLogger("discord_bot")
-logger.setLevel(logging.INFO)
-
-# Console handler
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(LoggingFormatter())
-# File handler
-file_handler = logging.FileHandler(filename="discord.log", encoding="utf-8", mode="w")
-file_handler_formatter = logging.Formatter(
-    "[{asctime}] [{levelname:<8}] {name}: {message}", "%Y-%m-%d %H:%M:%S", style="{"
-)
-file_handler.setFormatter(file_handler_formatter)
-
-# Add the handlers
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
 
 
 class DiscordBot(commands.Bot):
@@ -73,7 +29,12 @@ class DiscordBot(commands.Bot):
         self.points_manager = PointsManagerSingleton(
             base_url=os.getenv("API_BASE_URL"),
             api_key=os.getenv("API_KEY"),
-            realm_id=os.getenv("REALM_ID")
+            realm_id=os.getenv("REALM_ID"),
+            balance_ttl=float(os.getenv("BALANCE_CACHE_TTL", 30))
+        )
+        self.metrics_server = None
+        self.loop_watchdog = LoopWatchdog(
+            threshold=float(os.getenv("LOOP_LAG_THRESHOLD_MS", LAG_THRESHOLD * 1000)) / 1000
         )
 
     async def load_cogs(self) -> None:
@@ -103,8 +64,16 @@ class DiscordBot(commands.Bot):
             f"Running on: {platform.system()} {platform.release()} ({os.name})"
         )
         self.logger.info("-------------------")
+        self.loop_watchdog.start()
         for cog in EXTENSIONS:
             await self.load_extension(cog)
+        if os.getenv("METRICS_PORT"):
+            self.metrics_server = MetricsServer(
+                host=os.getenv("METRICS_HOST", "127.0.0.1"),
+                port=int(os.getenv("METRICS_PORT"))
+            )
+            await self.metrics_server.start()
+            self.logger.info(f"Serving metrics on {self.metrics_server.host}:{self.metrics_server.port}/metrics")
 
     async def on_ready(self) -> None:
         """|coro|
@@ -122,13 +91,25 @@ class DiscordBot(commands.Bot):
     async def close(self) -> None:
         """
         This is called when the bot is shutting down.
-        Clean up the points manager session.
+        Clean up the points manager session, stop serving metrics and stop the loop watchdog.
         """
+        await self.loop_watchdog.stop()
+        if self.metrics_server:
+            await self.metrics_server.stop()
         await self.points_manager.cleanup()
         await super().close()
 
 
 load_dotenv(override= True)
 
+log_listener = setup_logging(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    json_output=os.getenv("LOG_FORMAT", "text").lower() == "json",
+    log_file=os.getenv("LOG_FILE", "discord.log") or None
+)
 bot = DiscordBot()
-bot.run(os.getenv("TOKEN"))
\ No newline at end of file
+try:
+    # log_handler=None: discord.py's records go through the same queue instead of its own handler
+    bot.run(os.getenv("TOKEN"), log_handler=None)
+finally:
+    log_listener.stop()
\ No newline at end of file
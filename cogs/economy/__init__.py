@@ -3,266 +3,368 @@ import discord
 from discord import app_commands
 import datetime
 import asyncio
-import math
+import bisect
+import io
+import os
+import time
+from typing import Literal
 from tabulate import tabulate
 
+from helpers.BetQueue import BetQueue
+from helpers.DeadlineScheduler import DeadlineScheduler
+from helpers.EmbedPager import EMBED_CHAR_LIMIT, FIELD_NAME_LIMIT, FIELD_VALUE_LIMIT, EmbedPager, clip
+from helpers.EventLog import EventLog
+from helpers.Logging import get_logger
+from helpers import LMSR
+from helpers.MarketRegistry import ACTIVE, PENDING, REFUNDED, RESOLVED, STATUSES, MarketRegistry
+from helpers.MarketStore import MarketStore
+from helpers.Metrics import METRICS
+from helpers.Payouts import compute_payouts
+from helpers.RenderCache import RenderCache
+from helpers.PositionBook import PositionBook
+from helpers.Settlement import SettlementPipeline
+from helpers.Tracing import TRACE_CAPACITY, TRACER, current_span, traced
+from helpers.UserDirectory import UserDirectory
+from helpers.ViewRefreshHub import RenderedEdit, ViewRefreshHub
+
+logger = get_logger(__name__)
+
+CLOSE_DEADLINE = "close"
+NOTIFY_DEADLINE = "notify"
+REFUND_DEADLINE = "refund"
+LIST_TITLE = "🎲 Prediction Markets"
+LIST_FOOTER = "Use /bet to place bets on active markets"
+# Title, footer and the "Page x/y" description come out of every list page's character budget
+LIST_EMBED_RESERVED = len(LIST_TITLE) + len(LIST_FOOTER) + 32
+RESOLVER_ROLE_IDS = {1227314810853523526} # 1227314810853523526, 1301959367536672838, 1301958607046443018, 1301958999092236389, 
+RESOLUTION_VOTES = 9  # Votes one option needs before the market resolves
+REFUND_DELAY = datetime.timedelta(hours=120)  # Unresolved markets are refunded 5 days after betting ends
+MARKET_LIQUIDITY = 10000  # LMSR b parameter for new markets; the market maker can lose at most b * ln(options)
+# /list_predictions shows markets grouped by status in this order
+LIST_ORDER = (ACTIVE, PENDING, RESOLVED, REFUNDED)
+BOTSTATS_LIMIT = 1990  # Discord message limit minus the code block fence
+
+COMMAND_CALLS = METRICS.counter("command_invocations_total", "Slash command invocations by command and outcome", ("command", "status"))
+COMMAND_LATENCY = METRICS.histogram("command_seconds", "Time from a slash command reaching the bot until its handler returned", ("command",))
+BETS_PLACED = METRICS.counter("bets_placed_total", "Bets accepted by the market maker")
+BET_POINTS = METRICS.counter("bet_points_total", "Points staked on accepted bets")
+BET_BATCH_SIZE = METRICS.histogram("bet_batch_size", "Bets applied per bet queue batch", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+LIST_LABELS = {
+    ACTIVE: "🟢 ACTIVE",
+    PENDING: "🟡 PENDING",
+    RESOLVED: "✅ RESOLVED",
+    REFUNDED: "💰 REFUNDED",
+}
+
+def market_custom_id(action, market_id, option_index=None):
+    """Component id carrying the market id (and option index) so callbacks can look the market up directly"""
+    if option_index is None:
+        return f"{action}:{market_id}"
+    return f"{action}:{market_id}:{option_index}"
+
 def is_admin():
     def predicate(interaction: discord.Interaction) -> bool:
         return interaction.user.guild_permissions.administrator
     return app_commands.check(predicate)
 
 class Prediction:
+    __slots__ = (
+        'id', 'question', 'end_time', 'options', 'option_index', 'creator_id', 'cog', 'category',
+        'positions', 'resolved', 'result', 'refunded', 'creator_notified', 'version', 'total_bets',
+        'user_votes', 'votes', 'liquidity', 'bet_queue', '_payout_cache'
+    )
+
     def __init__(self, question, end_time, options, creator_id, cog, category=None):
+        self.id = None  # Assigned by the market store when the market is first saved
         self.question = question
         self.end_time = end_time
         self.options = options
+        self.option_index = {option: i for i, option in enumerate(options)}
         self.creator_id = creator_id
         self.cog = cog
         self.category = category
-        self.bets = {option: {} for option in options}  # Initialize bets for each option
+        # One columnar position book per option, indexed like self.options.
+        # Each book keeps running volume and share totals; the share totals are the LMSR state.
+        self.positions = [PositionBook() for _ in options]
         self.resolved = False
         self.result = None
         self.refunded = False
+        self.creator_notified = False
+        self.version = 0  # Bumped on every change so views can skip re-rendering idle markets
         self.total_bets = 0
         self.user_votes = set()  # Track users who have voted on this prediction
-        self.votes = {option: set() for option in options}  # Track votes for each option
-        # Increase initial liquidity significantly to reduce price impact
-        self.initial_liquidity = 30000  # Increased from 100
-        self.liquidity_pool = {option: self.initial_liquidity for option in options}
-        self.k_constant = self.initial_liquidity * self.initial_liquidity  # Adjusted constant product
+        self.votes = [set() for _ in options]  # Track votes for each option, indexed like self.options
+        # LMSR liquidity parameter: higher means less price impact per bet
+        self.liquidity = MARKET_LIQUIDITY
+        self.bet_queue = BetQueue(self.apply_bets)
+        self._payout_cache = None  # (version, PayoutTable) once resolved
 
         # Verify initialization of self.cog and self.cog.bot
         assert self.cog is not None, "Cog instance is not initialized."
         assert self.cog.bot is not None, "Bot instance is not initialized."
 
+    @classmethod
+    def from_record(cls, cog, record):
+        """Rebuild a prediction from a market store record"""
+        prediction = cls(
+            record['question'],
+            record['end_time'],
+            record['options'],
+            record['creator_id'],
+            cog,
+            record['category']
+        )
+        prediction.id = record['id']
+        prediction.liquidity = record['liquidity']
+        prediction.total_bets = record['total_bets']
+        prediction.resolved = record['resolved']
+        prediction.result = record['result']
+        prediction.refunded = record['refunded']
+        prediction.creator_notified = record['creator_notified']
+        for option, user_id, amount, shares in record['bets']:
+            index = prediction.option_index.get(option)
+            if index is not None:
+                prediction.positions[index].add(user_id, amount, shares)
+        for user_id, option in record['votes']:
+            index = prediction.option_index.get(option)
+            if index is not None:
+                prediction.votes[index].add(user_id)
+                prediction.user_votes.add(user_id)
+        return prediction
+
+    @property
+    def option_volume(self):
+        """Points staked per option"""
+        return {option: book.total_amount for option, book in zip(self.options, self.positions)}
+
+    @property
+    def option_shares(self):
+        """Shares sold per option (the LMSR state)"""
+        return {option: book.total_shares for option, book in zip(self.options, self.positions)}
+
+    @property
+    def option_bettors(self):
+        """Number of positions per option"""
+        return {option: len(book) for option, book in zip(self.options, self.positions)}
+
+    def get_position(self, option, user_id):
+        """(amount, shares) a user holds on an option, or None"""
+        index = self.option_index.get(option)
+        return self.positions[index].get(user_id) if index is not None else None
+
+    def check_aggregates(self, tolerance=1e-6):
+        """Compare the running totals against a full recount and return any mismatches"""
+        mismatches = {}
+        recounted_total = 0
+        for option, book in zip(self.options, self.positions):
+            volume, shares = book.recount()
+            recounted_total += volume
+            if volume != book.total_amount or abs(shares - book.total_shares) > tolerance * max(1.0, abs(shares)):
+                mismatches[option] = {'expected': (volume, shares), 'actual': (book.total_amount, book.total_shares)}
+        if recounted_total != self.total_bets:
+            mismatches['total_bets'] = {'expected': recounted_total, 'actual': self.total_bets}
+        return mismatches
+
+    def touch(self):
+        """Record that the market changed and let listeners know"""
+        self.version += 1
+        self.cog.markets.update(self)
+        self.cog.bot.dispatch("prediction_update", self)
+
+    def _share_vector(self):
+        return [book.total_shares for book in self.positions]
+
     def get_price(self, option, shares_to_buy):
-        """Calculate price for buying shares using constant product formula"""
-        if option not in self.liquidity_pool:
+        """Calculate the points needed to buy shares using the LMSR cost function"""
+        if option not in self.option_index:
             return 0
-        
-        current_shares = self.liquidity_pool[option]
-        other_shares = self.liquidity_pool[self.get_opposite_option(option)]
-        
-        # Using constant product formula: x * y = k
-        new_shares = current_shares - shares_to_buy
-        if new_shares <= 0:
-            return float('inf')
-        
-        new_other_shares = self.k_constant / new_shares
-        cost = new_other_shares - other_shares
-        return max(0, cost)
-
-    def get_opposite_option(self, option):
-        """Get the opposite option in a binary market"""
-        return [opt for opt in self.options if opt != option][0]
+        return LMSR.cost_to_buy(self._share_vector(), self.liquidity, self.option_index[option], shares_to_buy)
 
+    @traced("prediction.place_bet")
     async def place_bet(self, user_id, option, amount):
-        """Place a bet using AMM pricing"""
-        if option not in self.liquidity_pool:
-            return False
-
-        # Calculate shares based on the amount
-        shares = self.calculate_shares_for_points(option, amount)
-        if shares <= 0:
-            return False
-
-        # Update liquidity pool
-        self.liquidity_pool[option] -= shares
-        opposite_option = self.get_opposite_option(option)
-        self.liquidity_pool[opposite_option] += amount
-
-        # Update the bets dictionary
-        if option not in self.bets:
-            self.bets[option] = {}
-        
-        if user_id not in self.bets[option]:
-            self.bets[option][user_id] = {'amount': 0, 'shares': 0}
-        
-        self.bets[option][user_id]['amount'] += amount
-        self.bets[option][user_id]['shares'] += shares
-
-        self.total_bets += amount
-        
-        # Deduct points from user's balance using remove_points
-        await self.cog.points_manager.remove_points(user_id, amount)  # Use remove_points to deduct
-        return True
+        """Place a bet through the market's bet queue and return the shares bought (0 if rejected)"""
+        # The caller has already taken the stake from the user's balance; a rejected bet must be refunded
+        shares = await self.bet_queue.submit(user_id, option, amount)
+        return shares if shares > 0 else 0
+
+    @traced("prediction.apply_bets")
+    def apply_bets(self, batch):
+        """Apply a batch of queued (user_id, option, amount) bets in order using LMSR pricing.
+
+        Runs without awaiting, so no other bet can interleave. The version is bumped once
+        per batch. Returns the shares for each bet, 0 for bets that were rejected.
+        """
+        current_span().set(market=self.id, batch=len(batch))
+        q = self._share_vector()
+        betting_open = not self.resolved and self.end_time > datetime.datetime.utcnow()
+        results = []
+        staked = 0
+        for user_id, option, amount in batch:
+            index = self.option_index.get(option)
+            if not betting_open or index is None or amount <= 0:
+                results.append(0)
+                continue
+
+            # Calculate shares based on the amount
+            shares = LMSR.shares_for_cost(q, self.liquidity, index, amount)
+            if shares <= 0:
+                results.append(0)
+                continue
+            q[index] += shares
+
+            # Open or top up the user's position; the book keeps the option totals
+            self.positions[index].add(user_id, amount, shares)
+            self.total_bets += amount
+            staked += amount
+            self.cog.events.append('bet', market=self.id, user=user_id, option=option, amount=amount, shares=shares)
+            self.cog.store.record_bet(self, option, user_id)
+            results.append(shares)
+
+        BET_BATCH_SIZE.observe(len(batch))
+        if staked:
+            BETS_PLACED.inc(sum(1 for shares in results if shares > 0))
+            BET_POINTS.inc(staked)
+            self.touch()
+        return results
 
     def calculate_shares_for_points(self, option, points):
         """Calculate how many shares user gets for their points"""
-        current_shares = self.liquidity_pool[option]
-        other_shares = self.liquidity_pool[self.get_opposite_option(option)]
-        
-        # Using constant product formula: x * y = k
-        new_other_shares = other_shares + points
-        new_shares = self.k_constant / new_other_shares
-        shares_received = current_shares - new_shares
-        return shares_received
+        return LMSR.shares_for_cost(self._share_vector(), self.liquidity, self.option_index[option], points)
 
     def get_odds(self):
         """Calculate odds based on total bets"""
-        total_bets_per_option = {
-            option: sum(user_bets['amount'] for user_bets in self.bets[option].values())
-            for option in self.options
-        }
-        total_all_bets = sum(total_bets_per_option.values())
+        total_all_bets = self.total_bets
         
         if total_all_bets == 0:
             return {option: 1/len(self.options) for option in self.options}
         
         return {
-            option: total_bets_per_option[option] / total_all_bets
-            for option in self.options
+            option: book.total_amount / total_all_bets
+            for option, book in zip(self.options, self.positions)
         }
 
-    def get_user_payout(self, user_id):
-        """Calculate payout based on shares owned and final pool state"""
+    def get_payout_table(self):
+        """Payouts for every winning position, computed in one vectorized pass per market version"""
         if not self.resolved or self.result is None:
-            return 0
-        
-        # Get the user's shares and amount from the bets
-        user_bet_info = self.bets[self.result].get(user_id, None)
-        if user_bet_info is None:
-            print(f"User ID: {user_id} has no shares in the winning option.")  # Debugging output
-            return 0
-
-        shares = user_bet_info['shares']
-        if shares == 0:
-            print(f"User ID: {user_id} has no shares in the winning option.")  # Debugging output
-            return 0
-
-        # Calculate total pool and total winning bets
-        total_pool = sum(sum(user_bets['amount'] for user_bets in option_bets.values()) for option_bets in self.bets.values())
-        total_winning_bets = sum(user_bet_info['amount'] for user_bet_info in self.bets[self.result].values())
-        
-        # Debugging output for total pool and winning bets
-        print(f"Total Pool: {total_pool}, Total Winning Bets: {total_winning_bets}, User Shares: {shares}")  # Debugging output
-
-        # Check if total_winning_bets is zero to avoid division by zero
-        if total_winning_bets <= 0:
-            print(f"No winning bets found for User ID: {user_id}. Total Winning Bets is zero.")  # Debugging output
-            return 0
+            return None
+        if self._payout_cache is None or self._payout_cache[0] != self.version:
+            user_ids, stakes, _ = self.positions[self.option_index[self.result]].columns()
+            self._payout_cache = (self.version, compute_payouts(user_ids, stakes, self.total_bets))
+        return self._payout_cache[1]
 
-        share_value = total_pool / total_winning_bets
-        payout = int(shares * share_value)
-        
-        # Debugging output for final payout calculation
-        print(f"User ID: {user_id}, Shares: {shares}, Share Value: {share_value}, Payout: {payout}")  # Debugging output
-        
-        return payout
+    def get_user_payout(self, user_id):
+        """Calculate a user's share of the pool, proportional to their stake on the winning option"""
+        table = self.get_payout_table()
+        return table.for_user(user_id) if table is not None else 0
 
+    @traced("prediction.resolve")
     async def async_resolve(self, winning_option):
-        """Asynchronous method to handle resolution logic."""
+        """Resolve the market and hand payouts and notifications to the settlement pipeline.
+
+        Returns False without doing anything if the market was already resolved or refunded,
+        e.g. by a second vote that reached the threshold while the first was still replying.
+        """
+        if self.resolved:
+            return False
         self.resolved = True
         self.result = winning_option
+        self.cog.events.append('resolve', market=self.id, result=winning_option)
+        self.cog.store.mark_market_dirty(self)
+        self.cog.cancel_deadlines(self)
+        self.touch()
 
-        # Get winning users and their bets
-        winning_users = self.bets[self.result].items()  # Get users who bet on the winning option
-        print(f"Winning option: {self.result}")  # Debugging output
-        print(f"Winning users: {list(winning_users)}")  # Debugging output
-
-        if not winning_users:
-            print("No winning users found.")  # Debugging output
-            return  # Exit if there are no winners
+        logger.info("Market %s resolved", self.id, market=self.id, result=self.result)
 
-        # Calculate the total pool and winning bets
-        total_pool = sum(sum(user_bets['amount'] for user_bets in option_bets.values()) for option_bets in self.bets.values())
-        total_winning_bets = sum(user_bet_info['amount'] for user_bet_info in self.bets[self.result].values())
+        # Credits and DMs run in the background so the vote callback returns right away
+        await self.cog.settlement.settle(self, self.settlement_entries())
+        return True
 
-        # Debugging output for total pool and winning bets
-        print(f"Total Pool: {total_pool}, Total Winning Bets: {total_winning_bets}")  # Debugging output
+    def settlement_entries(self):
+        """(user_id, kind, stake, amount) rows for the settlement pipeline: payouts and loss notices, or refunds"""
+        if self.refunded:
+            # One refund per user across options
+            refunds = {}
+            for book in self.positions:
+                for user_id, amount, _ in book:
+                    refunds[user_id] = refunds.get(user_id, 0) + amount
+            return [(user_id, 'refund', amount, amount) for user_id, amount in refunds.items()]
 
-        if total_winning_bets <= 0:
-            print("No valid winning bets to distribute points.")  # Debugging output
-            return  # Exit if there are no valid winning bets
+        # Calculate the total pool and winning bets
+        total_pool = self.total_bets
+        total_winning_bets = self.get_option_total_bets(self.result)
 
-        # Notify winners and calculate payouts
-        for user_id, user_bet_info in winning_users:
-            print(f"Calculating payout for User ID: {user_id}, Bet Amount: {user_bet_info['amount']}")  # Debugging output
+        logger.debug("Settling market %s", self.id, market=self.id, pool=total_pool, winning_stake=total_winning_bets)
 
-            # Calculate payout proportionally based on their bet
-            payout = (user_bet_info['amount'] / total_winning_bets) * total_pool
-            payout = int(payout)  # Ensure the payout is an integer
+        entries = []
+        if total_winning_bets > 0:
+            # Whole pool split by stake, rounded so every point is paid out
+            entries.extend(
+                (user_id, 'payout', stake, payout)
+                for user_id, stake, payout in self.get_payout_table().rows()
+            )
+        else:
+            logger.info("Market %s has no winning bets; nothing to pay out", self.id, market=self.id)
 
-            # Add the payout to the user's points balance
-            try:
-                success = await self.cog.points_manager.add_points(user_id, payout)
-                if success:
-                    user = await self.cog.bot.fetch_user(user_id)
-                    await user.send(
-                        f"🎉 You won {payout:,} Points on '{self.question}'!\n"
-                        f"Your Bet: {user_bet_info['amount']:,} → Payout: {payout:,}"
-                    )
-                else:
-                    print(f"Failed to add points for User ID: {user_id}.")
-            except Exception as e:
-                print(f"Error processing payout for User ID: {user_id}: {e}")
-
-        # Notify losers
-        for option in self.options:
-            if option != self.result:  # Notify only those who lost
-                losing_users = self.bets[option].items()  # Get users who bet on the losing option
-                for user_id, user_bet_info in losing_users:
-                    amount = user_bet_info['amount']  # Access the amount correctly
-                    print(f"Notifying user {user_id} about loss of {amount} points.")  # Debugging output
-                    try:
-                        user = await self.cog.bot.fetch_user(user_id)
-                        if user:  # Check if the user is valid
-                            await user.send(
-                                f"💔 You lost your bet of {amount:,} Points on '{self.question}'.\n"
-                                f"The winning option was: '{self.result}'."
-                            )
-                        else:
-                            print(f"User ID {user_id} not found.")
-                    except Exception as e:
-                        print(f"Error sending losing notification to user {user_id}: {e}")
+        # Losers get one notice covering everything they staked on losing options
+        losses = {}
+        for option, book in zip(self.options, self.positions):
+            if option != self.result:
+                for user_id, amount, _ in book:
+                    losses[user_id] = losses.get(user_id, 0) + amount
+        entries.extend((user_id, 'loss', stake, 0) for user_id, stake in losses.items())
+        return entries
 
     def get_total_bets(self):
         return self.total_bets
 
     def get_option_total_bets(self, option):
-        return sum(user_bets['amount'] for user_bets in self.bets[option].values()) if option in self.bets else 0
+        index = self.option_index.get(option)
+        return self.positions[index].total_amount if index is not None else 0
 
     def get_bet_history(self):
         history = []
-        for option, bets in self.bets.items():
-            for user_id, user_bet_info in bets.items():
-                history.append((user_id, option, user_bet_info['amount']))
+        for option, book in zip(self.options, self.positions):
+            for user_id, amount, _ in book:
+                history.append((user_id, option, amount))
         return history
 
     def mark_as_refunded(self):
         self.refunded = True
         self.resolved = True
+        self.cog.events.append('refund', market=self.id)
+        self.cog.store.mark_market_dirty(self)
+        self.touch()
 
     def get_current_prices(self, points_to_spend=100):
         """Calculate current prices and potential shares for a given point amount"""
         prices = {}
+        volumes = [book.total_amount for book in self.positions]
         
         # Calculate total bets for probability calculation
-        total_bets = sum(sum(user_bets['amount'] for user_bets in self.bets[option].values()) for option in self.options)
+        total_bets = self.total_bets
         if total_bets == 0:
             # If no bets yet, use equal probabilities
-            base_probability = 100 / len(self.options)
-            probabilities = {option: base_probability for option in self.options}
+            probabilities = [100 / len(self.options)] * len(self.options)
         else:
             # Calculate probabilities based on total bets per option
-            probabilities = {
-                option: (sum(user_bets['amount'] for user_bets in self.bets[option].values()) / total_bets * 100)
-                for option in self.options
-            }
+            probabilities = [volume / total_bets * 100 for volume in volumes]
         
-        for option in self.options:
-            # Calculate actual shares user would get for their points
-            shares = self.calculate_shares_for_points(option, points_to_spend)
-            
+        # Marginal prices and the shares points_to_spend would buy, for every option in one pass
+        market_prices, potential_shares = LMSR.quote_all(self._share_vector(), self.liquidity, points_to_spend)
+
+        for option, market_price, shares, probability, volume in zip(
+            self.options, market_prices, potential_shares, probabilities, volumes
+        ):
             # Calculate actual price per share based on points spent and shares received
             price_per_share = points_to_spend / shares if shares > 0 else float('inf')
             
             prices[option] = {
                 'price_per_share': price_per_share,
+                'market_price': market_price,
                 'potential_shares': shares,
                 'potential_payout': points_to_spend if shares > 0 else 0,
-                'probability': probabilities[option],  # Now based on total bets
-                'total_bets': sum(user_bets['amount'] for user_bets in self.bets[option].values())
+                'probability': probability,  # Now based on total bets
+                'total_bets': volume
             }
         return prices
 
@@ -270,36 +372,106 @@ class Prediction:
         return user_id in self.user_votes
 
     def vote(self, user_id, option):
-        if option in self.votes:
-            self.votes[option].add(user_id)
+        index = self.option_index.get(option)
+        if index is not None:
+            self.votes[index].add(user_id)
             self.user_votes.add(user_id)
+            self.cog.events.append('vote', market=self.id, user=user_id, option=option)
+            self.cog.store.record_vote(self, user_id, option)
+            self.touch()
+
+    def vote_count(self, option):
+        index = self.option_index.get(option)
+        return len(self.votes[index]) if index is not None else 0
 
     def is_resolved(self):
         return self.resolved
 
-class OptionButton(discord.ui.Button):
-    def __init__(self, label, prediction, cog, view):
-        # Simplified button label - just the option name
+    def apply_event(self, event):
+        """Re-apply a logged mutation during recovery, without logging it again or notifying listeners"""
+        kind = event['type']
+        if kind == 'bet':
+            index = self.option_index.get(event['option'])
+            if index is None:
+                return
+            self.positions[index].add(event['user'], event['amount'], event['shares'])
+            self.total_bets += event['amount']
+            self.cog.store.record_bet(self, event['option'], event['user'])
+        elif kind == 'vote':
+            index = self.option_index.get(event['option'])
+            if index is None:
+                return
+            self.votes[index].add(event['user'])
+            self.user_votes.add(event['user'])
+            self.cog.store.record_vote(self, event['user'], event['option'])
+        elif kind == 'resolve':
+            self.resolved = True
+            self.result = event['result']
+        elif kind == 'refund':
+            self.refunded = True
+            self.resolved = True
+        elif kind == 'notified':
+            self.creator_notified = True
+        else:
+            return
+        self.cog.store.mark_market_dirty(self)
+        self.version += 1
+
+def component_view(*items):
+    """Wrap dynamic items for sending; the view is stopped so it is never kept in the view store"""
+    view = discord.ui.View(timeout=None)
+    for item in items:
+        view.add_item(item)
+    view.stop()
+    return view
+
+def economy_cog(interaction):
+    return interaction.client.get_cog("Economy")
+
+async def send_ephemeral(interaction, content):
+    """Reply privately, as a followup if the interaction was already acknowledged"""
+    if interaction.response.is_done():
+        await interaction.followup.send(content, ephemeral=True)
+    else:
+        await interaction.response.send_message(content, ephemeral=True)
+
+class BetButton(discord.ui.DynamicItem[discord.ui.Button], template=r"bet:(?P<market>[0-9]+):(?P<option>[0-9]+)"):
+    """Option button on a bet panel; the market and option come from the custom_id, so it keeps working after a restart"""
+    def __init__(self, market_id, option_index, label, row=None):
         super().__init__(
-            label=label,
-            style=discord.ButtonStyle.primary,
-            custom_id=f"bet_{label}"
+            discord.ui.Button(
+                label=label,
+                style=discord.ButtonStyle.primary,
+                custom_id=market_custom_id("bet", market_id, option_index),
+                row=row
+            )
         )
-        self.prediction = prediction
-        self.cog = cog
-        self.option = label
-        self.parent_view = view
+        self.market_id = market_id
+        self.option_index = option_index
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match['market']), int(match['option']), item.label)
 
+    @traced("bet.button", root=True)
     async def callback(self, interaction: discord.Interaction):
+        current_span().set(market=self.market_id, user=interaction.user.id)
         try:
-            await interaction.response.send_modal(AmountInput(self.prediction, self.option, self.cog))
-        except Exception as e:
-            print(f"Error in button callback: {e}")
+            cog = economy_cog(interaction)
+            prediction = cog.markets.get(self.market_id) if cog else None
+            if prediction is None or prediction.end_time <= datetime.datetime.utcnow():
+                await interaction.response.send_message("This prediction has already ended!", ephemeral=True)
+                return
+            option = prediction.options[self.option_index]
+            with TRACER.span("discord.response"):
+                await interaction.response.send_modal(AmountInput(prediction, option, cog))
+        except Exception:
+            logger.exception("Error in bet button callback", market=self.market_id, user=interaction.user.id)
             await interaction.response.send_message("An error occurred while processing your bet.", ephemeral=True)
 
 class AmountInput(discord.ui.Modal, title="Place Your Bet"):
     def __init__(self, prediction, option, cog):
-        super().__init__()
+        super().__init__(timeout=300)  # Dismissed modals are dropped from the view store
         self.prediction = prediction
         self.option = option
         self.cog = cog
@@ -315,7 +487,9 @@ class AmountInput(discord.ui.Modal, title="Place Your Bet"):
         )
         self.add_item(self.amount)
 
+    @traced("bet.submit", root=True)
     async def on_submit(self, interaction: discord.Interaction):
+        current_span().set(market=self.prediction.id, user=interaction.user.id, option=self.option)
         try:
             amount = int(self.amount.value)
             if amount <= 0:
@@ -327,240 +501,266 @@ class AmountInput(discord.ui.Modal, title="Place Your Bet"):
                 await interaction.response.send_message("This prediction has already ended!", ephemeral=True)
                 return
 
-            # Check user's balance
-            balance = await self.cog.points_manager.get_balance(interaction.user.id)
-            if balance < amount:
-                await interaction.response.send_message(f"You don't have enough Points! Your balance: {balance:,} Points", ephemeral=True)
+            # DRIP calls below may retry for longer than Discord's 3 s acknowledgement deadline
+            with TRACER.span("discord.response"):
+                await interaction.response.defer(ephemeral=True, thinking=True)
+
+            # Check user's balance (cached) and hold the amount so concurrent bets can't overdraw
+            points_manager = self.cog.points_manager
+            user_id = interaction.user.id
+            if not await points_manager.reserve(user_id, amount):
+                balance = await points_manager.get_balance(user_id)
+                available = points_manager.available_balance(user_id, balance)
+                await interaction.followup.send(f"You don't have enough Points! Your balance: {available:,} Points", ephemeral=True)
                 return
 
-            # Calculate potential shares and payout before placing bet
-            shares = self.prediction.calculate_shares_for_points(self.option, amount)
-            actual_price_per_share = amount / shares if shares > 0 else float('inf')
-
-            # Transfer points and place bet
-            await self.cog.points_manager.transfer_points(interaction.user.id, self.cog.bot.user.id, amount)
-            if await self.prediction.place_bet(interaction.user.id, self.option, amount):
-                await interaction.response.send_message(
-                    f"Bet placed successfully!\n"
-                    f"Amount: {amount:,} Points\n"
-                    f"Shares received: {shares:.2f}\n"
-                    f"Actual price per share: {actual_price_per_share:.2f} Points",
-                    ephemeral=True
-                )
+            try:
+                # Take the stake first; the bet only goes into the market once the user has paid for it
+                if not await points_manager.transfer_points(user_id, self.cog.bot.user.id, amount, idempotency_key=f"bet:{interaction.id}"):
+                    await interaction.followup.send("Your Points could not be transferred, so the bet was not placed. Please try again.", ephemeral=True)
+                    return
+                # Shares are quoted by the market's bet queue
+                shares = await self.prediction.place_bet(user_id, self.option, amount)
+                if shares > 0:
+                    # Only acknowledge the bet once its event is on disk
+                    await self.cog.events.sync()
+                    actual_price_per_share = amount / shares
+                    with TRACER.span("discord.response"):
+                        await interaction.followup.send(
+                            f"Bet placed successfully!\n"
+                            f"Amount: {amount:,} Points\n"
+                            f"Shares received: {shares:.2f}\n"
+                            f"Actual price per share: {actual_price_per_share:.2f} Points",
+                            ephemeral=True
+                        )
+                elif await points_manager.transfer_points(self.cog.bot.user.id, user_id, amount, idempotency_key=f"bet-refund:{interaction.id}"):
+                    # Market closed while the bet was queued: the points went back
+                    await interaction.followup.send("This prediction is no longer accepting bets.", ephemeral=True)
+                else:
+                    # Keep retrying the refund in the background rather than keeping the user's points
+                    # Replayed as the same transfer back from the bot, never as newly created points
+                    points_manager.dead_letter(user_id, amount, f"bet-refund:{interaction.id}", from_user_id=self.cog.bot.user.id)
+                    logger.warning("Refund of rejected bet queued for replay", market=self.prediction.id, user=user_id, amount=amount)
+                    await interaction.followup.send(
+                        "This prediction is no longer accepting bets. Your refund could not be sent yet and will be retried automatically.",
+                        ephemeral=True
+                    )
+            finally:
+                points_manager.release(user_id, amount)
         except ValueError:
-            await interaction.response.send_message("Invalid amount entered!", ephemeral=True)
-        except Exception as e:
-            print(f"Error in modal submit: {e}")
-            await interaction.response.send_message("An error occurred while placing your bet.", ephemeral=True)
+            await send_ephemeral(interaction, "Invalid amount entered!")
+        except Exception:
+            logger.exception("Error in bet modal submit", market=self.prediction.id, user=interaction.user.id)
+            await send_ephemeral(interaction, "An error occurred while placing your bet.")
+
+def bet_view(prediction):
+    """Option buttons for a bet panel, one row per option while they fit"""
+    one_per_row = len(prediction.options) <= 5
+    return component_view(*(
+        BetButton(prediction.id, index, option, row=index if one_per_row else None)
+        for index, option in enumerate(prediction.options)
+    ))
+
+class BetPanel:
+    """Live bet message for one market; the refresh hub re-renders it and its buttons route by custom_id"""
+    __slots__ = ('prediction', 'cog', 'stored_interaction')
 
-class OptionButtonView(discord.ui.View):
     def __init__(self, prediction, cog):
-        super().__init__(timeout=None)
         self.prediction = prediction
         self.cog = cog
         self.stored_interaction = None
-        self.update_buttons()
-        self.update_task = None
-        
-        self.cog.active_views.add(self)
-        # Start the auto-update task
-        self.start_auto_update()
-
-    def update_buttons(self):
-        self.clear_items()
-        for index, option in enumerate(self.prediction.options):
-            button = OptionButton(
-                option, 
-                self.prediction, 
-                self.cog, 
-                self
-            )
-            button.row = index
-            self.add_item(button)
-
-    def start_auto_update(self):
-        """Start the auto-update task"""
-        if not self.update_task:
-            self.update_task = asyncio.create_task(self.auto_update_prices())
-
-    def stop_auto_update(self):
-        """Stop the auto-update task"""
-        if self.update_task:
-            self.update_task.cancel()
-            self.update_task = None
-
-    async def auto_update_prices(self):
-        """Auto-update prices every 5 seconds"""
-        try:
-            while True:
-                await self.refresh_view()
-                await asyncio.sleep(5)  # Wait 5 seconds before next update
-        except asyncio.CancelledError:
-            # Handle task cancellation
-            pass
-        except Exception as e:
-            print(f"Error in auto_update_prices: {e}")
-
-    async def refresh_view(self):
-        """Refresh the view with current prices"""
-        if self.stored_interaction:
-            try:
-                if self.prediction.end_time <= datetime.datetime.utcnow():
-                    self.stop_auto_update()
-                    await self.stored_interaction.edit(
-                        content="This prediction has ended!",
-                        view=None
-                    )
-                    return
-
-                # Calculate prices for a small test amount to get accurate pricing
-                test_amount = 10  # Use small amount for more accurate initial price
-                prices = self.prediction.get_current_prices(test_amount)
-                market_info = "**Current Market Status**\n\n"
-                
-                for option in self.prediction.options:
-                    price_info = prices[option]
-                    shares = price_info['potential_shares']
-                    actual_price = test_amount / shares if shares > 0 else float('inf')
-                    
-                    market_info += f"**{option}**\n"
-                    market_info += f"• Total Bets: {price_info['total_bets']:,} Points\n"
-                    market_info += f"• Probability: {price_info['probability']:.1f}%\n"
-                    market_info += f"• Current Price: {actual_price:.2f} Points/Share\n\n"
-                
-                # Add total volume
-                total_volume = self.prediction.get_total_bets()
-                market_info += f"\n**Total Volume**: {total_volume:,} Points"
-                
-                await self.stored_interaction.edit(
-                    content=market_info,
-                    view=self
-                )
-            except discord.NotFound:
-                self.stop_auto_update()
-                self.cog.active_views.discard(self)
-            except Exception as e:
-                print(f"Error refreshing view: {e}")
-                self.stop_auto_update()
-                self.cog.active_views.discard(self)
-
-    def __del__(self):
-        """Cleanup when the view is destroyed"""
-        self.stop_auto_update()
-        self.cog.active_views.discard(self)
-
 
+    def render_key(self):
+        return (self.prediction.version, self.prediction.end_time <= datetime.datetime.utcnow())
+
+    async def render(self):
+        """Build the message edit showing current prices"""
+        if self.prediction.end_time <= datetime.datetime.utcnow():
+            self.cog.refresh_hub.unsubscribe(self)
+            return {'content': "This prediction has ended!", 'view': None}
+
+        # Every panel on the same market version shares one rendered edit and its digest
+        return self.cog.render_cache.get_or_render(
+            (self.prediction.id, self.prediction.version, 'bet'),
+            lambda: RenderedEdit(
+                key=(self.prediction.version, False),
+                content=self.render_content(),
+                view=bet_view(self.prediction)
+            )
+        )
 
-class ResolutionButton(discord.ui.Button):
-    def __init__(self, option: str, prediction: Prediction, view: 'ResolutionView'):
+    def render_content(self):
+        # Calculate prices for a small test amount to get accurate pricing
+        test_amount = 10  # Use small amount for more accurate initial price
+        prices = self.prediction.get_current_prices(test_amount)
+        market_info = "**Current Market Status**\n\n"
+        
+        for option in self.prediction.options:
+            price_info = prices[option]
+            shares = price_info['potential_shares']
+            actual_price = test_amount / shares if shares > 0 else float('inf')
+            
+            market_info += f"**{option}**\n"
+            market_info += f"• Total Bets: {price_info['total_bets']:,} Points\n"
+            market_info += f"• Probability: {price_info['probability']:.1f}%\n"
+            market_info += f"• Current Price: {actual_price:.2f} Points/Share\n\n"
+        
+        # Add total volume
+        total_volume = self.prediction.get_total_bets()
+        market_info += f"\n**Total Volume**: {total_volume:,} Points"
+        return market_info
+
+class VoteButton(discord.ui.DynamicItem[discord.ui.Button], template=r"vote:(?P<market>[0-9]+):(?P<option>[0-9]+)"):
+    """Resolution vote button; the market resolves once an option reaches RESOLUTION_VOTES votes"""
+    def __init__(self, market_id, option_index, label):
         super().__init__(
-            label=option,
-            style=discord.ButtonStyle.primary,
-            custom_id=f"resolve_{option}"
+            discord.ui.Button(
+                label=label,
+                style=discord.ButtonStyle.primary,
+                custom_id=market_custom_id("vote", market_id, option_index)
+            )
         )
-        self.option = option
-        self.prediction = prediction
-        self.view = view  # Reference to the ResolutionView
+        self.market_id = market_id
+        self.option_index = option_index
 
-    async def callback(self, interaction: discord.Interaction):
-        if interaction.user.id not in self.view.votes[self.option]:
-            self.view.votes[self.option].add(interaction.user.id)  # Track votes in the view
-            await interaction.response.send_message(f"You voted for {self.option}", ephemeral=True)
-
-            # Update the button label to show the current vote count
-            self.label = f"{self.option} ({len(self.view.votes[self.option])})"
-            await interaction.message.edit(view=self.view)
-
-            # Check if threshold reached (9 votes)
-            if len(self.view.votes[self.option]) >= 9:
-                if not self.prediction.resolved:
-                    await self.prediction.async_resolve(self.option)  # Use async_resolve
-
-                    # Update the message to show resolution
-                    for child in self.view.children:
-                        child.disabled = True
-                        if child.custom_id == f"resolve_{self.option}":
-                            child.style = discord.ButtonStyle.success
-                        else:
-                            child.style = discord.ButtonStyle.danger
-
-                    await interaction.message.edit(
-                        content=f"Market resolved! Winning option: {self.option}",
-                        view=self.view
-                    )
-        else:
-            await interaction.response.send_message("You have already voted!", ephemeral=True)
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(int(match['market']), int(match['option']), item.label)
 
-class ResolutionView(discord.ui.View):
-    def __init__(self, prediction: Prediction):
-        super().__init__(timeout=None)
-        self.prediction = prediction
-        self.stored_interaction = None
-        self.update_task = None
-        self.votes = {option: set() for option in prediction.options}  # Track votes for each option
-
-        self.start_auto_update()  # Start the auto-update task
-
-        # Add buttons for each option
-        for option in prediction.options:
-            self.add_item(ResolutionButton(option, prediction, self))
-
-    def start_auto_update(self):
-        """Start the auto-update task"""
-        if not self.update_task:
-            self.update_task = asyncio.create_task(self.auto_update_votes())
-
-    def stop_auto_update(self):
-        """Stop the auto-update task"""
-        if self.update_task:
-            self.update_task.cancel()
-            self.update_task = None
-
-    async def auto_update_votes(self):
-        """Auto-update the voting embed every 5 seconds"""
-        try:
-            while True:
-                await self.refresh_view()
-                await asyncio.sleep(5)  # Wait 5 seconds before next update
-        except asyncio.CancelledError:
-            pass
-        except Exception as e:
-            print(f"Error in auto_update_votes: {e}")
-
-    async def refresh_view(self):
-        """Refresh the view with current vote counts"""
-        if not self.stored_interaction:
+    @traced("vote.button", root=True)
+    async def callback(self, interaction: discord.Interaction):
+        current_span().set(market=self.market_id, user=interaction.user.id)
+        # Add role check here as well
+        user_roles = {role.id for role in interaction.user.roles}
+        if not user_roles.intersection(RESOLVER_ROLE_IDS):
+            await interaction.response.send_message("You do not have permission to vote on predictions.", ephemeral=True)
             return
 
-        try:
-            # Create a new embed for the voting status
-            embed = discord.Embed(
-                title=f"Vote to Resolve: {self.prediction.question}",
-                description="Please vote for the winning option:",
-                color=discord.Color.blue()
-            )
+        cog = economy_cog(interaction)
+        prediction = cog.markets.get(self.market_id) if cog else None
+        if prediction is None or prediction.resolved:
+            await interaction.response.send_message("This prediction has already been resolved.", ephemeral=True)
+            return
 
-            # Add fields for each option with the current vote count
-            # for option in self.prediction.options:
-                # vote_count = len(self.votes[option])  # Get the number of votes for the option
-               # embed.add_field(name=option, value=f"Votes: {vote_count}", inline=False)
+        if prediction.has_voted(interaction.user.id):
+            await interaction.response.send_message("You have already voted on this prediction!", ephemeral=True)
+            return
 
-            # Update the interaction with the new embed
-            await self.stored_interaction.edit(embed=embed, view=self)
+        option = prediction.options[self.option_index]
+        prediction.vote(interaction.user.id, option)
+        await cog.events.sync()
+        await interaction.response.send_message(f"You voted for {option}.", ephemeral=True)
 
-        except discord.NotFound:
-            self.stop_auto_update()
-            print("Interaction not found, stopping updates.")
-        except Exception as e:
-            print(f"Error refreshing view: {e}")
-            self.stop_auto_update()
+        # Check if the threshold is met; another vote may have resolved the market while this one was replying
+        if prediction.vote_count(option) >= RESOLUTION_VOTES and await prediction.async_resolve(option):
+            await interaction.channel.send(f"Market resolved! The winning option is: {option}")
+            await interaction.message.edit(view=None)  # Disable buttons after resolution
 
 class Economy(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.points_manager = bot.points_manager
-        self.predictions = []
-        self.active_views = set()
+        self.markets = MarketRegistry()  # Every market, indexed by status, category and end time
+        self.events = EventLog(os.getenv("EVENT_LOG_DIR", "events"))
+        self.store = MarketStore(os.getenv("DATABASE_PATH", "markets.db"), events=self.events)
+        self.scheduler = DeadlineScheduler()
+        self.refresh_hub = ViewRefreshHub()
+        self.listing = MarketListing(self)
+        self.render_cache = RenderCache()  # Rendered bet panel and list page edits, keyed by market version/page contents
+        self.users = UserDirectory(bot)
+        self.settlement = SettlementPipeline(self.points_manager, self.users, self.store)
+        TRACER.configure(
+            sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", 0.01)),
+            slow_ms=float(os.getenv("TRACE_SLOW_MS", 1000)),
+            capacity=int(os.getenv("TRACE_BUFFER", TRACE_CAPACITY))
+        )
+
+    async def cog_load(self):
+        """Open the market store and warm-start every saved market"""
+        await self.store.open()
+        await self.events.open(min_seq=self.store.checkpoint_seq)
+        for record in await self.store.load_all():
+            self.markets.add(Prediction.from_record(self, record))
+        # Store tables are a snapshot as of checkpoint_seq; replay what happened after it
+        settled_by_replay = await self.replay_events(self.store.checkpoint_seq)
+        for prediction in self.markets:
+            # Deadlines that passed while the bot was down fire right away
+            self.schedule_deadlines(prediction)
+        self.scheduler.start()
+        self.refresh_hub.start()
+        self.settlement.start()
+        # Buttons route by custom_id, so messages sent before a restart keep working
+        self.bot.add_dynamic_items(BetButton, VoteButton, MarketPageButton)
+        self.register_metrics()
+        await self.settlement.resume()
+        for prediction in settled_by_replay:
+            # Resolved or refunded just before a crash, before the settlement plan was written
+            if not await self.store.has_settlement(prediction.id):
+                await self.settlement.settle(prediction, prediction.settlement_entries())
+        logger.info("Loaded %d predictions from %s, %d deadlines pending", len(self.markets), self.store.path, self.scheduler.pending)
+
+    async def cog_unload(self):
+        """Stop deadlines and flush pending writes before the bot shuts down"""
+        self.bot.remove_dynamic_items(BetButton, VoteButton, MarketPageButton)
+        await self.scheduler.stop()
+        await self.refresh_hub.stop()
+        await self.settlement.stop()
+        await self.store.close()
+        await self.events.close()
+
+    def register_metrics(self):
+        """Expose the cog's queues and backlogs as gauges that are read when metrics are scraped"""
+        METRICS.gauge("markets", "Markets by status", ("status",), function=lambda: [((status,), self.markets.count(status)) for status in STATUSES])
+        METRICS.gauge("bet_queue_depth", "Bets waiting in market bet queues", function=lambda: sum(len(prediction.bet_queue) for prediction in self.markets))
+        METRICS.gauge("active_views", "Messages kept up to date by the refresh hub", function=lambda: self.refresh_hub.subscribed)
+        METRICS.gauge("view_edits_queued", "Message edits waiting for rate limit tokens", function=lambda: self.refresh_hub.queued_edits)
+        METRICS.gauge("scheduler_backlog", "Market deadlines waiting to fire", function=lambda: self.scheduler.pending)
+        METRICS.gauge("settlement_rows", "Settlement rows started since startup, by progress", ("state",), function=self.settlement_progress)
+        METRICS.gauge("settlement_notifications_queued", "Settlement DMs waiting to be sent", function=lambda: self.settlement.pending_notifications)
+        METRICS.gauge("store_pending_writes", "Market store changes not yet flushed", function=lambda: self.store.pending_writes)
+        METRICS.gauge("event_log_pending", "Events not yet written to the event log", function=lambda: self.events.pending)
+
+    def settlement_progress(self):
+        totals = dict.fromkeys(('total', 'credited', 'notified', 'failed'), 0)
+        for progress in self.settlement.progress.values():
+            for state in totals:
+                totals[state] += progress[state]
+        return [((state,), count) for state, count in totals.items()]
+
+    async def replay_events(self, after_seq):
+        """Apply logged events newer than the store checkpoint and return markets they resolved or refunded"""
+        by_id = {prediction.id: prediction for prediction in self.markets}
+        settled = {}
+        replayed = 0
+        for event in self.events.read(after_seq):
+            replayed += 1
+            prediction = by_id.get(event.get('market'))
+            if event['type'] == 'create':
+                # Creation is written through to the store, so this only matters for a lost database
+                if prediction is None:
+                    prediction = Prediction(
+                        event['question'],
+                        datetime.datetime.fromisoformat(event['end_time']),
+                        event['options'],
+                        event['creator'],
+                        self,
+                        event['category']
+                    )
+                    prediction.liquidity = event['liquidity']
+                    prediction.id = await self.store.insert_market(prediction)
+                    by_id[event['market']] = prediction
+                    self.markets.add(prediction)
+                continue
+            if prediction is None:
+                continue
+            prediction.apply_event(event)
+            self.markets.update(prediction)
+            if event['type'] in ('resolve', 'refund'):
+                settled[prediction.id] = prediction
+        if replayed:
+            logger.info("Replayed %d events after checkpoint %s", replayed, after_seq)
+            await self.store.flush()
+        return list(settled.values())
 
     @app_commands.guild_only()
     @app_commands.command(name="create_prediction", description="Create a new prediction market")
@@ -589,6 +789,9 @@ class Economy(commands.Cog):
             if len(options_list) < 2:
                 await interaction.followup.send("You need at least two options for a prediction!", ephemeral=True)
                 return
+            if len(set(options_list)) != len(options_list):
+                await interaction.followup.send("Each option must be different!", ephemeral=True)
+                return
             
             # Process duration
             duration_parts = duration.split(",")
@@ -609,12 +812,24 @@ class Economy(commands.Cog):
             # Create prediction object
             end_time = datetime.datetime.utcnow() + datetime.timedelta(minutes=total_minutes)
             new_prediction = Prediction(question, end_time, options_list, interaction.user.id, self, category)
+            new_prediction.id = await self.store.insert_market(new_prediction)
+            self.events.append(
+                'create',
+                market=new_prediction.id,
+                question=question,
+                category=category,
+                creator=interaction.user.id,
+                end_time=end_time.isoformat(),
+                options=options_list,
+                liquidity=new_prediction.liquidity
+            )
             
-            # Add to predictions list
-            self.predictions.append(new_prediction)
+            # Add to the market registry
+            self.markets.add(new_prediction)
+            new_prediction.touch()
             
-            # Schedule prediction resolution
-            asyncio.create_task(self.schedule_prediction_resolution(new_prediction))
+            # Schedule betting close, creator notification and auto-refund
+            self.schedule_deadlines(new_prediction)
             
             # Format duration string
             duration_parts = []
@@ -642,64 +857,66 @@ class Economy(commands.Cog):
             try:
                 await interaction.followup.send(f"Error creating prediction: {str(e)}", ephemeral=True)
             except:
-                print(f"Failed to send error message: {str(e)}")
+                logger.exception("Failed to send error message: %s", e)
 
-    async def schedule_prediction_resolution(self, prediction: Prediction):
-        try:
-            # Wait for betting period to end
-            time_until_betting_ends = (prediction.end_time - datetime.datetime.utcnow()).total_seconds()
-            if time_until_betting_ends > 0:
-                print(f"DEBUG: Waiting {time_until_betting_ends} seconds for betting to end")
-                await asyncio.sleep(time_until_betting_ends)
-            
-            # Don't proceed if already resolved
-            if prediction.resolved:
-                print("DEBUG: Prediction already resolved before betting end")
-                return
-                
-            print(f"DEBUG: Betting period ended for {prediction.question}")
-            
-            # Notify creator that betting period has ended
-            try:
-                creator = await self.bot.fetch_user(prediction.creator_id)
-                await creator.send(
-                    f"🎲 Betting has ended for your prediction: '{prediction.question}'\n"
-                    f"Please use `/resolve_prediction` to resolve the market.\n"
-                    f"If not resolved within 5 days, all bets will be automatically refunded."
-                )
-                print(f"DEBUG: Sent notification to creator {prediction.creator_id}")
-            except Exception as e:
-                print(f"DEBUG: Error notifying creator: {e}")
+    def schedule_deadlines(self, prediction: Prediction):
+        """Register the betting-close, creator-notify and refund deadlines for a market"""
+        if prediction.resolved:
+            return
+        self.scheduler.schedule(
+            (prediction.id, CLOSE_DEADLINE), prediction.end_time,
+            lambda: self.close_betting(prediction)
+        )
+        if not prediction.creator_notified:
+            self.scheduler.schedule(
+                (prediction.id, NOTIFY_DEADLINE), prediction.end_time,
+                lambda: self.notify_creator(prediction)
+            )
+        self.scheduler.schedule(
+            (prediction.id, REFUND_DEADLINE), prediction.end_time + REFUND_DELAY,
+            lambda: self.auto_refund(prediction)
+        )
 
-            # Wait 48 hours
-            print("DEBUG: Starting 120-hour wait")
-            await asyncio.sleep(120 * 3600)  # 120 hours in seconds
-            
-            # Check if resolved during wait
-            if prediction.resolved:
-                print("DEBUG: Prediction resolved during 5-day wait")
-                return
-                
-            print("DEBUG: Starting auto-refund process")
-            
-            # If we reach here, it's time to auto-refund
-            prediction.mark_as_refunded()
-            
-            # Return all bets to users
-            for option in prediction.bets:
-                for user_id, user_bet_info in prediction.bets[option].items():
-                    await self.points_manager.add_points(user_id, user_bet_info['amount'])
-                    try:
-                        user = await self.bot.fetch_user(user_id)
-                        await user.send(
-                            f"💰 Your bet of {user_bet_info['amount']:,} Points has been refunded for the expired market:\n"
-                            f"'{prediction.question}'"
-                        )
-                    except Exception as e:
-                        print(f"DEBUG: Error sending refund notification: {e}")
-                    
+    def cancel_deadlines(self, prediction: Prediction):
+        """Drop any deadlines still pending for a market"""
+        for kind in (CLOSE_DEADLINE, NOTIFY_DEADLINE, REFUND_DEADLINE):
+            self.scheduler.cancel((prediction.id, kind))
+
+    async def close_betting(self, prediction: Prediction):
+        """Betting period is over: move the market to pending and let its bet panels render as ended"""
+        logger.info("Betting period ended for market %s", prediction.id, market=prediction.id, debug=lambda: {'question': prediction.question})
+        self.markets.advance()
+        prediction.touch()
+
+    async def notify_creator(self, prediction: Prediction):
+        """Notify creator that betting period has ended"""
+        if prediction.resolved:
+            return
+        try:
+            creator = await self.users.get_user(prediction.creator_id)
+            await creator.send(
+                f"🎲 Betting has ended for your prediction: '{prediction.question}'\n"
+                f"Please use `/resolve_prediction` to resolve the market.\n"
+                f"If not resolved within 5 days, all bets will be automatically refunded."
+            )
+            logger.debug("Sent notification to creator %s", prediction.creator_id, market=prediction.id)
         except Exception as e:
-            print(f"DEBUG: Error in schedule_prediction_resolution: {e}")
+            logger.warning("Error notifying creator %s: %s", prediction.creator_id, e, market=prediction.id)
+        prediction.creator_notified = True
+        self.events.append('notified', market=prediction.id)
+        self.store.mark_market_dirty(prediction)
+
+    async def auto_refund(self, prediction: Prediction):
+        """Refund every bet on a market that was not resolved in time"""
+        if prediction.resolved:
+            logger.debug("Market %s resolved during the refund wait", prediction.id, market=prediction.id)
+            return
+
+        logger.info("Refunding unresolved market %s", prediction.id, market=prediction.id)
+        prediction.mark_as_refunded()
+
+        # Return all bets to users, one refund per user across options
+        await self.settlement.settle(prediction, prediction.settlement_entries())
 
     @app_commands.guild_only()
     @app_commands.command(name="bet", description="Place a bet on a prediction")
@@ -707,13 +924,13 @@ class Economy(commands.Cog):
         await interaction.response.defer(ephemeral=True)
 
         # If there are no active predictions, inform the user
-        active_predictions = [prediction for prediction in self.predictions if not prediction.resolved and prediction.end_time > datetime.datetime.utcnow()]
-        if not active_predictions:
+        self.markets.advance()
+        if not self.markets.count(ACTIVE):
             await interaction.followup.send("No active predictions at the moment.", ephemeral=True)
             return
 
-        # Get all unique categories
-        categories = list(set(prediction.category for prediction in active_predictions if prediction.category))
+        # Categories that have an active market
+        categories = self.markets.categories(ACTIVE)
         categories.append("All")
 
         # Create buttons for each category
@@ -726,10 +943,11 @@ class Economy(commands.Cog):
             async def callback(self, button_interaction: discord.Interaction):
                 await button_interaction.response.defer(ephemeral=True)  # Defer the response first
 
+                self.cog.markets.advance()
                 if self.category == "All":
-                    filtered_predictions = active_predictions
+                    filtered_predictions = self.cog.markets.with_status(ACTIVE)
                 else:
-                    filtered_predictions = [prediction for prediction in active_predictions if prediction.category == self.category]
+                    filtered_predictions = self.cog.markets.in_category(self.category, ACTIVE)
 
                 if not filtered_predictions:
                     await button_interaction.followup.send("No predictions available for this category.", ephemeral=True)
@@ -743,38 +961,32 @@ class Economy(commands.Cog):
                             discord.SelectOption(
                                 label=prediction.question, 
                                 description=f"Ends at {prediction.end_time.strftime('%Y-%m-%d %H:%M:%S UTC')}", 
-                                value=str(index)
+                                value=str(prediction.id)
                             )
-                            for index, prediction in enumerate(predictions)
+                            for prediction in predictions
                         ]
                         super().__init__(placeholder="Select a prediction to bet on...", min_values=1, max_values=1, options=options)
 
                     async def callback(self, interaction: discord.Interaction):
                         await interaction.response.defer(ephemeral=True)
                         
-                        selected_index = int(self.values[0])
-                        selected_prediction = filtered_predictions[selected_index]
+                        # Values are market ids, so the selection still resolves after the list changed
+                        selected_prediction = self.cog.markets.get(int(self.values[0]))
 
                         # Check if prediction has ended
-                        if selected_prediction.end_time <= datetime.datetime.utcnow():
+                        if selected_prediction is None or selected_prediction.end_time <= datetime.datetime.utcnow():
                             await interaction.followup.send("This prediction has already ended!", ephemeral=True)
                             return
 
-                        view = OptionButtonView(selected_prediction, self.cog)
-                        prices = selected_prediction.get_current_prices(100)
-                        
-                        market_info = "**Current Market Prices**\n\n"
-                        for option in selected_prediction.options:
-                            price = prices[option]['price_per_share']
-                            market_info += f"{option}: {price:.2f} Points/Share\n"
-                        
+                        panel = BetPanel(selected_prediction, self.cog)
+                        edit = await panel.render()
                         message = await interaction.followup.send(
-                            content=market_info,
-                            view=view, 
+                            **edit,
                             ephemeral=True,
                             wait=True  # Make sure we wait for the message to be sent
                         )
-                        view.stored_interaction = message  # Store the message, not the interaction
+                        panel.stored_interaction = message  # Store the message, not the interaction
+                        self.cog.refresh_hub.subscribe(panel, sent=edit)
 
                 class PredictionSelectView(discord.ui.View):
                     def __init__(self, predictions, cog):
@@ -803,101 +1015,31 @@ class Economy(commands.Cog):
         try:
             await interaction.response.defer(ephemeral=True)
             
-            # Remove any existing view for this user
-            for view in list(self.active_views):
-                if isinstance(view, ListPredictionsView):
-                    view.stop_auto_update()
-                    self.active_views.discard(view)
-
-            view = ListPredictionsView(self)
-            self.active_views.add(view)  # Add to set of active views
-
-            current_embed = discord.Embed(
-                title="🎲 Prediction Markets",
-                description="Current prediction markets available for betting.",
-                color=discord.Color.blue()
-            )
+            # One page at a time; the pagination buttons carry the page in their custom_id
+            panel = MarketListPanel(self)
+            edit = await panel.render()
+            message = await interaction.followup.send(**edit, ephemeral=True, wait=True)
+            panel.stored_interaction = message
+            self.refresh_hub.subscribe(panel, sent=edit)
 
-            # Initial display of markets
-            active_markets = []
-            inactive_markets = []
-            resolved_markets = []
-            refunded_markets = []
-            pending_resolution_markets = []  # New list for pending resolution
-
-            for prediction in self.predictions:
-                prices = prediction.get_current_prices(100)
-                combined_data = (prediction.question, prediction, prices, prediction.creator_id)
-
-                if prediction.resolved:
-                    if prediction.refunded:
-                        refunded_markets.append(combined_data)
-                    else:
-                        resolved_markets.append(combined_data)
-                elif prediction.end_time <= datetime.datetime.utcnow():
-                    inactive_markets.append(combined_data)
-                else:
-                    active_markets.append(combined_data)
-
-                # Check for pending resolution
-                if prediction.end_time <= datetime.datetime.utcnow() and not prediction.resolved:
-                    pending_resolution_markets.append(combined_data)  # Add to pending resolution
-
-            # Add markets to embed using the same create_market_display method
-            if active_markets:
-                current_embed.add_field(name=" Active Markets", value="\u200b", inline=False)
-                for question, prediction, prices, creator_id in active_markets:
-                    creator_name = (await self.bot.fetch_user(creator_id)).name
-                    current_embed.add_field(
-                        name=f"📊 {question} (Created by: {creator_name})",
-                        value=view.create_market_display(prediction, prices),
-                        inline=False
-                    )
-
-            # Add pending resolution markets
-            if pending_resolution_markets:
-                current_embed.add_field(name="🟡 Pending Resolution", value="\u200b", inline=False)
-                for question, prediction, prices, creator_id in pending_resolution_markets:
-                    creator_name = (await self.bot.fetch_user(creator_id)).name
-                    current_embed.add_field(
-                        name=f"📊 {question} (Created by: {creator_name})",
-                        value=view.create_market_display(prediction, prices),
-                        inline=False
-                    )
-
-            # Add other sections similarly...
-
-            current_embed.set_footer(text="Use /bet to place bets on active markets")
-            message = await interaction.followup.send(embed=current_embed, ephemeral=True)
-            view.stored_interaction = message
-            
         except Exception as e:
             await interaction.followup.send(f"An error occurred: {str(e)}", ephemeral=True)
 
-        # Optional: Auto-cleanup after a certain time
-        await asyncio.sleep(300)  # 5 minutes
-        if view in self.active_views:
-            view.stop_auto_update()
-            self.active_views.discard(view)
-
     @app_commands.guild_only()
     @app_commands.command(name="resolve_prediction", description="Vote to resolve a prediction")
     async def resolve_prediction_command(self, interaction: discord.Interaction):
         # Check if the user has the required roles
-        allowed_role_ids = {1227314810853523526} # 1227314810853523526, 1301959367536672838, 1301958607046443018, 1301958999092236389, 
         user_roles = {role.id for role in interaction.user.roles}
 
-        if not user_roles.intersection(allowed_role_ids):
+        if not user_roles.intersection(RESOLVER_ROLE_IDS):
             await interaction.response.send_message("You do not have permission to resolve predictions.", ephemeral=True)
             return
         
         await interaction.response.defer(ephemeral=True)
         
         # Show all unresolved predictions that have ended
-        unresolved_predictions = [
-            pred for pred in self.predictions 
-            if not pred.resolved and pred.end_time <= datetime.datetime.utcnow()
-        ]
+        self.markets.advance()
+        unresolved_predictions = self.markets.with_status(PENDING)
         
         if not unresolved_predictions:
             await interaction.followup.send(
@@ -908,14 +1050,15 @@ class Economy(commands.Cog):
 
         # Create selection menu for predictions
         class PredictionSelect(discord.ui.Select):
-            def __init__(self, predictions):
+            def __init__(self, predictions, cog):
+                self.cog = cog
                 options = [
                     discord.SelectOption(
                         label=prediction.question[:100], 
                         description=f"Ended {prediction.end_time.strftime('%Y-%m-%d %H:%M:%S UTC')}", 
-                        value=str(index)
+                        value=str(prediction.id)
                     )
-                    for index, prediction in enumerate(predictions)
+                    for prediction in predictions
                 ]
                 super().__init__(
                     placeholder="Select a prediction to resolve...", 
@@ -925,8 +1068,10 @@ class Economy(commands.Cog):
                 )
 
             async def callback(self, interaction: discord.Interaction):
-                selected_index = int(self.values[0])
-                selected_prediction = unresolved_predictions[selected_index]
+                selected_prediction = self.cog.markets.get(int(self.values[0]))
+                if selected_prediction is None or selected_prediction.resolved:
+                    await interaction.response.send_message("This prediction is no longer open for resolution.", ephemeral=True)
+                    return
                 
                 # Check if the user has already voted on this prediction
                 if selected_prediction.has_voted(interaction.user.id):
@@ -943,224 +1088,334 @@ class Economy(commands.Cog):
                 # for option in selected_prediction.options:
                     # embed.add_field(name=option, value=f"Votes: {len(selected_prediction.votes[option])}", inline=False)
 
-                view = discord.ui.View()
-
-                for option in selected_prediction.options:
-                    button = discord.ui.Button(label=option, style=discord.ButtonStyle.primary)
-
-                    async def button_callback(interaction: discord.Interaction, option=option):
-                        # Add role check here as well
-                        user_roles = {role.id for role in interaction.user.roles}
-                        if not user_roles.intersection(allowed_role_ids):
-                            await interaction.response.send_message("You do not have permission to vote on predictions.", ephemeral=True)
-                            return
-
-                        if selected_prediction.has_voted(interaction.user.id):
-                            await interaction.response.send_message("You have already voted on this prediction!", ephemeral=True)
-                            return
-
-                        selected_prediction.vote(interaction.user.id, option)
-                        await interaction.response.send_message(f"You voted for {option}.", ephemeral=True)
-
-                        # Check if the threshold is met
-                        if len(selected_prediction.votes[option]) >= 9:  # Adjust threshold as needed
-                            await selected_prediction.async_resolve(option)
-                            await interaction.channel.send(f"Market resolved! The winning option is: {option}")
-                            await interaction.message.edit(embed=embed, view=None)  # Disable buttons after resolution
-                        else:
-                            await interaction.message.edit(embed=embed)  # Update embed with new vote count
-
-                    button.callback = button_callback
-                    view.add_item(button)
+                view = component_view(*(
+                    VoteButton(selected_prediction.id, index, option)
+                    for index, option in enumerate(selected_prediction.options)
+                ))
 
                 await interaction.response.send_message(embed=embed, view=view, ephemeral=False)
 
         view = discord.ui.View()
-        view.add_item(PredictionSelect(unresolved_predictions))
+        view.add_item(PredictionSelect(unresolved_predictions, self))
         await interaction.followup.send("Select a prediction to resolve:", view=view, ephemeral=True)
 
     @commands.Cog.listener()
     async def on_prediction_update(self, prediction: Prediction):
         """Event listener for when a prediction is updated"""
-        if prediction in self.active_views:
-            view = self.active_views[prediction]
-            if view.stored_interaction:
-                try:
-                    await view.refresh_view(view.stored_interaction)
-                except:
-                    # If update fails, clean up the view
-                    self.active_views.discard(prediction)
+        self.refresh_hub.notify(prediction)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """Runs before each of this cog's slash commands; starts the command timer and trace"""
+        interaction.extras['started'] = time.perf_counter()
+        # Activated in the command's own task, so the spans of everything the command calls nest under it
+        name = interaction.command.qualified_name if interaction.command else "command"
+        interaction.extras['span'] = TRACER.trace(f"/{name}", user=interaction.user.id).activate()
+        return True
+
+    @commands.Cog.listener()
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        self.record_command(interaction, command, "ok")
+
+    async def cog_app_command_error(self, interaction: discord.Interaction, error):
+        self.record_command(interaction, interaction.command, "error")
+
+    def record_command(self, interaction, command, status):
+        name = command.qualified_name if command else "unknown"
+        COMMAND_CALLS.labels(name, status).inc()
+        started = interaction.extras.get('started')
+        if started is not None:
+            COMMAND_LATENCY.labels(name).observe(time.perf_counter() - started)
+        span = interaction.extras.pop('span', None)
+        if span is not None:
+            span.set(status=status)
+            span.finish()
+
+    @app_commands.command(name="botstats", description="Show bot metrics (owner only)")
+    async def botstats(self, interaction: discord.Interaction):
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+            return
+        table = tabulate(METRICS.summary(), headers=["metric", "labels", "value"])
+        if len(table) <= BOTSTATS_LIMIT:
+            await interaction.response.send_message(f"```\n{table}\n```", ephemeral=True)
+        else:
+            await interaction.response.send_message(file=discord.File(io.BytesIO(table.encode()), filename="botstats.txt"), ephemeral=True)
+
+    @app_commands.command(name="traces", description="Download recent interaction traces (owner only)")
+    @app_commands.describe(format="chrome opens in chrome://tracing or Perfetto; json lists every span")
+    async def traces(self, interaction: discord.Interaction, format: Literal["chrome", "json"] = "chrome"):
+        if not await self.bot.is_owner(interaction.user):
+            await interaction.response.send_message("Only the bot owner can use this command.", ephemeral=True)
+            return
+        data = TRACER.export_chrome() if format == "chrome" else TRACER.export_json()
+        await interaction.response.send_message(
+            f"{len(TRACER.traces)} traces kept (sample rate {TRACER.sample_rate:g}, slow threshold {TRACER.slow_seconds * 1000:g} ms)",
+            file=discord.File(io.BytesIO(data.encode()), filename=f"traces-{format}.json"),
+            ephemeral=True
+        )
 
     async def update_prediction(self, prediction: Prediction):
-        """Call this method whenever a bet is placed"""
-        await self.on_prediction_update(prediction)
+        """Call this method whenever a prediction changes outside of Prediction's own methods"""
+        prediction.touch()
 
     # Modify the bet placement logic to trigger updates
     async def place_bet(self, user_id, prediction, option, amount):
-        """Place a bet on a prediction"""
+        """Place a bet on a prediction and return the shares bought"""
         try:
-            success = prediction.place_bet(user_id, option, amount)
-            if success:
-                await self.update_prediction(prediction)
-            return success
-        except Exception as e:
-            print(f"Error placing bet: {e}")
+            # Prediction.place_bet bumps the version, which triggers on_prediction_update
+            return await prediction.place_bet(user_id, option, amount)
+        except Exception:
+            logger.exception("Error placing bet", market=prediction.id, user=user_id, option=option, amount=amount)
             return False
 
-    async def cleanup_old_views(self):
-        """Remove expired views"""
-        for view in list(self.active_views):
-            if hasattr(view, 'prediction'):
-                if view.prediction.resolved or view.prediction.end_time <= datetime.datetime.utcnow():
-                    view.stop_auto_update()
-                    self.active_views.discard(view)
-
-class ListPredictionsView(discord.ui.View):
-    def __init__(self, cog, markets_per_page=1):
-        super().__init__(timeout=None)
-        self.cog = cog
-        self.stored_interaction = None
-        self.update_task = None
-        self.current_page = 0
-        self.markets_per_page = markets_per_page
-        self.all_markets = []
-        
-        # Add pagination buttons
-        self.add_item(discord.ui.Button(label="◀", custom_id="prev_page", style=discord.ButtonStyle.secondary))
-        self.add_item(discord.ui.Button(label="▶", custom_id="next_page", style=discord.ButtonStyle.secondary))
-        
-        self.start_auto_update()
+class MarketPageButton(discord.ui.DynamicItem[discord.ui.Button], template=r"markets:(?P<action>prev|next):(?P<page>[0-9]+)"):
+    """Pagination button of a market list; the page it was rendered on is in the custom_id"""
+    def __init__(self, action, page):
+        super().__init__(
+            discord.ui.Button(
+                label="◀" if action == "prev" else "▶",
+                style=discord.ButtonStyle.secondary,
+                custom_id=f"markets:{action}:{page}"
+            )
+        )
+        self.action = action
+        self.page = page
 
-    async def interaction_check(self, interaction: discord.Interaction) -> bool:
-        if interaction.data["custom_id"] == "prev_page":
-            await self.previous_page(interaction)
-        elif interaction.data["custom_id"] == "next_page":
-            await self.next_page(interaction)
-        return True
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match['action'], int(match['page']))
 
-    async def previous_page(self, interaction: discord.Interaction):
-        if self.current_page > 0:
-            self.current_page -= 1
-            await self.update_page(interaction)
-        else:
+    @traced("markets.page", root=True)
+    async def callback(self, interaction: discord.Interaction):
+        cog = economy_cog(interaction)
+        if cog is None:
             await interaction.response.defer()
-
-    async def next_page(self, interaction: discord.Interaction):
-        if (self.current_page + 1) * self.markets_per_page < len(self.all_markets):
-            self.current_page += 1
-            await self.update_page(interaction)
-        else:
+            return
+        # Keep the live panel in step if the hub still tracks this message; otherwise render statelessly
+        panel = cog.refresh_hub.find(interaction.message.id) or MarketListPanel(cog)
+        await cog.listing.refresh()
+        target = self.page - 1 if self.action == "prev" else self.page + 1
+        if not 0 <= target < panel.page_count():
             await interaction.response.defer()
+            return
+        panel.current_page = target
+        edit = await panel.render()
+        await interaction.response.edit_message(**edit)
+        cog.refresh_hub.record_sent(panel, edit)
 
-    async def update_page(self, interaction: discord.Interaction):
-        embed = await self.create_current_page_embed()
-        await interaction.response.edit_message(embed=embed)
+class MarketListing:
+    """The /list_predictions pages shared by every list panel, packed into embeds by Discord's size limits
 
-    async def create_current_page_embed(self):
-        start_idx = self.current_page * self.markets_per_page
-        end_idx = start_idx + self.markets_per_page
-        current_markets = self.all_markets[start_idx:end_idx]
+    The market registry reports every market it adds or re-files, and a refresh re-renders and
+    re-places just those rows, so its cost follows what changed rather than how many markets exist.
+    """
+    __slots__ = ('cog', 'pager', 'fields', 'rows', 'ids', 'changed', 'built', 'page_keys', 'lock')
 
-        embed = discord.Embed(
-            title="🎲 Prediction Markets",
-            description=f"Page {self.current_page + 1}/{math.ceil(len(self.all_markets)/self.markets_per_page)}",
-            color=discord.Color.blue()
-        )
-
-        for market_type, question, prediction, prices, creator_id in current_markets:
-            creator_name = (await self.cog.bot.fetch_user(creator_id)).name
-            embed.add_field(
-                name=f"{market_type} {question} (Created by: {creator_name})",
-                value=self.create_market_display(prediction, prices),
-                inline=False
+    def __init__(self, cog):
+        self.cog = cog
+        self.pager = EmbedPager(EMBED_CHAR_LIMIT - LIST_EMBED_RESERVED)
+        self.fields = {}  # market id -> (version, status, name, value), rendered once per market version
+        self.rows = []  # market ids in listing order
+        self.ids = {status: [] for status in LIST_ORDER}  # sorted market ids per status, i.e. the rows by section
+        self.changed = set()  # markets added or updated since the last refresh
+        self.built = False
+        self.page_keys = {}  # page -> what is on it, for the current layout
+        self.lock = asyncio.Lock()
+        cog.markets.on_change = self.mark_changed
+
+    def mark_changed(self, market_id):
+        self.changed.add(market_id)
+
+    @property
+    def page_count(self):
+        return len(self.pager)
+
+    def stale(self):
+        """Whether a market changed since the last refresh"""
+        self.cog.markets.advance()
+        return not self.built or bool(self.changed) or self.lock.locked()
+
+    def page_key(self, number):
+        """What a page shows: its markets at their rendered versions and statuses, and its position"""
+        number = max(0, min(number, self.page_count - 1))
+        key = self.page_keys.get(number)
+        if key is None:
+            start, stop = self.pager.page(number)
+            key = self.page_keys[number] = (
+                number,
+                self.page_count,
+                tuple((market_id, *self.fields[market_id][:2]) for market_id in self.rows[start:stop])
             )
-
-        embed.set_footer(text="Use /bet to place bets on active markets")
-        return embed
-
-    async def refresh_view(self):
-        if not self.stored_interaction:
-            return
-
-        try:
-            # Reset market lists
-            self.all_markets = []
-
-            # Process each prediction and categorize
-            for prediction in self.cog.predictions:
-                prices = prediction.get_current_prices(100)
-                
-                if prediction.resolved:
-                    if prediction.refunded:
-                        self.all_markets.append(("💰 REFUNDED", prediction.question, prediction, prices, prediction.creator_id))
-                    else:
-                        self.all_markets.append(("✅ RESOLVED", prediction.question, prediction, prices, prediction.creator_id))
-                elif prediction.end_time <= datetime.datetime.utcnow():
-                    if not prediction.resolved:
-                        self.all_markets.append(("🟡 PENDING", prediction.question, prediction, prices, prediction.creator_id))
-                    else:
-                        self.all_markets.append(("🔴 INACTIVE", prediction.question, prediction, prices, prediction.creator_id))
+        return key
+
+    async def refresh(self):
+        """Re-render the markets that changed and re-place their rows, repacking only the pages they affect"""
+        self.cog.markets.advance()
+        async with self.lock:
+            if not self.built or len(self.changed) * 4 > len(self.rows):
+                await self.rebuild()
+                return
+            if not self.changed:
+                return
+            changed, self.changed = sorted(self.changed), set()
+            # Render first: the rows below are then moved without awaiting, so pages are never half updated
+            updates = []
+            for market_id in changed:
+                prediction = self.cog.markets.get(market_id)
+                status = self.cog.markets.status_of(market_id)
+                field = self.fields.get(market_id)
+                if status is not None and (field is None or field[0] != prediction.version or field[1] != status):
+                    field = (prediction.version, status, *await self.render_field(status, prediction))
+                updates.append((market_id, status, field))
+
+            page_count = self.page_count
+            touched = set()
+            for market_id, status, field in updates:
+                old = self.fields.get(market_id)
+                if old is not None and old[1] != status:
+                    index = self.index_of(market_id, old[1])
+                    self.ids[old[1]].remove(market_id)
+                    del self.rows[index]
+                    self.pager.remove(index)
+                    touched.add(index)
+                if status is None:
+                    self.fields.pop(market_id, None)
+                    continue
+                self.fields[market_id] = field
+                size = len(field[2]) + len(field[3])
+                if old is None or old[1] != status:
+                    bisect.insort(self.ids[status], market_id)
+                    index = self.index_of(market_id, status)
+                    self.rows.insert(index, market_id)
+                    self.pager.insert(index, (status, market_id), size)
                 else:
-                    self.all_markets.append(("🟢 ACTIVE", prediction.question, prediction, prices, prediction.creator_id))
+                    index = self.index_of(market_id, status)
+                    self.pager.replace(index, (status, market_id), size)
+                touched.add(index)
+            repacked = self.pager.repack()
 
-            # Create and send the current page embed
-            embed = await self.create_current_page_embed()
-            await self.stored_interaction.edit(embed=embed, view=self)
+            if self.page_count != page_count:
+                self.page_keys = {}  # Every page shows the page count
+                return
+            stale_pages = {self.pager.page_of(index) for index in touched}
+            if repacked:
+                stale_pages.update(range(*repacked))
+            for page in stale_pages:
+                self.page_keys.pop(page, None)
+
+    async def rebuild(self):
+        """Render every market that changed and lay out all pages from scratch"""
+        self.changed = set()
+        rows = []
+        sizes = []
+        for status in LIST_ORDER:
+            self.ids[status] = []
+            for prediction in self.cog.markets.with_status(status):
+                field = self.fields.get(prediction.id)
+                if field is None or field[0] != prediction.version or field[1] != status:
+                    field = (prediction.version, status, *await self.render_field(status, prediction))
+                    self.fields[prediction.id] = field
+                self.ids[status].append(prediction.id)
+                rows.append(prediction.id)
+                sizes.append(((status, prediction.id), len(field[2]) + len(field[3])))
+        self.rows = rows
+        self.pager.layout(sizes)
+        self.page_keys = {}
+        self.built = True
+
+    def index_of(self, market_id, status):
+        """Position of a market's row: its section's offset plus its place among that section's ids"""
+        offset = 0
+        for section in LIST_ORDER:
+            if section == status:
+                return offset + bisect.bisect_left(self.ids[section], market_id)
+            offset += len(self.ids[section])
+        raise KeyError(status)
+
+    def page(self, number):
+        """(name, value) for every field on a page"""
+        start, stop = self.pager.page(number)
+        return [self.fields[market_id][2:] for market_id in self.rows[start:stop]]
+
+    async def render_field(self, status, prediction):
+        creator_name = await self.cog.users.get_name(prediction.creator_id)
+        name = f"{LIST_LABELS[status]} {prediction.question} (Created by: {creator_name})"
+        value = market_display(prediction, prediction.get_current_prices(100))
+        return clip(name, FIELD_NAME_LIMIT), clip(value, FIELD_VALUE_LIMIT)
+
+class MarketListPanel:
+    """Live /list_predictions message showing one page of the shared market listing"""
+    __slots__ = ('cog', 'current_page', 'stored_interaction')
+
+    def __init__(self, cog, current_page=0):
+        self.cog = cog
+        self.current_page = current_page
+        self.stored_interaction = None
 
-        except Exception as e:
-            print(f"Error refreshing list view: {e}")
-            self.stop_auto_update()
-
-    def create_market_display(self, prediction, prices):
-        """Create a PolyMarket-style display for a prediction"""
-        market_text = (
-            f"**Category:** {prediction.category or 'None'}\n"
-            f"**Total Volume:** {prediction.get_total_bets():,} Points\n"
-            f"**Ends:** <t:{int((prediction.end_time - datetime.timedelta(hours=6)).timestamp())}:R>\n\n"
-            "**Current Market Status:**\n"
+    def render_key(self):
+        # Keyed on this page's own contents, so a change elsewhere in the listing doesn't re-render it.
+        # A stale listing has to be refreshed by render() before the page contents are known, so the hub renders.
+        listing = self.cog.listing
+        return None if listing.stale() else listing.page_key(self.current_page)
+
+    def page_count(self):
+        return self.cog.listing.page_count
+
+    async def render(self):
+        """Build the current page embed from the shared listing"""
+        listing = self.cog.listing
+        await listing.refresh()
+        self.current_page = min(self.current_page, listing.page_count - 1)
+        key = listing.page_key(self.current_page)
+        # Every panel showing the same page contents shares one rendered edit and its digest
+        return self.cog.render_cache.get_or_render(
+            ('list', key),
+            lambda: RenderedEdit(
+                key=key,
+                embed=self.render_embed(listing),
+                view=component_view(
+                    MarketPageButton("prev", self.current_page),
+                    MarketPageButton("next", self.current_page)
+                )
+            )
         )
 
-        for option in prediction.options:
-            price_info = prices[option]
-            vote_count = len(prediction.votes[option])  # Get the number of votes for the option
-            market_text += (
-                f"```\n"
-                f"{option}\n"
-                f"Price: {price_info['price_per_share']:.2f} Points/Share\n"
-                f"Prob:  {price_info['probability']:.1f}%\n"
-                f"Volume: {price_info['total_bets']:,} Points\n"
-                f"Votes: {vote_count}\n"  # Display the number of votes
-                f"```\n"
-            )
+    def render_embed(self, listing):
+        embed = discord.Embed(
+            title=LIST_TITLE,
+            description=f"Page {self.current_page + 1}/{listing.page_count}",
+            color=discord.Color.blue()
+        )
 
-        return market_text
+        for name, value in listing.page(self.current_page):
+            embed.add_field(name=name, value=value, inline=False)
 
-    def start_auto_update(self):
-        """Start the auto-update task"""
-        if not self.update_task:
-            self.update_task = asyncio.create_task(self.auto_update_markets())
+        embed.set_footer(text=LIST_FOOTER)
+        return embed
 
-    def stop_auto_update(self):
-        """Stop the auto-update task"""
-        if self.update_task:
-            self.update_task.cancel()
-            self.update_task = None
+def market_display(prediction, prices):
+    """Create a PolyMarket-style display for a prediction"""
+    market_text = (
+        f"**Category:** {prediction.category or 'None'}\n"
+        f"**Total Volume:** {prediction.get_total_bets():,} Points\n"
+        f"**Ends:** <t:{int((prediction.end_time - datetime.timedelta(hours=6)).timestamp())}:R>\n\n"
+        "**Current Market Status:**\n"
+    )
 
-    async def auto_update_markets(self):
-        """Auto-update markets every 5 seconds"""
-        try:
-            while True:
-                await self.refresh_view()
-                await asyncio.sleep(5)
-        except asyncio.CancelledError:
-            pass
-        except Exception as e:
-            print(f"Error in auto_update_markets: {e}")
+    for option in prediction.options:
+        price_info = prices[option]
+        vote_count = prediction.vote_count(option)  # Get the number of votes for the option
+        market_text += (
+            f"```\n"
+            f"{option}\n"
+            f"Price: {price_info['price_per_share']:.2f} Points/Share\n"
+            f"Prob:  {price_info['probability']:.1f}%\n"
+            f"Volume: {price_info['total_bets']:,} Points\n"
+            f"Votes: {vote_count}\n"  # Display the number of votes
+            f"```\n"
+        )
 
-    def __del__(self):
-        """Cleanup when the view is destroyed"""
-        self.stop_auto_update()
-        self.cog.active_views.discard(self)
+    return market_text
 
 class PointsManagerSingleton:
     def __init__(self, session, base_url, realm_id):
@@ -1185,10 +1440,10 @@ class PointsManagerSingleton:
                     return True  # Successfully added points
                 else:
                     response_text = await response.text()
-                    print(f"Failed to add points: {response.status} - {response_text}")  # Log the status code and response text
+                    logger.error("Failed to add points: %s - %s", response.status, response_text, user=user_id)
                     return False  # Failed to add points
-        except Exception as e:
-            print(f"Error adding points to user {user_id}: {e}")
+        except Exception:
+            logger.exception("Error adding points to user %s", user_id)
             return False  # Return False on error
 
 async def setup(bot: commands.Bot) -> None:
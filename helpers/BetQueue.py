@@ -0,0 +1,54 @@
+import asyncio
+from collections import deque
+from typing import Callable, List, Sequence
+
+
+class BetQueue:
+    """
+    Single-consumer bet queue owned by one market.
+
+    ``submit`` never blocks: it appends the bet and returns a future for its
+    result. One consumer task per market drains the queue in arrival order,
+    hands every bet that arrived in the same event-loop tick to
+    ``apply_batch`` in one call, and resolves each future with that bet's
+    result. ``apply_batch`` is synchronous, so nothing can interleave with a
+    batch. Markets share no lock, and the consumer task exits as soon as its
+    queue is empty.
+    """
+
+    __slots__ = ('apply_batch', 'max_batch', '_queue', '_task')
+
+    def __init__(self, apply_batch: Callable[[List[tuple]], Sequence], max_batch: int = 256):
+        self.apply_batch = apply_batch
+        self.max_batch = max_batch
+        self._queue = deque()
+        self._task = None
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def submit(self, *bet) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((bet, future))
+        if self._task is None:
+            self._task = asyncio.create_task(self._drain())
+        return future
+
+    async def _drain(self):
+        try:
+            while self._queue:
+                # Yield once so the rest of a burst lands in the same batch
+                await asyncio.sleep(0)
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+                try:
+                    results = self.apply_batch([bet for bet, _ in batch])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._task = None
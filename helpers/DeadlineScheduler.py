@@ -0,0 +1,145 @@
+import asyncio
+import datetime
+import itertools
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional
+
+from helpers.Logging import get_logger
+
+logger = get_logger(__name__)
+
+# Upper bound on a single sleep so wall-clock jumps are picked up reasonably fast.
+MAX_SLEEP_SECONDS = 3600
+
+
+class DeadlineScheduler:
+    """
+    One task that fires every market deadline.
+
+    Deadlines live in an indexed binary heap ordered by due time, with a
+    key -> position map so both schedule and cancel are O(log n). Times are
+    naive UTC datetimes, the same as ``Prediction.end_time``. Deadlines that
+    are already due when scheduled fire on the next loop iteration, which is
+    how missed deadlines are caught up after a restart.
+    """
+
+    def __init__(self):
+        self._heap: List[list] = []  # [when, seq, key, callback]
+        self._index: Dict[Hashable, int] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running = set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._index
+
+    @property
+    def pending(self) -> int:
+        """Number of deadlines waiting to fire."""
+        return len(self._heap)
+
+    def next_deadline(self) -> Optional[datetime.datetime]:
+        return self._heap[0][0] if self._heap else None
+
+    def start(self):
+        """Start the background task that fires deadlines."""
+        if not self._task:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop firing deadlines and cancel callbacks that are still running."""
+        tasks = list(self._running)
+        if self._task:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def schedule(self, key: Hashable, when: datetime.datetime, callback: Callable[[], Awaitable]):
+        """Schedule ``callback`` to run at ``when``, replacing any deadline with the same key."""
+        self.cancel(key)
+        entry = [when, next(self._seq), key, callback]
+        self._heap.append(entry)
+        self._index[key] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def cancel(self, key: Hashable) -> bool:
+        """Remove a pending deadline. Returns False if it was not scheduled."""
+        position = self._index.pop(key, None)
+        if position is None:
+            return False
+        last = self._heap.pop()
+        if position < len(self._heap):
+            self._heap[position] = last
+            self._index[last[2]] = position
+            self._sift_up(position)
+            self._sift_down(position)
+        return True
+
+    def _pop(self) -> list:
+        entry = self._heap[0]
+        self.cancel(entry[2])
+        return entry
+
+    def _less(self, i: int, j: int) -> bool:
+        return self._heap[i][:2] < self._heap[j][:2]
+
+    def _swap(self, i: int, j: int):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._index[heap[i][2]] = i
+        self._index[heap[j][2]] = j
+
+    def _sift_up(self, position: int):
+        while position > 0:
+            parent = (position - 1) // 2
+            if not self._less(position, parent):
+                break
+            self._swap(position, parent)
+            position = parent
+
+    def _sift_down(self, position: int):
+        size = len(self._heap)
+        while True:
+            smallest = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and self._less(child, smallest):
+                    smallest = child
+            if smallest == position:
+                break
+            self._swap(position, smallest)
+            position = smallest
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = (self._heap[0][0] - datetime.datetime.utcnow()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, MAX_SLEEP_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, key, callback = self._pop()
+            task = asyncio.create_task(self._fire(key, callback))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _fire(self, key: Hashable, callback: Callable[[], Awaitable]):
+        try:
+            await callback()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Error running deadline %s", key)
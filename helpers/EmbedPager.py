@@ -0,0 +1,143 @@
+import bisect
+from typing import Hashable, List, Optional, Sequence, Tuple
+
+# Discord embed limits
+EMBED_CHAR_LIMIT = 6000
+EMBED_FIELD_LIMIT = 25
+FIELD_NAME_LIMIT = 256
+FIELD_VALUE_LIMIT = 1024
+
+
+def clip(text: str, limit: int) -> str:
+    """Shorten ``text`` to at most ``limit`` characters, marking the cut."""
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+class EmbedPager:
+    """
+    Packs embed fields into as few pages as Discord's limits allow.
+
+    ``layout`` takes the fields in display order as (key, size) pairs, where
+    size is the characters the field adds to an embed (name plus value).
+    Pages are filled greedily until the next field would exceed
+    ``max_fields`` or ``char_budget``. The layout is incremental: pages
+    that end before the first field that changed since the previous call are
+    kept, and packing resumes from the first page it could affect.
+
+    Single fields can also be changed in place with ``replace``, ``insert``
+    and ``remove`` followed by ``repack``. Repacking then also stops as soon
+    as a page break lands where one was before, past every changed field:
+    from there on the pages are the same as before.
+    """
+
+    def __init__(self, char_budget: int = EMBED_CHAR_LIMIT, max_fields: int = EMBED_FIELD_LIMIT):
+        self.char_budget = char_budget
+        self.max_fields = max_fields
+        self._items: List[Tuple[Hashable, int]] = []
+        self._starts: List[int] = [0]  # index of the first field on each page
+        self._changed: Optional[Tuple[int, int]] = None  # first and last field changed since the last repack
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def layout(self, items: Sequence[Tuple[Hashable, int]]) -> List[Tuple[int, int]]:
+        """Lay out ``items`` and return (start, stop) field ranges, one per page."""
+        items = list(items)
+        old = self._items
+        changed = next(
+            (i for i, (new_item, old_item) in enumerate(zip(items, old)) if new_item != old_item),
+            min(len(items), len(old))
+        )
+        if changed == len(items) == len(old) and self._changed is None:
+            return self.pages()
+
+        # A page's end depends on its own fields and on the first field of the next page,
+        # so repacking starts at the earliest page whose fields or overflow field changed
+        page = max(0, bisect.bisect_left(self._starts, changed) - 1)
+        starts = self._starts[:page + 1]
+        count = used = 0
+        for i in range(starts[-1], len(items)):
+            size = items[i][1]
+            if count and (count == self.max_fields or used + size > self.char_budget):
+                starts.append(i)
+                count = used = 0
+            count += 1
+            used += size
+        self._items = items
+        self._starts = starts
+        self._changed = None
+        return self.pages()
+
+    def page_of(self, index: int) -> int:
+        """Page that field ``index`` is on."""
+        return max(0, bisect.bisect_right(self._starts, index) - 1)
+
+    def replace(self, index: int, key: Hashable, size: int):
+        """Change the field at ``index``; only a new size needs a repack."""
+        if self._items[index][1] != size:
+            self._mark(index)
+        self._items[index] = (key, size)
+
+    def insert(self, index: int, key: Hashable, size: int):
+        """Insert a field before ``index``."""
+        self._items.insert(index, (key, size))
+        # Later pages keep their first field, which moved up by one
+        self._starts[1:] = [start + 1 if start >= index else start for start in self._starts[1:]]
+        if self._changed and self._changed[1] >= index:
+            self._changed = (self._changed[0] + (self._changed[0] >= index), self._changed[1] + 1)
+        self._mark(index)
+
+    def remove(self, index: int):
+        """Remove the field at ``index``."""
+        del self._items[index]
+        self._starts[1:] = [start - 1 if start > index else start for start in self._starts[1:]]
+        if self._changed and self._changed[1] > index:
+            self._changed = (self._changed[0] - (self._changed[0] > index), self._changed[1] - 1)
+        # The field now at ``index`` follows a different one
+        self._mark(min(index, len(self._items)))
+
+    def repack(self) -> Optional[Tuple[int, int]]:
+        """
+        Repack the pages affected by ``replace``, ``insert`` and ``remove`` since
+        the last call. Returns the range of pages whose fields changed, or None.
+        """
+        if self._changed is None:
+            return None
+        first, last = self._changed
+        self._changed = None
+        old = self._starts
+        page = max(0, bisect.bisect_left(old, first) - 1)
+        starts = old[:page + 1]
+        count = used = 0
+        for i in range(starts[-1], len(self._items)):
+            size = self._items[i][1]
+            if count and (count == self.max_fields or used + size > self.char_budget):
+                if i > last:
+                    j = bisect.bisect_left(old, i)
+                    if j < len(old) and old[j] == i:
+                        # Same break over the same fields as before: the rest is unchanged
+                        self._starts = starts + old[j:]
+                        return page, len(starts)
+                starts.append(i)
+                count = used = 0
+            count += 1
+            used += size
+        self._starts = starts
+        return page, len(starts)
+
+    def _mark(self, index: int):
+        if self._changed is None:
+            self._changed = (index, index)
+        else:
+            self._changed = (min(self._changed[0], index), max(self._changed[1], index))
+
+    def pages(self) -> List[Tuple[int, int]]:
+        stops = self._starts[1:] + [max(len(self._items), self._starts[-1])]
+        return list(zip(self._starts, stops))
+
+    def page(self, number: int) -> Tuple[int, int]:
+        """(start, stop) of one page; out-of-range numbers are clamped."""
+        number = max(0, min(number, len(self._starts) - 1))
+        start = self._starts[number]
+        stop = self._starts[number + 1] if number + 1 < len(self._starts) else len(self._items)
+        return start, stop
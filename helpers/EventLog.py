@@ -0,0 +1,227 @@
+import asyncio
+import glob
+import json
+import os
+import time
+from typing import Iterator, List, Optional, Tuple
+
+from helpers.Logging import get_logger
+
+logger = get_logger(__name__)
+
+SEGMENT_BYTES = 16 * 1024 * 1024
+SEGMENT_PATTERN = "events-{:012d}.jsonl"
+
+
+class EventLog:
+    """
+    Append-only log of every market mutation, one JSON object per line.
+
+    ``append`` never blocks: it assigns the next sequence number, buffers the
+    encoded line and wakes a background writer. The writer appends whatever
+    has piled up to the current segment and fsyncs once per batch, off the
+    event loop. Segments roll over at ``segment_bytes`` and are named after
+    their first sequence number, so a reader can skip straight to the tail.
+
+    ``sync`` waits until the events appended so far are on disk; callers
+    that acknowledge a change to a user await it first, so an acknowledged
+    change survives a crash. The market store records the sequence number
+    its last flush covers, and only once the log is durable up to it, so
+    recovery loads the store and replays only the events after it (see
+    ``read``). The full log doubles as an audit trail and as a recorded
+    workload that can be replayed offline.
+    """
+
+    def __init__(self, directory: str, flush_interval: float = 0.05, segment_bytes: int = SEGMENT_BYTES):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.last_seq = 0
+        self._buffer: List[bytes] = []
+        self._file = None
+        self._written_seq = 0
+        self._durable_waiters: List[Tuple[int, asyncio.Future]] = []
+        self._wake_event = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def open(self, min_seq: int = 0):
+        """
+        Find the end of the log, drop a torn final line and start the writer.
+        Sequence numbers continue after ``min_seq`` (the store checkpoint) even if
+        the log on disk ends before it, so a number the store has seen is never reused.
+        """
+        if self._file:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        existing = segments(self.directory)
+        if existing:
+            path = existing[-1]
+            self.last_seq = await asyncio.to_thread(self._recover_tail, path)
+            if not self.last_seq:
+                # Empty last segment: it was named after the sequence it was opened for
+                self.last_seq = self._first_seq(path) - 1
+        else:
+            path = self._segment_path(1)
+        if min_seq > self.last_seq:
+            logger.warning("Event log ends at %d, before the store checkpoint %d; continuing after the checkpoint", self.last_seq, min_seq)
+            self.last_seq = min_seq
+        self._written_seq = self.last_seq
+        self._file = open(path, 'ab')
+        self._task = asyncio.create_task(self._writer())
+
+    async def close(self):
+        """Write and fsync everything still buffered, then close the segment."""
+        if not self._file:
+            return
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        self._file.close()
+        self._file = None
+        for _, waiter in self._durable_waiters:
+            if not waiter.done():
+                waiter.set_exception(RuntimeError("Event log closed before the event was written"))
+        self._durable_waiters = []
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def durable_seq(self) -> int:
+        """Sequence number of the last event known to be fsynced."""
+        return self._written_seq
+
+    def append(self, type: str, **fields) -> int:
+        """Record an event and return its sequence number."""
+        self.last_seq += 1
+        event = {'seq': self.last_seq, 'ts': round(time.time(), 3), 'type': type, **fields}
+        self._buffer.append(json.dumps(event, separators=(',', ':')).encode() + b'\n')
+        self._wake_event.set()
+        return self.last_seq
+
+    async def flush(self):
+        """Append the buffered events to disk with a single fsync."""
+        async with self._flush_lock:
+            if not self._buffer or not self._file:
+                return
+            lines, self._buffer = self._buffer, []
+            last_seq = self._written_seq + len(lines)
+            try:
+                await asyncio.to_thread(self._write, b''.join(lines), last_seq)
+            except Exception:
+                self._buffer[:0] = lines
+                raise
+            self._wake_durable_waiters()
+
+    async def sync(self, seq: Optional[int] = None):
+        """
+        Wait until every event up to ``seq`` (by default, every event appended so
+        far) is on disk. Waiters share the writer's next batched fsync.
+        """
+        seq = self.last_seq if seq is None else seq
+        if self._written_seq >= seq:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._durable_waiters.append((seq, waiter))
+        self._wake_event.set()
+        await waiter
+
+    def _wake_durable_waiters(self):
+        waiting = []
+        for seq, waiter in self._durable_waiters:
+            if seq <= self._written_seq:
+                if not waiter.done():
+                    waiter.set_result(None)
+            else:
+                waiting.append((seq, waiter))
+        self._durable_waiters = waiting
+
+    def read(self, after_seq: int = 0) -> Iterator[dict]:
+        """Yield every event with a sequence number above ``after_seq``, oldest first."""
+        return read_events(self.directory, after_seq)
+
+    def _write(self, data: bytes, last_seq: int):
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._written_seq = last_seq
+        if self._file.tell() >= self.segment_bytes:
+            self._file.close()
+            self._file = open(self._segment_path(last_seq + 1), 'ab')
+
+    def _recover_tail(self, path: str) -> int:
+        # A crash mid-write can leave a partial last line; cut it off so new events start clean
+        last_seq = 0
+        good_bytes = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                last_seq = event['seq']
+                good_bytes += len(line)
+        if good_bytes != os.path.getsize(path):
+            logger.warning("Truncating torn event log tail in %s", path, kept_bytes=good_bytes)
+            with open(path, 'r+b') as f:
+                f.truncate(good_bytes)
+        return last_seq
+
+    def _segment_path(self, first_seq: int) -> str:
+        return os.path.join(self.directory, SEGMENT_PATTERN.format(first_seq))
+
+    @staticmethod
+    def _first_seq(path: str) -> int:
+        return int(os.path.basename(path)[len("events-"):-len(".jsonl")])
+
+    async def _writer(self):
+        while True:
+            await self._wake_event.wait()
+            # Let a burst of events share one fsync
+            await asyncio.sleep(self.flush_interval)
+            self._wake_event.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error writing event log")
+                self._wake_event.set()
+
+
+def segments(directory: str) -> List[str]:
+    """Segment files of the log in ``directory``, oldest first."""
+    return sorted(glob.glob(os.path.join(directory, "events-*.jsonl")))
+
+
+def read_events(directory: str, after_seq: int = 0) -> Iterator[dict]:
+    """
+    Yield the events in ``directory`` with a sequence number above ``after_seq``.
+
+    Works on a closed log, so a recorded workload can be replayed offline.
+    Segments that end before ``after_seq`` are skipped without being opened.
+    """
+    paths = segments(directory)
+    for i, path in enumerate(paths):
+        if i + 1 < len(paths) and EventLog._first_seq(paths[i + 1]) <= after_seq + 1:
+            continue
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # Torn tail from a crash; nothing after it was acknowledged
+                    break
+                if event['seq'] > after_seq:
+                    # A write retried after a failure can repeat events; never yield one twice
+                    after_seq = event['seq']
+                    yield event
@@ -0,0 +1,77 @@
+"""
+Logarithmic market scoring rule (LMSR) market maker for N-outcome markets.
+
+State is the vector ``q`` of shares sold per outcome and the liquidity
+parameter ``b``. The cost function is ``C(q) = b * log(sum(exp(q_i / b)))``
+and prices are its gradient, ``softmax(q / b)``, so they always sum to 1.
+Every function works on the shifted exponentials ``exp(q_i / b - max)``,
+so nothing overflows however lopsided a market gets.
+"""
+import math
+from typing import List, Sequence, Tuple
+
+
+def _scaled(q: Sequence[float], b: float) -> Tuple[float, List[float], float]:
+    """Return (max(q / b), [exp(q_i / b - max)], sum of those)."""
+    top = max(q) / b
+    weights = [math.exp(x / b - top) for x in q]
+    return top, weights, sum(weights)
+
+
+def cost(q: Sequence[float], b: float) -> float:
+    """Market maker cost function C(q)."""
+    top, _, total = _scaled(q, b)
+    return b * (top + math.log(total))
+
+
+def prices(q: Sequence[float], b: float) -> List[float]:
+    """Instantaneous price of every outcome, in one pass."""
+    _, weights, total = _scaled(q, b)
+    return [weight / total for weight in weights]
+
+
+def cost_to_buy(q: Sequence[float], b: float, index: int, shares: float) -> float:
+    """Points needed to buy ``shares`` of outcome ``index``."""
+    after = list(q)
+    after[index] += shares
+    return cost(after, b) - cost(q, b)
+
+
+def _shares_from_scaled(q_i: float, b: float, top: float, weight: float, total: float, points: float) -> float:
+    # Solve C(q + d * e_i) - C(q) = points for d:
+    #   d = b * log(S * (exp(p / b) - 1) + exp(q_i / b)) - q_i
+    # rewritten in terms of x = p / b and the shifted weights so it stays finite.
+    x = points / b
+    inner = total * -math.expm1(-x) + weight * math.exp(-x)
+    return b * (top + x + math.log(inner)) - q_i
+
+
+def shares_for_cost(q: Sequence[float], b: float, index: int, points: float) -> float:
+    """Shares of outcome ``index`` that ``points`` buys (closed form)."""
+    if points <= 0:
+        return 0.0
+    top, weights, total = _scaled(q, b)
+    return _shares_from_scaled(q[index], b, top, weights[index], total, points)
+
+
+def quote_all(q: Sequence[float], b: float, points: float) -> Tuple[List[float], List[float]]:
+    """
+    Prices and the shares ``points`` would buy for every outcome.
+
+    Shares the exponentials between all outcomes, so quoting a 10-outcome
+    market costs one pass over the outcomes, like a binary one.
+    """
+    top, weights, total = _scaled(q, b)
+    outcome_prices = [weight / total for weight in weights]
+    if points <= 0:
+        return outcome_prices, [0.0] * len(q)
+    shares = [
+        _shares_from_scaled(q_i, b, top, weight, total, points)
+        for q_i, weight in zip(q, weights)
+    ]
+    return outcome_prices, shares
+
+
+def max_loss(outcomes: int, b: float) -> float:
+    """Worst-case subsidy the market maker can pay out: b * log(N)."""
+    return b * math.log(outcomes)
@@ -0,0 +1,187 @@
+"""
+Logging setup: every record goes through a queue to a background thread.
+
+Code that logs only pays for the level check, merging the message arguments
+and putting the record on an unbounded queue. Formatting and console and
+file writes happen on the listener thread. A burst of log lines, for
+example during mass settlement, then never stalls the event loop.
+
+Loggers from ``get_logger`` take keyword arguments as structured fields::
+
+    logger.info("Settled market %s", market_id, market=market_id, rows=len(rows),
+                debug=lambda: {'payouts': payouts})
+
+Fields are shown as ``key=value`` after the message in text output, or as
+keys of the JSON object in JSON output. ``debug`` fields, given as a dict
+or a callable that returns one, are only built and added when the logger
+is enabled for DEBUG.
+"""
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+TEXT_FORMAT = "[{asctime}] [{levelname:<8}] {name}: {message}"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Keyword arguments that Logger.log itself understands; any other keyword is a field
+_LOG_KWARGS = frozenset(('exc_info', 'stack_info', 'stacklevel', 'extra'))
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Logger adapter that turns extra keyword arguments into the record's ``fields``."""
+
+    def __init__(self, logger: logging.Logger):
+        super().__init__(logger, {})
+
+    def process(self, msg, kwargs):
+        # Only called once the level check has passed, so fields cost nothing for filtered records
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _LOG_KWARGS}
+        debug = fields.pop('debug', None)
+        if debug is not None and self.logger.isEnabledFor(logging.DEBUG):
+            fields.update(debug() if callable(debug) else debug)
+        if fields:
+            kwargs['extra'] = {**kwargs.get('extra', {}), 'fields': fields}
+        return msg, kwargs
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(name))
+
+
+def _fields_text(record: logging.LogRecord) -> str:
+    fields = getattr(record, 'fields', None)
+    if not fields:
+        return ""
+    return " " + " ".join(f"{key}={value}" for key, value in fields.items())
+
+
+class TextFormatter(logging.Formatter):
+    """Plain text lines with the structured fields appended."""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT, DATE_FORMAT, style="{")
+
+    def formatMessage(self, record):
+        return super().formatMessage(record) + _fields_text(record)
+
+
+class ColorFormatter(logging.Formatter):
+    """Colored console output; one formatter per level is built up front instead of for every record."""
+
+    black = "\x1b[30m"
+    red = "\x1b[31m"
+    green = "\x1b[32m"
+    yellow = "\x1b[33m"
+    blue = "\x1b[34m"
+    gray = "\x1b[38m"
+    reset = "\x1b[0m"
+    bold = "\x1b[1m"
+
+    COLORS = {
+        logging.DEBUG: gray + bold,
+        logging.INFO: blue + bold,
+        logging.WARNING: yellow + bold,
+        logging.ERROR: red,
+        logging.CRITICAL: red + bold,
+    }
+
+    def __init__(self):
+        super().__init__(datefmt=DATE_FORMAT)
+        self._formatters = {level: self._formatter(color) for level, color in self.COLORS.items()}
+        self._default = self._formatter(self.reset)
+
+    def _formatter(self, level_color: str) -> logging.Formatter:
+        fmt = (
+            f"{self.black}{self.bold}{{asctime}}{self.reset} "
+            f"{level_color}{{levelname:<8}}{self.reset} "
+            f"{self.green}{self.bold}{{name}}{self.reset} {{message}}"
+        )
+        return logging.Formatter(fmt, DATE_FORMAT, style="{")
+
+    def format(self, record):
+        formatted = self._formatters.get(record.levelno, self._default).format(record)
+        fields = _fields_text(record)
+        if not fields:
+            return formatted
+        # Fields belong on the message line, before any traceback
+        line, newline, rest = formatted.partition("\n")
+        return line + fields + newline + rest
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, fields and any traceback."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the listener thread with their message merged but not
+    formatted. The stock handler formats the whole line in the logging
+    thread, which would undo the point of the queue and lose the fields for
+    the JSON formatter.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames that may change by the time the listener gets to them
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = "INFO", json_output: bool = False, log_file: Optional[str] = "discord.log") -> logging.handlers.QueueListener:
+    """
+    Route every logger through a queue to console and file handlers on a
+    background thread. Returns the started listener; stop it on shutdown to
+    flush what is still queued.
+    """
+    console = logging.StreamHandler()
+    console.setFormatter(JsonFormatter() if json_output else ColorFormatter())
+    handlers = [console]
+    if log_file:
+        file_handler = logging.FileHandler(filename=log_file, encoding="utf-8", mode="w")
+        file_handler.setFormatter(JsonFormatter() if json_output else TextFormatter())
+        handlers.append(file_handler)
+
+    records = queue.SimpleQueue()  # Unbounded, so logging never blocks the caller
+    listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(records))
+    level_number = logging.getLevelName(level.upper()) if isinstance(level, str) else level
+    root.setLevel(level_number)
+    # discord.py's gateway debug output would drown everything else
+    logging.getLogger("discord").setLevel(max(level_number, logging.INFO))
+    # The formats above show no caller, thread or process, so skip collecting them for every
+    # record (the "Optimization" section of the logging HOWTO); this roughly halves a log call
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+    listener.start()
+    return listener
@@ -0,0 +1,156 @@
+"""
+Event loop lag watchdog.
+
+A task on the loop sleeps for ``interval`` over and over and records how
+late each wake-up is in the ``event_loop_lag_seconds`` histogram. That
+delay is how long every other callback, including Discord heartbeats and
+interaction acknowledgements, had to wait for the loop.
+
+When the loop is blocked, the task cannot report it, so a helper thread
+watches the task's heartbeat. Once the heartbeat is half of ``threshold``
+late, the thread captures the loop thread's stack and the task that is
+running. That points at the callback or CPU-heavy loop holding the loop
+up. When the loop comes back after more than ``threshold``, the stall is
+logged once with its full duration and that stack, counted in
+``event_loop_stalls_total`` and kept in ``stalls`` for inspection.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Optional
+
+from helpers.Logging import get_logger
+from helpers.Metrics import METRICS
+
+logger = get_logger(__name__)
+
+CHECK_INTERVAL = 0.1  # Seconds between the watchdog task's wake-ups
+LAG_THRESHOLD = 0.25  # A wake-up this late counts as a stall; interactions must be acknowledged within 3 s
+STACK_LIMIT = 30  # Innermost frames kept from a stalled stack
+RECENT_STALLS = 50
+
+LOOP_LAG = METRICS.histogram(
+    "event_loop_lag_seconds", "How late the watchdog's wake-ups ran, i.e. how long callbacks waited for the event loop",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+LOOP_STALLS = METRICS.counter("event_loop_stalls_total", "Times the event loop was blocked for longer than the lag threshold")
+
+
+class Stall:
+    """One period in which the loop was blocked past the threshold."""
+    __slots__ = ('started', 'duration', 'task', 'stack')
+
+    def __init__(self, started: float, task: Optional[str], stack: str):
+        self.started = started  # time.time() when the loop stopped responding
+        self.duration: Optional[float] = None  # Set once the loop is back
+        self.task = task
+        self.stack = stack
+
+    def to_dict(self) -> dict:
+        return {'started': self.started, 'duration': self.duration, 'task': self.task, 'stack': self.stack}
+
+
+class LoopWatchdog:
+    """
+    Measures event loop lag continuously and captures what was running
+    whenever the loop stalls. ``start()`` must be called from the loop.
+    """
+
+    def __init__(self, interval: float = CHECK_INTERVAL, threshold: float = LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: Deque[Stall] = deque(maxlen=RECENT_STALLS)
+        self.max_lag = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = 0.0  # perf_counter() when the watchdog task last ran
+        self._pending: Optional[Stall] = None  # Captured by the thread, completed by the task
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._measure(), name="loop-watchdog")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread:
+            # The thread wakes at least every interval, so this is short
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+
+    async def _measure(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            now = time.perf_counter()
+            self._heartbeat = now
+            lag = max(now - before - self.interval, 0.0)
+            LOOP_LAG.observe(lag)
+            if lag > self.max_lag:
+                self.max_lag = lag
+            if lag >= self.threshold:
+                self._stalled(lag)
+            else:
+                # Caught early by the thread but over before it crossed the threshold
+                self._pending = None
+
+    def _stalled(self, lag: float):
+        LOOP_STALLS.inc()
+        stall, self._pending = self._pending, None
+        if stall is None:
+            # Shorter than the thread's polling could catch; the lag is all that is known
+            stall = Stall(time.time() - lag, None, "")
+        stall.duration = lag
+        self.stalls.append(stall)
+        logger.warning(
+            "Event loop blocked for %.0f ms%s",
+            lag * 1000,
+            f"\nLoop thread stack while it was blocked:\n{stall.stack}" if stall.stack else "",
+            lag_ms=round(lag * 1000, 1),
+            task=stall.task
+        )
+
+    def _watch(self):
+        """Helper thread: snapshot the loop thread's stack when the heartbeat is overdue."""
+        # Snapshot halfway to the threshold so stalls just over it are caught too; the task
+        # drops the snapshot if the loop comes back before the threshold
+        poll = min(self.interval, self.threshold / 4)
+        while not self._stopped.wait(poll):
+            heartbeat = self._heartbeat
+            overdue = time.perf_counter() - heartbeat - self.interval
+            if overdue < self.threshold / 2 or self._pending is not None:
+                continue
+            stall = Stall(time.time() - overdue, self._running_task(), self._loop_stack())
+            # The loop may have come back while the stack was taken; that snapshot shows nothing useful
+            if self._heartbeat == heartbeat:
+                self._pending = stall
+
+    def _running_task(self) -> Optional[str]:
+        task = asyncio.current_task(self._loop)
+        if task is None:
+            return None  # A plain callback, not a task; the stack shows which
+        coro = task.get_coro()
+        return f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+
+    def _loop_stack(self) -> str:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return ""
+        return "".join(traceback.format_list(traceback.extract_stack(frame, limit=STACK_LIMIT))).rstrip()
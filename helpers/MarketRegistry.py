@@ -0,0 +1,142 @@
+import bisect
+import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+ACTIVE = "active"
+PENDING = "pending"
+RESOLVED = "resolved"
+REFUNDED = "refunded"
+STATUSES = (ACTIVE, PENDING, RESOLVED, REFUNDED)
+
+
+def market_status(prediction, now: datetime.datetime) -> str:
+    if prediction.refunded:
+        return REFUNDED
+    if prediction.resolved:
+        return RESOLVED
+    if prediction.end_time <= now:
+        return PENDING
+    return ACTIVE
+
+
+class MarketRegistry:
+    """
+    Every market, indexed by id, status, category and end time.
+
+    Each status bucket and each (status, category) pair keeps a sorted list of
+    market ids, so listings and pages are slices that cost time proportional
+    to what they return. Active markets are also kept sorted by end time:
+    ``advance`` moves every market whose betting period is over from
+    ``ACTIVE`` to ``PENDING`` by cutting the front of that list, and
+    ``update`` re-files a single market after it changes.
+
+    ``on_change``, if set, is called with the id of every market that is
+    added or updated, so a view of the registry can refresh just those.
+    """
+
+    def __init__(self):
+        self.on_change: Optional[Callable[[int], None]] = None
+        self._markets: Dict[int, object] = {}
+        self._status: Dict[int, str] = {}
+        self._buckets: Dict[str, List[int]] = {status: [] for status in STATUSES}
+        self._categories: Dict[str, Dict[str, List[int]]] = {status: {} for status in STATUSES}
+        self._active_ends: List[Tuple[datetime.datetime, int]] = []
+
+    def __len__(self) -> int:
+        return len(self._markets)
+
+    def __iter__(self) -> Iterator:
+        return iter(self._markets.values())
+
+    def __contains__(self, market_id: int) -> bool:
+        return market_id in self._markets
+
+    def get(self, market_id: int):
+        return self._markets.get(market_id)
+
+    def add(self, prediction, now: Optional[datetime.datetime] = None):
+        """Register a market under its current status."""
+        if prediction.id in self._markets:
+            self.update(prediction, now)
+            return
+        self._markets[prediction.id] = prediction
+        self._file(prediction, market_status(prediction, now or datetime.datetime.utcnow()))
+        if self.on_change:
+            self.on_change(prediction.id)
+
+    def update(self, prediction, now: Optional[datetime.datetime] = None) -> Optional[str]:
+        """Move a market to the bucket matching its state. Unknown markets are ignored."""
+        current = self._status.get(prediction.id)
+        if current is None:
+            return None
+        status = market_status(prediction, now or datetime.datetime.utcnow())
+        if status != current:
+            self._unfile(prediction, current)
+            self._file(prediction, status)
+        if self.on_change:
+            self.on_change(prediction.id)
+        return status
+
+    def advance(self, now: Optional[datetime.datetime] = None) -> List:
+        """Move every active market whose end time has passed to PENDING and return them."""
+        now = now or datetime.datetime.utcnow()
+        cut = bisect.bisect_right(self._active_ends, (now, float('inf')))
+        if not cut:
+            return []
+        ended = [self._markets[market_id] for _, market_id in self._active_ends[:cut]]
+        for prediction in ended:
+            self.update(prediction, now)
+        return ended
+
+    def status_of(self, market_id: int) -> Optional[str]:
+        return self._status.get(market_id)
+
+    def count(self, status: str) -> int:
+        return len(self._buckets[status])
+
+    def with_status(self, status: str) -> List:
+        """Markets in one bucket, oldest first."""
+        return [self._markets[market_id] for market_id in self._buckets[status]]
+
+    def categories(self, status: str = ACTIVE) -> List[str]:
+        """Categories that have at least one market in ``status``."""
+        return list(self._categories[status])
+
+    def in_category(self, category: str, status: str = ACTIVE) -> List:
+        return [self._markets[market_id] for market_id in self._categories[status].get(category, ())]
+
+    def page(self, statuses: Tuple[str, ...], start: int, stop: int) -> List[Tuple[str, object]]:
+        """(status, market) rows ``start:stop`` of the listing that shows ``statuses`` in order."""
+        rows = []
+        for status in statuses:
+            bucket = self._buckets[status]
+            if start < len(bucket) and start < stop:
+                rows.extend((status, self._markets[market_id]) for market_id in bucket[start:stop])
+            start = max(0, start - len(bucket))
+            stop = max(0, stop - len(bucket))
+        return rows
+
+    def _file(self, prediction, status: str):
+        self._status[prediction.id] = status
+        bisect.insort(self._buckets[status], prediction.id)
+        if prediction.category:
+            bisect.insort(self._categories[status].setdefault(prediction.category, []), prediction.id)
+        if status == ACTIVE:
+            bisect.insort(self._active_ends, (prediction.end_time, prediction.id))
+
+    def _unfile(self, prediction, status: str):
+        _remove(self._buckets[status], prediction.id)
+        if prediction.category:
+            in_category = self._categories[status].get(prediction.category)
+            if in_category is not None:
+                _remove(in_category, prediction.id)
+                if not in_category:
+                    del self._categories[status][prediction.category]
+        if status == ACTIVE:
+            _remove(self._active_ends, (prediction.end_time, prediction.id))
+
+
+def _remove(sorted_list: list, value):
+    index = bisect.bisect_left(sorted_list, value)
+    if index < len(sorted_list) and sorted_list[index] == value:
+        del sorted_list[index]
@@ -0,0 +1,369 @@
+import asyncio
+import datetime
+import json
+from typing import Dict, List, Optional, Tuple
+
+import aiosqlite
+
+from helpers.Logging import get_logger
+
+logger = get_logger(__name__)
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS markets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question TEXT NOT NULL,
+    category TEXT,
+    creator_id INTEGER NOT NULL,
+    end_time TEXT NOT NULL,
+    options TEXT NOT NULL,
+    liquidity REAL NOT NULL,
+    outstanding_shares TEXT NOT NULL,
+    total_bets INTEGER NOT NULL DEFAULT 0,
+    resolved INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    refunded INTEGER NOT NULL DEFAULT 0,
+    creator_notified INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS bets (
+    market_id INTEGER NOT NULL,
+    option TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    shares REAL NOT NULL,
+    PRIMARY KEY (market_id, option, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS votes (
+    market_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    option TEXT NOT NULL,
+    PRIMARY KEY (market_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS settlements (
+    market_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    stake INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    credited INTEGER NOT NULL DEFAULT 0,
+    notified INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (market_id, user_id, kind)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    event_seq INTEGER NOT NULL
+);
+"""
+
+class MarketStore:
+    """
+    SQLite persistence for prediction markets.
+
+    Market creation is written through immediately so every market has an id.
+    Bets, votes and market state changes are write-behind: callers only mark
+    things dirty and a background task commits them in batches, so nothing on
+    the betting path waits on the disk.
+
+    With an ``EventLog`` attached, every flush also records the sequence
+    number of the last event it covers (``checkpoint_seq``), in the same
+    transaction. The tables are then a snapshot of all markets as of that
+    event, and recovery only has to replay the log after it. A flush waits
+    until the log is fsynced up to that event before committing, so the
+    checkpoint never runs ahead of the durable log.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.25, max_batch: int = 500, events=None):
+        self.path = path
+        self.events = events
+        self.checkpoint_seq = 0
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.db: Optional[aiosqlite.Connection] = None
+        self._dirty_markets: Dict[int, object] = {}
+        self._dirty_bets: Dict[Tuple[int, str, int], object] = {}
+        self._dirty_votes: Dict[Tuple[int, int], str] = {}
+        self._credited = set()
+        self._notified = set()
+        self._dirty_event = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def open(self):
+        """Open the database, apply the schema and start the write-behind task."""
+        if self.db:
+            return
+        self.db = await aiosqlite.connect(self.path)
+        await self.db.execute("PRAGMA journal_mode=WAL")
+        await self.db.execute("PRAGMA synchronous=NORMAL")
+        await self.db.executescript(SCHEMA)
+        await self.db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        await self.db.commit()
+        async with self.db.execute("SELECT event_seq FROM checkpoint WHERE id = 1") as cursor:
+            row = await cursor.fetchone()
+        self.checkpoint_seq = row[0] if row else 0
+        self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Flush everything still pending and close the database."""
+        if not self.db:
+            return
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+        await self.db.close()
+        self.db = None
+
+    @property
+    def pending_writes(self) -> int:
+        return (
+            len(self._dirty_markets) + len(self._dirty_bets) + len(self._dirty_votes)
+            + len(self._credited) + len(self._notified)
+        )
+
+    async def insert_market(self, prediction) -> int:
+        """Persist a new market and return its id."""
+        # Under the flush lock, so this commit can't also commit half of a flush without its checkpoint
+        async with self._flush_lock:
+            cursor = await self.db.execute(
+                "INSERT INTO markets (question, category, creator_id, end_time, options, "
+                "liquidity, outstanding_shares, total_bets, resolved, result, refunded, creator_notified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    prediction.question,
+                    prediction.category,
+                    prediction.creator_id,
+                    prediction.end_time.isoformat(),
+                    json.dumps(prediction.options),
+                    prediction.liquidity,
+                    *self._market_state(prediction),
+                )
+            )
+            await self.db.commit()
+            return cursor.lastrowid
+
+    def mark_market_dirty(self, prediction):
+        """Queue the market's mutable state (shares, totals, resolution, notifications) for the next flush."""
+        self._dirty_markets[prediction.id] = prediction
+        self._wake()
+
+    def record_bet(self, prediction, option: str, user_id: int):
+        """Queue a user's position on an option for the next flush."""
+        self._dirty_markets[prediction.id] = prediction
+        self._dirty_bets[(prediction.id, option, user_id)] = prediction
+        self._wake()
+
+    def record_vote(self, prediction, user_id: int, option: str):
+        """Queue a resolution vote for the next flush."""
+        self._dirty_votes[(prediction.id, user_id)] = option
+        self._wake()
+
+    async def plan_settlement(self, market_id: int, entries: List[tuple]):
+        """
+        Write a market's settlement plan: one (user_id, kind, stake, amount) row per
+        payout, refund or loss notice. The plan is committed in the same transaction
+        as every pending change, so a resumed settlement always sees the market as
+        resolved. Rows that already exist keep their progress.
+        """
+        async with self._flush_lock:
+            await self._commit([(market_id, user_id, kind, stake, amount) for user_id, kind, stake, amount in entries])
+
+    async def has_settlement(self, market_id: int) -> bool:
+        """Whether a settlement plan was written for the market."""
+        async with self.db.execute(
+            "SELECT 1 FROM settlements WHERE market_id = ? LIMIT 1", (market_id,)
+        ) as cursor:
+            return await cursor.fetchone() is not None
+
+    def mark_credited(self, market_id: int, user_id: int, kind: str):
+        """Queue a settlement row as paid out."""
+        self._credited.add((market_id, user_id, kind))
+        self._wake()
+
+    def mark_notified(self, market_id: int, user_id: int, kind: str):
+        """Queue a settlement row as notified."""
+        self._notified.add((market_id, user_id, kind))
+        self._wake()
+
+    async def load_unfinished_settlements(self) -> List[dict]:
+        """Return every settlement row that still needs a credit or a DM, with its market."""
+        async with self.db.execute(
+            "SELECT s.market_id, s.user_id, s.kind, s.stake, s.amount, s.credited, s.notified, "
+            "m.question, m.result FROM settlements s JOIN markets m ON m.id = s.market_id "
+            "WHERE s.credited = 0 OR s.notified = 0 ORDER BY s.market_id"
+        ) as cursor:
+            return [
+                {
+                    'market_id': row[0],
+                    'user_id': row[1],
+                    'kind': row[2],
+                    'stake': row[3],
+                    'amount': row[4],
+                    'credited': bool(row[5]),
+                    'notified': bool(row[6]),
+                    'question': row[7],
+                    'result': row[8],
+                }
+                async for row in cursor
+            ]
+
+    async def flush(self):
+        """Commit every queued change in a single transaction."""
+        async with self._flush_lock:
+            await self._commit()
+
+    async def _commit(self, settlement_rows: List[tuple] = ()):
+        """Write the queued changes, any new settlement rows and the checkpoint in one commit. Needs _flush_lock."""
+        if not self.db or not (self.pending_writes or settlement_rows):
+            return
+        markets, self._dirty_markets = self._dirty_markets, {}
+        bets, self._dirty_bets = self._dirty_bets, {}
+        votes, self._dirty_votes = self._dirty_votes, {}
+        credited, self._credited = self._credited, set()
+        notified, self._notified = self._notified, set()
+        # Every event appended so far is reflected in the rows built below; no await until they are built
+        checkpoint_seq = self.events.last_seq if self.events else self.checkpoint_seq
+
+        market_rows = [
+            (*self._market_state(prediction), market_id)
+            for market_id, prediction in markets.items()
+        ]
+        bet_rows = []
+        for (market_id, option, user_id), prediction in bets.items():
+            amount, shares = prediction.get_position(option, user_id)
+            bet_rows.append((market_id, option, user_id, amount, shares))
+        vote_rows = [
+            (market_id, user_id, option)
+            for (market_id, user_id), option in votes.items()
+        ]
+
+        try:
+            if self.events:
+                # A checkpoint past the durable log would let a crash lose those events and
+                # hand their sequence numbers out again, and recovery would skip the new ones
+                await self.events.sync(checkpoint_seq)
+            await self.db.executemany(
+                "UPDATE markets SET outstanding_shares = ?, total_bets = ?, resolved = ?, "
+                "result = ?, refunded = ?, creator_notified = ? WHERE id = ?",
+                market_rows
+            )
+            await self.db.executemany(
+                "INSERT OR REPLACE INTO bets (market_id, option, user_id, amount, shares) "
+                "VALUES (?, ?, ?, ?, ?)",
+                bet_rows
+            )
+            await self.db.executemany(
+                "INSERT OR REPLACE INTO votes (market_id, user_id, option) VALUES (?, ?, ?)",
+                vote_rows
+            )
+            await self.db.executemany(
+                "UPDATE settlements SET credited = 1 WHERE market_id = ? AND user_id = ? AND kind = ?",
+                list(credited)
+            )
+            await self.db.executemany(
+                "UPDATE settlements SET notified = 1 WHERE market_id = ? AND user_id = ? AND kind = ?",
+                list(notified)
+            )
+            if settlement_rows:
+                await self.db.executemany(
+                    "INSERT OR IGNORE INTO settlements (market_id, user_id, kind, stake, amount) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    settlement_rows
+                )
+            if checkpoint_seq != self.checkpoint_seq:
+                await self.db.execute(
+                    "INSERT OR REPLACE INTO checkpoint (id, event_seq) VALUES (1, ?)",
+                    (checkpoint_seq,)
+                )
+            await self.db.commit()
+            self.checkpoint_seq = checkpoint_seq
+        except Exception:
+            await self.db.rollback()
+            # Put the batch back so the next flush retries it, without
+            # clobbering anything that was queued while we were writing.
+            for key, value in markets.items():
+                self._dirty_markets.setdefault(key, value)
+            for key, value in bets.items():
+                self._dirty_bets.setdefault(key, value)
+            for key, value in votes.items():
+                self._dirty_votes.setdefault(key, value)
+            self._credited |= credited
+            self._notified |= notified
+            raise
+
+    async def load_all(self) -> List[dict]:
+        """Read every market with its bets and votes in one pass."""
+        records = {}
+        async with self.db.execute(
+            "SELECT id, question, category, creator_id, end_time, options, liquidity, "
+            "total_bets, resolved, result, refunded, creator_notified FROM markets ORDER BY id"
+        ) as cursor:
+            async for row in cursor:
+                records[row[0]] = {
+                    'id': row[0],
+                    'question': row[1],
+                    'category': row[2],
+                    'creator_id': row[3],
+                    'end_time': datetime.datetime.fromisoformat(row[4]),
+                    'options': json.loads(row[5]),
+                    'liquidity': row[6],
+                    'total_bets': row[7],
+                    'resolved': bool(row[8]),
+                    'result': row[9],
+                    'refunded': bool(row[10]),
+                    'creator_notified': bool(row[11]),
+                    'bets': [],
+                    'votes': [],
+                }
+
+        async with self.db.execute(
+            "SELECT market_id, option, user_id, amount, shares FROM bets"
+        ) as cursor:
+            async for market_id, option, user_id, amount, shares in cursor:
+                if market_id in records:
+                    records[market_id]['bets'].append((option, user_id, amount, shares))
+
+        async with self.db.execute(
+            "SELECT market_id, user_id, option FROM votes"
+        ) as cursor:
+            async for market_id, user_id, option in cursor:
+                if market_id in records:
+                    records[market_id]['votes'].append((user_id, option))
+
+        return list(records.values())
+
+    def _market_state(self, prediction) -> tuple:
+        return (
+            # Informational only: shares outstanding are rebuilt from the bets on load
+            json.dumps(prediction.option_shares),
+            prediction.total_bets,
+            int(prediction.resolved),
+            prediction.result,
+            int(prediction.refunded),
+            int(prediction.creator_notified),
+        )
+
+    def _wake(self):
+        self._dirty_event.set()
+
+    async def _flush_loop(self):
+        while True:
+            await self._dirty_event.wait()
+            # Give a burst of bets a moment to pile up so they share one commit.
+            if self.pending_writes < self.max_batch:
+                await asyncio.sleep(self.flush_interval)
+            self._dirty_event.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error flushing market store")
+                await asyncio.sleep(self.flush_interval)
+                self._dirty_event.set()
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+RENDER_CACHE_SIZE = 1024
+
+
+class RenderCache:
+    """
+    Bounded LRU of rendered message fragments.
+
+    Keys include the version of whatever the fragment was rendered from, for
+    example ``(market_id, version, 'bet')``. A changed market simply stops
+    hitting its old entries, which age out once ``max_size`` is reached, so
+    the cache never needs explicit invalidation.
+    """
+
+    def __init__(self, max_size: int = RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_render(self, key: Hashable, render: Callable[[], object]):
+        """Return the cached fragment for ``key``, rendering and storing it on a miss."""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            value = self._entries[key] = render()
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return value
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
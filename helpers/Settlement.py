@@ -0,0 +1,200 @@
+import asyncio
+from functools import partial
+from typing import Dict, List, Optional
+
+from helpers.Logging import get_logger
+from helpers.ViewRefreshHub import TokenBucket
+
+logger = get_logger(__name__)
+
+SETTLEMENT_MESSAGES = {
+    'payout': "🎉 You won {amount:,} Points on '{question}'!\nYour Bet: {stake:,} → Payout: {amount:,}",
+    'loss': "💔 You lost your bet of {stake:,} Points on '{question}'.\nThe winning option was: '{result}'.",
+    'refund': "💰 Your bet of {amount:,} Points has been refunded for the expired market:\n'{question}'",
+}
+
+
+class SettlementPipeline:
+    """
+    Pays out and notifies bettors once a market is resolved or refunded.
+
+    Settlement runs in three stages:
+      1. the plan (who gets what) is written to the market store in one commit,
+      2. ledger credits go to DRIP in chunks through ``batch_adjust`` and each
+         success is recorded against the plan,
+      3. DMs go through a single rate-limited queue shared by all markets.
+
+    Because progress is stored per row, a crash mid-settlement resumes with
+    the rows that were not yet credited or notified instead of starting over.
+    Credits carry a stable idempotency key per (market, user), so a credit
+    that DRIP applied just before a crash is not applied again on resume.
+    A credit only counts as done, and its DM is only queued, once its
+    credited mark is committed. Credits that still fail are dead-lettered
+    in the points manager and marked credited once a replay succeeds.
+    """
+
+    def __init__(
+        self,
+        points_manager,
+        users,
+        store,
+        credit_concurrency: int = 8,
+        chunk_size: int = 200,
+        dm_rate: tuple = (5, 1.0)
+    ):
+        self.points_manager = points_manager
+        self.users = users
+        self.store = store
+        self.credit_concurrency = credit_concurrency
+        self.chunk_size = chunk_size
+        self._dm_bucket = TokenBucket(*dm_rate)
+        self._dm_queue: asyncio.Queue = asyncio.Queue()
+        self._dm_task: Optional[asyncio.Task] = None
+        self._tasks = set()
+        self.progress: Dict[int, dict] = {}
+
+    def start(self):
+        if not self._dm_task:
+            self._dm_task = asyncio.create_task(self._dm_loop())
+
+    async def stop(self):
+        tasks = list(self._tasks)
+        if self._dm_task:
+            tasks.append(self._dm_task)
+            self._dm_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @property
+    def pending_notifications(self) -> int:
+        return self._dm_queue.qsize()
+
+    async def settle(self, prediction, entries: List[tuple]):
+        """
+        Persist the settlement plan for a market and run it in the background.
+
+        ``entries`` are (user_id, kind, stake, amount) tuples where kind is one of
+        ``SETTLEMENT_MESSAGES``. Returns as soon as the plan is on disk.
+        """
+        await self.store.plan_settlement(prediction.id, entries)
+        rows = [
+            {
+                'market_id': prediction.id,
+                'user_id': user_id,
+                'kind': kind,
+                'stake': stake,
+                'amount': amount,
+                'credited': False,
+                'notified': False,
+                'question': prediction.question,
+                'result': prediction.result,
+            }
+            for user_id, kind, stake, amount in entries
+        ]
+        self._spawn(prediction.id, rows)
+
+    async def resume(self):
+        """Pick up every settlement that was interrupted by a restart."""
+        by_market: Dict[int, List[dict]] = {}
+        for row in await self.store.load_unfinished_settlements():
+            by_market.setdefault(row['market_id'], []).append(row)
+        for market_id, rows in by_market.items():
+            logger.info("Resuming settlement of market %s: %d rows left", market_id, len(rows), market=market_id)
+            self._spawn(market_id, rows)
+
+    def _spawn(self, market_id: int, rows: List[dict]):
+        self.progress[market_id] = {
+            'total': len(rows),
+            'credited': sum(1 for row in rows if row['credited'] or row['amount'] <= 0),
+            'notified': sum(1 for row in rows if row['notified']),
+            'failed': 0,
+        }
+        task = asyncio.create_task(self._run(market_id, rows))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, market_id: int, rows: List[dict]):
+        # Rows with nothing to pay (loss notices) go straight to the DM stage
+        to_credit = []
+        for row in rows:
+            if row['credited'] or row['amount'] <= 0:
+                if not row['credited']:
+                    self.store.mark_credited(market_id, row['user_id'], row['kind'])
+                    row['credited'] = True
+                self._queue_notification(row)
+            else:
+                to_credit.append(row)
+
+        progress = self.progress[market_id]
+        for start in range(0, len(to_credit), self.chunk_size):
+            chunk = to_credit[start:start + self.chunk_size]
+            try:
+                results = await self.points_manager.batch_adjust(
+                    [(row['user_id'], row['amount']) for row in chunk],
+                    concurrency=self.credit_concurrency,
+                    key_prefix=self._key_prefix(market_id)
+                )
+            except Exception:
+                logger.exception("Error crediting settlement of market %s", market_id, market=market_id, rows=len(chunk))
+                results = [(row['user_id'], row['amount'], False) for row in chunk]
+
+            credited = []
+            for row, (_, _, success) in zip(chunk, results):
+                if not success:
+                    # Left uncredited in the plan so a restart also retries it
+                    logger.warning("Failed to credit user %s", row['user_id'], market=market_id, amount=row['amount'])
+                    progress['failed'] += 1
+                    self.points_manager.dead_letter(
+                        row['user_id'],
+                        row['amount'],
+                        f"{self._key_prefix(market_id)}:{row['user_id']}",
+                        on_replayed=partial(self._replayed, market_id, row)
+                    )
+                    continue
+                credited.append(row)
+            await self._credited(market_id, credited)
+
+    @staticmethod
+    def _key_prefix(market_id: int) -> str:
+        return f"settlement:{market_id}"
+
+    async def _credited(self, market_id: int, rows: List[dict]):
+        """Commit the credited marks for rows DRIP accepted, then count them and queue their DMs."""
+        for row in rows:
+            self.store.mark_credited(market_id, row['user_id'], row['kind'])
+        await self.store.flush()
+        progress = self.progress.get(market_id)
+        for row in rows:
+            row['credited'] = True
+            if progress:
+                progress['credited'] += 1
+            self._queue_notification(row)
+
+    def _replayed(self, market_id: int, row: dict):
+        # Called synchronously by the dead-letter replay; the commit happens in the background
+        task = asyncio.create_task(self._credited(market_id, [row]))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _queue_notification(self, row: dict):
+        if not row['notified']:
+            self._dm_queue.put_nowait(row)
+
+    async def _dm_loop(self):
+        while True:
+            row = await self._dm_queue.get()
+            delay = self._dm_bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._dm_bucket.take()
+            try:
+                user = await self.users.get_user(row['user_id'])
+                await user.send(SETTLEMENT_MESSAGES[row['kind']].format(**row))
+            except Exception as e:
+                # Closed DMs or deleted accounts are not retried
+                logger.info("Could not send %s notification to user %s: %s", row['kind'], row['user_id'], e, market=row['market_id'])
+            self.store.mark_notified(row['market_id'], row['user_id'], row['kind'])
+            progress = self.progress.get(row['market_id'])
+            if progress:
+                progress['notified'] += 1
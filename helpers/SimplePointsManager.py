@@ -1,5 +1,136 @@
+import asyncio
+import random
+import time
+import uuid
 import aiohttp
-from typing import Optional
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from helpers.Logging import get_logger
+from helpers.Metrics import METRICS
+from helpers.Tracing import current_span, traced
+
+logger = get_logger(__name__)
+
+# Connection pool tuning for the DRIP API: keep connections warm between bursts
+MAX_CONNECTIONS = 32
+KEEPALIVE_TIMEOUT = 60
+REQUEST_TIMEOUT = 15
+BATCH_CONCURRENCY = 16
+
+# Balance cache defaults
+BALANCE_TTL = 30
+BALANCE_CACHE_SIZE = 10000
+
+# Retry and circuit breaker tuning
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 10
+RETRY_AFTER_CAP = 60
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30
+DEAD_LETTER_REPLAY_INTERVAL = 60
+DEAD_LETTER_MAX_ATTEMPTS = 10
+
+DRIP_REQUESTS = METRICS.counter("drip_requests_total", "DRIP API requests by endpoint and HTTP status (error for no response)", ("endpoint", "status"))
+DRIP_LATENCY = METRICS.histogram("drip_request_seconds", "DRIP API request latency per attempt", ("endpoint",))
+
+
+def _endpoint(path: str) -> str:
+    # Metric label for a DRIP path without the user id: member, tokenBalance or transfer
+    last = path.rsplit("/", 1)[-1]
+    return "member" if last.isdigit() else last
+
+
+class DripAPIError(Exception):
+    """A DRIP request failed."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class DripUnavailableError(DripAPIError):
+    """DRIP could not be reached, or the circuit breaker is shedding load."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests after repeated failures.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    every request is refused for ``reset_timeout`` seconds. Then a single
+    probe request is let through: success closes the breaker, failure
+    opens it again. A probe that ends without either (cancelled, or an
+    unexpected error) must call ``end_probe`` so the next request can probe.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def end_probe(self):
+        """Let another request probe; a no-op unless a probe is in flight."""
+        self._probing = False
+
+
+class DeadLetter:
+    """
+    A balance change that failed and will be replayed later: a transfer to
+    ``user_id`` from ``from_user_id`` if one is set, else an adjustment.
+    """
+
+    def __init__(
+        self,
+        user_id: int,
+        amount: int,
+        idempotency_key: str,
+        on_replayed: Optional[Callable[[], None]] = None,
+        from_user_id: Optional[int] = None
+    ):
+        self.user_id = user_id
+        self.amount = amount
+        self.idempotency_key = idempotency_key
+        self.on_replayed = on_replayed
+        self.from_user_id = from_user_id
+        self.attempts = 0
+
+    async def replay(self, points_manager) -> bool:
+        if self.from_user_id is not None:
+            return await points_manager.transfer_points(self.from_user_id, self.user_id, self.amount, self.idempotency_key)
+        return await points_manager.add_points(self.user_id, self.amount, self.idempotency_key)
 
 class PointsManagerSingleton:
     _instance = None
@@ -10,21 +141,54 @@ class PointsManagerSingleton:
             cls._instance = super().__new__(cls)
         return cls._instance
     
-    def __init__(self, base_url: str = None, api_key: str = None, realm_id: str = None):
+    def __init__(
+        self,
+        base_url: str = None,
+        api_key: str = None,
+        realm_id: str = None,
+        balance_ttl: float = BALANCE_TTL,
+        balance_cache_size: int = BALANCE_CACHE_SIZE
+    ):
         if not self._initialized and all([base_url, api_key, realm_id]):
             self.base_url = base_url.rstrip('/')
             self.api_key = api_key
             self.realm_id = realm_id
             self.session: Optional[aiohttp.ClientSession] = None
+            # user_id -> (balance, fetched_at), least recently used first
+            self.balance_ttl = balance_ttl
+            self.balance_cache_size = balance_cache_size
+            self._balances: OrderedDict = OrderedDict()
+            # Points held by in-flight bets that have not been debited yet
+            self._reserved: Dict[int, int] = {}
+            self._balance_fetches: Dict[int, asyncio.Task] = {}
+            self.breaker = CircuitBreaker()
+            self.dead_letters: Deque[DeadLetter] = deque()
+            self._replay_task: Optional[asyncio.Task] = None
+            METRICS.gauge("drip_dead_letters", "Balance adjustments waiting to be replayed", function=lambda: len(self.dead_letters))
+            METRICS.gauge("drip_breaker_open", "1 while the DRIP circuit breaker is open", function=lambda: int(self.breaker.state == "open"))
             self._initialized = True
     
     async def initialize(self):
         """Initialize the aiohttp session if it doesn't exist."""
         if not self.session:
-            self.session = aiohttp.ClientSession()
+            connector = aiohttp.TCPConnector(
+                limit=MAX_CONNECTIONS,
+                limit_per_host=MAX_CONNECTIONS,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+            )
+        if not self._replay_task:
+            self._replay_task = asyncio.create_task(self._replay_loop())
 
     async def cleanup(self):
         """Cleanup the aiohttp session."""
+        if self._replay_task:
+            self._replay_task.cancel()
+            self._replay_task = None
         if self.session:
             await self.session.close()
             self.session = None
@@ -33,58 +197,319 @@ class PointsManagerSingleton:
         """Get headers with API key authentication."""
         return {"Authorization": f"Bearer {self.api_key}"}
 
-    async def get_balance(self, user_id: int) -> int:
-        """Get the point balance for a user."""
-        if not self.session:
-            await self.initialize()
-            
-        headers = await self._get_headers()
-        
-        async with self.session.get(
-            f"{self.base_url}/api/v4/realms/{self.realm_id}/members/{user_id}",
-            headers=headers
-        ) as response:
-            if response.status == 200:
-                data = await response.json()
-                if not data.get('balances'):
-                    return 0
-                realm_point_ids = list(data['balances'].keys())
-                return data['balances'].get(realm_point_ids[0], 0)
-            else:
-                error_data = await response.json()
-                raise Exception(f"Failed to get balance: {error_data}")
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Delay before the next attempt: Retry-After if the server sent one, else full-jitter exponential."""
+        if retry_after:
+            try:
+                return min(float(retry_after), RETRY_AFTER_CAP)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+    @traced("drip.request")
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[dict] = None,
+        idempotency_key: Optional[str] = None
+    ) -> Tuple[int, Optional[dict]]:
+        """
+        Send a request to DRIP with retries and return (status, json body).
 
-    async def add_points(self, user_id: int, amount: int) -> bool:
-        """Add points to a user's balance."""
+        Transient failures (timeouts, connection errors, 429 and 5xx) are retried
+        with backoff, reusing the same Idempotency-Key so DRIP can drop
+        duplicates. Raises DripUnavailableError when the breaker is open or the
+        service could not be reached at all.
+        """
         if not self.session:
             await self.initialize()
-            
+
         headers = await self._get_headers()
-        
-        async with self.session.patch(
-            f"{self.base_url}/api/v4/realms/{self.realm_id}/members/{user_id}/tokenBalance",
-            headers=headers,
-            json={"tokens": amount}
-        ) as response:
-            return response.status == 200
-
-    async def remove_points(self, user_id: int, amount: int) -> bool:
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
+
+        endpoint = _endpoint(path)
+        latency = DRIP_LATENCY.labels(endpoint)
+        span = current_span()
+        span.set(method=method, endpoint=endpoint)
+        status, data = None, None
+        for attempt in range(MAX_ATTEMPTS):
+            # Let through while the breaker isn't closed, this request is its single probe
+            probe = self.breaker.state != "closed"
+            if not self.breaker.allow():
+                raise DripUnavailableError("DRIP circuit breaker is open")
+
+            retry_after = None
+            started = time.perf_counter()
+            try:
+                async with self.session.request(
+                    method, f"{self.base_url}{path}", headers=headers, json=json
+                ) as response:
+                    status = response.status
+                    retry_after = response.headers.get("Retry-After")
+                    try:
+                        data = await response.json(content_type=None)
+                    except ValueError:
+                        data = None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                latency.observe(time.perf_counter() - started)
+                DRIP_REQUESTS.labels(endpoint, "error").inc()
+                span.set(status="error", attempts=attempt + 1)
+                self.breaker.record_failure()
+                status, data = None, None
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise DripUnavailableError(f"DRIP request failed: {e}") from e
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            finally:
+                # A probe cancelled mid-request, or failing in a way not handled above, would
+                # otherwise leave the half-open breaker refusing every request from then on
+                if probe:
+                    self.breaker.end_probe()
+
+            latency.observe(time.perf_counter() - started)
+            DRIP_REQUESTS.labels(endpoint, status).inc()
+            span.set(status=status, attempts=attempt + 1)
+            if status not in RETRYABLE_STATUSES:
+                # Anything else, including a 4xx client error, means DRIP is up
+                self.breaker.record_success()
+                return status, data
+
+            self.breaker.record_failure()
+            if attempt < MAX_ATTEMPTS - 1:
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        return status, data
+
+    @traced("drip.get_balance")
+    async def get_balance(self, user_id: int, use_cache: bool = True) -> int:
+        """Get the point balance for a user, from the cache when it is fresh."""
+        if use_cache:
+            cached = self._balances.get(user_id)
+            if cached and time.monotonic() - cached[1] < self.balance_ttl:
+                self._balances.move_to_end(user_id)
+                current_span().set(cached=True)
+                return cached[0]
+
+        # Concurrent misses for the same user share one request
+        fetch = self._balance_fetches.get(user_id)
+        if fetch is None:
+            fetch = asyncio.ensure_future(self._fetch_balance(user_id))
+            self._balance_fetches[user_id] = fetch
+            fetch.add_done_callback(lambda _: self._balance_fetches.pop(user_id, None))
+        balance = await asyncio.shield(fetch)
+        self._cache_balance(user_id, balance)
+        return balance
+
+    def _cache_balance(self, user_id: int, balance: int):
+        self._balances[user_id] = (balance, time.monotonic())
+        self._balances.move_to_end(user_id)
+        while len(self._balances) > self.balance_cache_size:
+            self._balances.popitem(last=False)
+
+    def _adjust_cached_balance(self, user_id: int, delta: int):
+        """Write a confirmed balance change through to the cache."""
+        cached = self._balances.get(user_id)
+        if cached:
+            self._balances[user_id] = (cached[0] + delta, cached[1])
+
+    def invalidate_balance(self, user_id: int):
+        self._balances.pop(user_id, None)
+
+    def available_balance(self, user_id: int, balance: int) -> int:
+        return balance - self._reserved.get(user_id, 0)
+
+    async def reserve(self, user_id: int, amount: int) -> bool:
+        """
+        Hold ``amount`` points for a pending bet so concurrent bets can't overdraw.
+        Returns False if the user's balance minus existing holds is too low.
+        Every successful reserve must be paired with ``release``.
+        """
+        balance = await self.get_balance(user_id)
+        if self.available_balance(user_id, balance) < amount:
+            return False
+        self._reserved[user_id] = self._reserved.get(user_id, 0) + amount
+        return True
+
+    def release(self, user_id: int, amount: int):
+        """Drop a hold taken by ``reserve``."""
+        remaining = self._reserved.get(user_id, 0) - amount
+        if remaining > 0:
+            self._reserved[user_id] = remaining
+        else:
+            self._reserved.pop(user_id, None)
+
+    async def _fetch_balance(self, user_id: int) -> int:
+        """Get the point balance for a user from DRIP."""
+        status, data = await self._request(
+            "GET", f"/api/v4/realms/{self.realm_id}/members/{user_id}"
+        )
+        if status == 200:
+            if not data or not data.get('balances'):
+                return 0
+            realm_point_ids = list(data['balances'].keys())
+            return data['balances'].get(realm_point_ids[0], 0)
+        raise DripAPIError(f"Failed to get balance: {data}", status)
+
+    @traced("drip.add_points")
+    async def add_points(
+        self,
+        user_id: int,
+        amount: int,
+        idempotency_key: Optional[str] = None,
+        dead_letter: bool = False
+    ) -> bool:
+        """
+        Add points to a user's balance.
+
+        With ``dead_letter=True`` an adjustment that fails for a transient
+        reason is queued for replay instead of being dropped.
+        """
+        idempotency_key = idempotency_key or uuid.uuid4().hex
+        try:
+            status, _ = await self._request(
+                "PATCH",
+                f"/api/v4/realms/{self.realm_id}/members/{user_id}/tokenBalance",
+                json={"tokens": amount},
+                idempotency_key=idempotency_key
+            )
+        except DripUnavailableError as e:
+            logger.warning("DRIP unavailable while adjusting user %s: %s", user_id, e, amount=amount)
+            status = None
+
+        if status == 200:
+            self._adjust_cached_balance(user_id, amount)
+            return True
+        self.invalidate_balance(user_id)
+        if dead_letter and (status is None or status in RETRYABLE_STATUSES):
+            self.dead_letter(user_id, amount, idempotency_key)
+        return False
+
+    @traced("drip.remove_points")
+    async def remove_points(
+        self,
+        user_id: int,
+        amount: int,
+        idempotency_key: Optional[str] = None,
+        dead_letter: bool = False
+    ) -> bool:
         """Remove points from a user's balance."""
-        return await self.add_points(user_id, -amount)
+        return await self.add_points(user_id, -amount, idempotency_key, dead_letter)
 
-    async def transfer_points(self, from_user_id: int, to_user_id: int, amount: int) -> bool:
+    @traced("drip.transfer_points")
+    async def transfer_points(
+        self,
+        from_user_id: int,
+        to_user_id: int,
+        amount: int,
+        idempotency_key: Optional[str] = None
+    ) -> bool:
         """Transfer points from one user to another."""
+        try:
+            status, _ = await self._request(
+                "PATCH",
+                f"/api/v4/realms/{self.realm_id}/members/{from_user_id}/transfer",
+                json={
+                    "recipientId": to_user_id,
+                    "tokens": amount
+                },
+                idempotency_key=idempotency_key or uuid.uuid4().hex
+            )
+        except DripUnavailableError as e:
+            logger.warning("DRIP unavailable while transferring from user %s: %s", from_user_id, e, amount=amount)
+            status = None
+
+        if status == 200:
+            self._adjust_cached_balance(from_user_id, -amount)
+            self._adjust_cached_balance(to_user_id, amount)
+            return True
+        self.invalidate_balance(from_user_id)
+        self.invalidate_balance(to_user_id)
+        return False
+
+    def dead_letter(
+        self,
+        user_id: int,
+        amount: int,
+        idempotency_key: str,
+        on_replayed: Optional[Callable[[], None]] = None,
+        from_user_id: Optional[int] = None
+    ):
+        """
+        Queue a failed adjustment to be replayed with the same idempotency key.
+        With ``from_user_id`` it is replayed as a transfer of ``amount`` from
+        that user, so points move instead of being created.
+        """
+        self.dead_letters.append(DeadLetter(user_id, amount, idempotency_key, on_replayed, from_user_id))
+
+    async def replay_dead_letters(self) -> int:
+        """Retry every dead-lettered adjustment once. Returns how many went through."""
+        replayed = 0
+        for _ in range(len(self.dead_letters)):
+            if self.breaker.state == "open":
+                break
+            letter = self.dead_letters.popleft()
+            letter.attempts += 1
+            if await letter.replay(self):
+                replayed += 1
+                if letter.on_replayed:
+                    letter.on_replayed()
+            elif letter.attempts < DEAD_LETTER_MAX_ATTEMPTS:
+                self.dead_letters.append(letter)
+            else:
+                logger.error(
+                    "Giving up on adjustment of %s for user %s after %d replays",
+                    letter.amount, letter.user_id, letter.attempts, key=letter.idempotency_key
+                )
+        return replayed
+
+    async def _replay_loop(self):
+        while True:
+            await asyncio.sleep(DEAD_LETTER_REPLAY_INTERVAL)
+            if self.dead_letters:
+                try:
+                    replayed = await self.replay_dead_letters()
+                    logger.info("Replayed %d dead-lettered adjustments, %d left", replayed, len(self.dead_letters))
+                except Exception:
+                    logger.exception("Error replaying dead-lettered adjustments")
+
+    async def batch_adjust(
+        self,
+        adjustments: List[Tuple[int, int]],
+        concurrency: int = BATCH_CONCURRENCY,
+        key_prefix: Optional[str] = None
+    ) -> List[Tuple[int, int, bool]]:
+        """
+        Apply many (user_id, delta) balance changes at once.
+
+        Deltas for the same user are summed into a single request and requests
+        run at most ``concurrency`` at a time over the shared connection pool.
+        Returns (user_id, delta, success) for every input item, in input order;
+        items that were coalesced share the result of their user's request.
+        With ``key_prefix`` each user's request gets the stable idempotency key
+        ``{key_prefix}:{user_id}``, so repeating a batch can't apply it twice.
+        """
         if not self.session:
             await self.initialize()
-            
-        headers = await self._get_headers()
-        
-        async with self.session.patch(
-            f"{self.base_url}/api/v4/realms/{self.realm_id}/members/{from_user_id}/transfer",
-            headers=headers,
-            json={
-                "recipientId": to_user_id,
-                "tokens": amount
-            }
-        ) as response:
-            return response.status == 200
\ No newline at end of file
+
+        totals: Dict[int, int] = {}
+        for user_id, delta in adjustments:
+            totals[user_id] = totals.get(user_id, 0) + delta
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def adjust(user_id: int, delta: int) -> bool:
+            if delta == 0:
+                return True
+            async with semaphore:
+                key = f"{key_prefix}:{user_id}" if key_prefix else None
+                try:
+                    return await self.add_points(user_id, delta, idempotency_key=key)
+                except DripAPIError as e:
+                    logger.warning("Error adjusting balance for user %s: %s", user_id, e, amount=delta)
+                    return False
+
+        outcomes = await asyncio.gather(*(adjust(user_id, delta) for user_id, delta in totals.items()))
+        results = dict(zip(totals, outcomes))
+        return [(user_id, delta, results[user_id]) for user_id, delta in adjustments]
@@ -0,0 +1,241 @@
+"""
+Lightweight span tracing for interactions.
+
+A trace starts where an interaction enters the bot (an app command or a
+component callback) and collects nested spans for the market engine and
+DRIP calls made on its behalf. The current span travels in a context
+variable, so it follows ``await`` and is inherited by tasks created while
+it is active; nothing has to be passed around.
+
+Traces are sampled when they start (``sample_rate``). With ``slow_ms`` set,
+every interaction is recorded and the ones slower than that are kept even
+if they were not sampled, which is what catches the rare slow bet. Kept
+traces go into a ring buffer of ``capacity`` traces and can be exported as
+JSON or as a Chrome trace (chrome://tracing, Perfetto). When a trace is
+not being recorded, ``span`` costs one context variable lookup.
+"""
+import functools
+import inspect
+import itertools
+import json
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Deque, List, Optional
+
+TRACE_CAPACITY = 500
+MAX_SPANS_PER_TRACE = 256  # Background work started by an interaction (e.g. settlement) can add many spans
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+# perf_counter() + this = Unix time, for exporting absolute timestamps
+_EPOCH_OFFSET = time.time() - time.perf_counter()
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'start', 'duration', 'attrs', '_token')
+
+    def __init__(self, trace: "Trace", name: str, parent_id: Optional[int], attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = next(trace.span_ids)
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.attrs = attrs
+        self._token = None
+        trace.spans.append(self)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def activate(self):
+        """Make this the current span for the rest of the running task."""
+        _current.set(self)
+        return self
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self.start
+        if error is not None:
+            self.attrs['error'] = type(error).__name__
+        if self.parent_id is None:
+            self.trace.finished(self)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.finish(exc)
+        return False
+
+
+class _NullSpan:
+    """Stands in for a span when nothing is being recorded."""
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def activate(self):
+        return self
+
+    def finish(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    __slots__ = ('tracer', 'trace_id', 'sampled', 'spans', 'span_ids', 'dropped')
+
+    def __init__(self, tracer: "Tracer", trace_id: int, sampled: bool):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self.span_ids = itertools.count(1)
+        self.dropped = 0
+
+    @property
+    def root(self) -> Span:
+        return self.spans[0]
+
+    def finished(self, root: Span):
+        if self.sampled or (self.tracer.slow_seconds and root.duration >= self.tracer.slow_seconds):
+            self.tracer.traces.append(self)
+
+    def to_dict(self) -> dict:
+        root = self.root
+        return {
+            'trace_id': self.trace_id,
+            'name': root.name,
+            'start': _EPOCH_OFFSET + root.start,
+            'duration_ms': _ms(root.duration),
+            'sampled': self.sampled,
+            'dropped_spans': self.dropped,
+            'spans': [
+                {
+                    'span_id': span.span_id,
+                    'parent_id': span.parent_id,
+                    'name': span.name,
+                    'offset_ms': _ms(span.start - root.start),
+                    'duration_ms': _ms(span.duration),
+                    'attrs': span.attrs,
+                }
+                for span in self.spans
+            ],
+        }
+
+
+class Tracer:
+    """Starts traces and spans and keeps the finished traces worth keeping."""
+
+    def __init__(self, sample_rate: float = 0.0, slow_ms: float = 0, capacity: int = TRACE_CAPACITY, max_spans: int = MAX_SPANS_PER_TRACE):
+        self.traces: Deque[Trace] = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        self.configure(sample_rate, slow_ms, capacity, max_spans)
+
+    def configure(self, sample_rate: float = 0.0, slow_ms: float = 0, capacity: int = TRACE_CAPACITY, max_spans: int = MAX_SPANS_PER_TRACE):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_ms / 1000
+        self.max_spans = max_spans
+        if capacity != self.traces.maxlen:
+            self.traces = deque(self.traces, maxlen=capacity)
+
+    @property
+    def recording(self) -> bool:
+        return bool(self.sample_rate or self.slow_seconds)
+
+    def trace(self, name: str, **attrs):
+        """
+        Start a trace for an interaction, or a child span if one is already
+        being traced. Use as a context manager, or ``activate()`` it and call
+        ``finish()`` later when the start and end are in different callbacks.
+        """
+        if _current.get() is not None:
+            return self.span(name, **attrs)
+        sampled = self.sample_rate >= 1 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+        if not sampled and not self.slow_seconds:
+            return NULL_SPAN
+        return Span(Trace(self, next(self._ids), sampled), name, None, attrs)
+
+    def span(self, name: str, **attrs):
+        """A child of the current span, or a no-op when nothing is being traced."""
+        parent = _current.get()
+        if parent is None:
+            return NULL_SPAN
+        trace = parent.trace
+        if len(trace.spans) >= self.max_spans:
+            trace.dropped += 1
+            return NULL_SPAN
+        return Span(trace, name, parent.span_id, attrs)
+
+    def export_json(self) -> str:
+        return json.dumps([trace.to_dict() for trace in list(self.traces)], default=str)
+
+    def export_chrome(self) -> str:
+        """Kept traces in the Chrome trace event format, one row (tid) per trace."""
+        events = []
+        now = time.perf_counter()
+        for trace in list(self.traces):
+            tid = trace.trace_id
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': f"{trace.root.name} #{tid}"}})
+            for span in list(trace.spans):
+                args = dict(span.attrs)
+                if span.duration is None:
+                    args['unfinished'] = True
+                events.append({
+                    'name': span.name,
+                    'ph': 'X',
+                    'pid': 1,
+                    'tid': tid,
+                    'ts': round((_EPOCH_OFFSET + span.start) * 1e6, 1),
+                    'dur': round(((span.duration if span.duration is not None else now - span.start)) * 1e6, 1),
+                    'args': args,
+                })
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}, default=str)
+
+
+TRACER = Tracer()
+
+
+def current_span():
+    return _current.get() or NULL_SPAN
+
+
+def traced(name: str, root: bool = False):
+    """
+    Decorator that runs a function (sync or async) inside a span named
+    ``name``. With ``root=True`` it starts a trace when none is active, for
+    entry points such as component callbacks.
+    """
+    def decorate(fn):
+        start = TRACER.trace if root else TRACER.span
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with start(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with start(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 3) if seconds is not None else None
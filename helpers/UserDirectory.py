@@ -0,0 +1,80 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import discord
+
+USER_TTL = 3600
+USER_CACHE_SIZE = 5000
+MISSING_USER_TTL = 300  # Ids that fetch_user reported as not found are tried again after this long
+
+
+class UserDirectory:
+    """
+    Cached Discord user lookups.
+
+    Lookups try the gateway cache (``bot.get_user``) first, then a bounded
+    LRU of users fetched earlier, and only then ``bot.fetch_user``. Concurrent
+    fetches for the same id share a single REST call. Ids Discord reports as
+    not found are cached too, for ``missing_ttl``, so departed users do not
+    cost a failing REST call on every render.
+    """
+
+    def __init__(self, bot, ttl: float = USER_TTL, max_size: int = USER_CACHE_SIZE, missing_ttl: float = MISSING_USER_TTL):
+        self.bot = bot
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        self.max_size = max_size
+        self._users: OrderedDict = OrderedDict()  # user_id -> (user or None if not found, fetched_at)
+        self._fetches: Dict[int, asyncio.Task] = {}
+
+    def _cached(self, user_id: int) -> Optional[Tuple[Optional[discord.abc.User], float]]:
+        """The fresh LRU entry for ``user_id``, or None on a miss."""
+        cached = self._users.get(user_id)
+        if cached is None:
+            return None
+        ttl = self.ttl if cached[0] is not None else self.missing_ttl
+        if time.monotonic() - cached[1] >= ttl:
+            return None
+        self._users.move_to_end(user_id)
+        return cached
+
+    def get_cached(self, user_id: int) -> Optional[discord.abc.User]:
+        """Return the user without making any HTTP call, or None."""
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            return user
+        cached = self._cached(user_id)
+        return cached[0] if cached else None
+
+    async def get_user(self, user_id: int) -> Optional[discord.abc.User]:
+        """Return the user, fetching it over REST only on a cache miss."""
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            return user
+        cached = self._cached(user_id)
+        if cached:
+            return cached[0]
+
+        fetch = self._fetches.get(user_id)
+        if fetch is None:
+            fetch = asyncio.ensure_future(self._fetch(user_id))
+            self._fetches[user_id] = fetch
+            fetch.add_done_callback(lambda _: self._fetches.pop(user_id, None))
+        return await asyncio.shield(fetch)
+
+    async def get_name(self, user_id: int) -> str:
+        user = await self.get_user(user_id)
+        return user.name if user else str(user_id)
+
+    async def _fetch(self, user_id: int) -> Optional[discord.abc.User]:
+        try:
+            user = await self.bot.fetch_user(user_id)
+        except discord.NotFound:
+            user = None
+        self._users[user_id] = (user, time.monotonic())
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+        return user
@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Dict, Hashable, Optional
+
+import discord
+
+from helpers.Logging import get_logger
+
+logger = get_logger(__name__)
+
+# Interaction webhook tokens (and so ephemeral follow-ups) can only be edited for 15 minutes.
+MESSAGE_TTL_SECONDS = 14 * 60
+MAX_SUBSCRIPTIONS = 1000
+
+
+class TokenBucket:
+    """Simple token bucket: ``capacity`` edits per ``period`` seconds."""
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+
+def edit_digest(edit: dict) -> bytes:
+    """Content hash of a message edit, so a render identical to what is on screen is not sent again."""
+    payload = {}
+    for key, value in edit.items():
+        if isinstance(value, discord.Embed):
+            value = value.to_dict()
+        elif isinstance(value, discord.ui.View):
+            value = value.to_components()
+        payload[key] = value
+    return hashlib.blake2b(json.dumps(payload, sort_keys=True, default=str).encode(), digest_size=16).digest()
+
+
+class RenderedEdit(dict):
+    """
+    Message edit whose digest is computed once, when it is built. Panels
+    that cache their edits return the same object to every message showing
+    it, so the hub compares digests without encoding the edit again.
+    ``key`` is the panel's ``render_key()`` for what the edit shows, so the
+    hub remembers that rather than whatever the key has become by the time
+    the message is sent. Treat it as read-only once built.
+    """
+    __slots__ = ('digest', 'key')
+
+    def __init__(self, key: Hashable = None, **edit):
+        super().__init__(**edit)
+        self.key = key
+        self.digest = edit_digest(self)
+
+
+def digest_of(edit: dict) -> bytes:
+    return edit.digest if isinstance(edit, RenderedEdit) else edit_digest(edit)
+
+
+def key_of(view, edit: Optional[dict]) -> Hashable:
+    """The render key of what a message shows after ``edit``: the edit's own, else the panel's current one."""
+    key = getattr(edit, 'key', None)
+    return key if key is not None else view.render_key()
+
+
+class _Subscription:
+    __slots__ = ('view', 'last_key', 'last_digest', 'subscribed_at')
+
+    def __init__(self, view, sent: Optional[dict] = None):
+        self.view = view
+        # Subscribers have just rendered their message, so start from the key it was rendered at
+        self.last_key = key_of(view, sent)
+        self.last_digest = digest_of(sent) if sent else None
+        self.subscribed_at = time.monotonic()
+
+
+class ViewRefreshHub:
+    """
+    Single refresher for every live market message.
+
+    Panels subscribe once their message is sent, instead of running their own
+    polling loop. A panel exposes ``stored_interaction`` (the message to
+    edit), ``render_key()`` (a cheap value that changes whenever the rendered
+    output would, or None when it can't tell without rendering) and an async
+    ``render()`` that returns the keyword arguments for ``message.edit``,
+    ideally as a cached ``RenderedEdit`` shared by every message showing the
+    same thing. A render whose content
+    hash matches what the message already shows is dropped. Subscriptions
+    are keyed by message id, expire with the message's edit window and are capped at
+    ``max_subscriptions`` (oldest dropped first), so memory stays bounded
+    however many menus users open. The hub only renders a panel when its key
+    changed, keeps at most one pending edit per message (newer renders
+    replace older ones) and sends edits through global and per-channel token
+    buckets. It yields to the event loop between subscriptions, so a pass
+    over many messages never blocks interactions for long.
+    """
+
+    def __init__(
+        self,
+        interval: float = 5.0,
+        global_rate: tuple = (40, 1.0),
+        channel_rate: tuple = (5, 5.0),
+        message_ttl: float = MESSAGE_TTL_SECONDS,
+        max_subscriptions: int = MAX_SUBSCRIPTIONS
+    ):
+        self.interval = interval
+        self.message_ttl = message_ttl
+        self.max_subscriptions = max_subscriptions
+        self._global_bucket = TokenBucket(*global_rate)
+        self._channel_rate = channel_rate
+        self._channel_buckets: Dict[int, TokenBucket] = {}
+        self._subscriptions: Dict[int, _Subscription] = {}  # message id -> subscription, oldest first
+        self._pending_edits: Dict[int, tuple] = {}  # message id -> (message, kwargs, view)
+        self._dirty = asyncio.Event()
+        self._edits_ready = asyncio.Event()
+        self._tasks = []
+
+    @property
+    def subscribed(self) -> int:
+        return len(self._subscriptions)
+
+    @property
+    def queued_edits(self) -> int:
+        return len(self._pending_edits)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._render_loop()),
+                asyncio.create_task(self._send_loop()),
+            ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def subscribe(self, view, sent: Optional[dict] = None):
+        """
+        Keep a sent message up to date; subscribing the same message again replaces its panel.
+        ``sent`` is what the message was sent with, if known.
+        """
+        message_id = view.stored_interaction.id
+        self._subscriptions.pop(message_id, None)
+        self._subscriptions[message_id] = _Subscription(view, sent)
+        while len(self._subscriptions) > self.max_subscriptions:
+            self._subscriptions.pop(next(iter(self._subscriptions)))
+        self._dirty.set()
+
+    def unsubscribe(self, view):
+        message = view.stored_interaction
+        if message is not None:
+            subscription = self._subscriptions.get(message.id)
+            if subscription is not None and subscription.view is view:
+                del self._subscriptions[message.id]
+
+    def record_sent(self, view, edit: dict):
+        """The panel's message was edited outside the hub (e.g. by a button); remember what it shows."""
+        subscription = self._subscriptions.get(view.stored_interaction.id) if view.stored_interaction else None
+        if subscription is not None and subscription.view is view:
+            subscription.last_key = key_of(view, edit)
+            subscription.last_digest = digest_of(edit)
+
+    def find(self, message_id: int):
+        """The panel currently subscribed for a message, or None."""
+        subscription = self._subscriptions.get(message_id)
+        return subscription.view if subscription else None
+
+    def notify(self, prediction=None):
+        """Something changed; re-check subscribed views on the next pass."""
+        self._dirty.set()
+
+    async def _render_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._dirty.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty.clear()
+            await self._render_changed()
+
+    async def _render_changed(self):
+        now = time.monotonic()
+        for key, subscription in list(self._subscriptions.items()):
+            # Let interactions in between; a subscription may be replaced or dropped meanwhile
+            await asyncio.sleep(0)
+            if self._subscriptions.get(key) is not subscription:
+                continue
+            view = subscription.view
+            if now - subscription.subscribed_at > self.message_ttl:
+                self._subscriptions.pop(key, None)
+                continue
+            message = view.stored_interaction
+            try:
+                key = view.render_key()
+                # An unknown key counts as changed; the digest check below drops a render that changed nothing
+                if key is not None and key == subscription.last_key:
+                    continue
+                edit = await view.render()
+                # Rendering can move the panel on (e.g. clamp its page); remember the key it ended at
+                subscription.last_key = key_of(view, edit)
+            except Exception:
+                logger.exception("Error rendering view")
+                self._subscriptions.pop(key, None)
+                continue
+            if edit is None:
+                continue
+            digest = digest_of(edit)
+            if digest == subscription.last_digest:
+                continue
+            subscription.last_digest = digest
+            self._pending_edits[message.id] = (message, edit, view)
+            self._edits_ready.set()
+
+    def _channel_bucket(self, message) -> TokenBucket:
+        channel = getattr(message, "channel", None)
+        channel_id = getattr(channel, "id", 0)
+        bucket = self._channel_buckets.get(channel_id)
+        if bucket is None:
+            bucket = self._channel_buckets[channel_id] = TokenBucket(*self._channel_rate)
+        return bucket
+
+    def _next_ready(self) -> tuple:
+        """Pick the queued edit that can go out soonest and how long until it can."""
+        best_id, best_delay = None, None
+        for message_id, (message, _, _) in self._pending_edits.items():
+            delay = self._channel_bucket(message).delay()
+            if best_delay is None or delay < best_delay:
+                best_id, best_delay = message_id, delay
+                if delay == 0:
+                    break
+        return best_id, max(best_delay or 0.0, self._global_bucket.delay())
+
+    async def _send_loop(self):
+        while True:
+            if not self._pending_edits:
+                self._edits_ready.clear()
+                await self._edits_ready.wait()
+                continue
+
+            message_id, delay = self._next_ready()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            message, edit, view = self._pending_edits.pop(message_id)
+            self._global_bucket.take()
+            self._channel_bucket(message).take()
+            try:
+                await message.edit(**edit)
+            except discord.NotFound:
+                self.unsubscribe(view)
+            except Exception:
+                logger.exception("Error refreshing view")
+                self.unsubscribe(view)
@@ -0,0 +1,22 @@
+import os
+import sys
+
+# Tests import the bot's packages (helpers, cogs, benchmarks) from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+
+@pytest.fixture
+def drip(monkeypatch):
+    """A fake DRIP server with 1000 points per user, and a DRIP client that gives up and retries fast."""
+    from benchmarks.fake_drip import FakeDripServer
+    from helpers import SimplePointsManager
+
+    monkeypatch.setattr(SimplePointsManager, "REQUEST_TIMEOUT", 0.2)
+    monkeypatch.setattr(SimplePointsManager, "BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(SimplePointsManager.PointsManagerSingleton, "_instance", None)
+    server = FakeDripServer(initial_balance=1000)
+    server.start()
+    yield server
+    server.stop()
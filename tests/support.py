@@ -0,0 +1,81 @@
+"""
+Shared setup for the tests: an Economy cog on the benchmark stubs, markets
+created the way /create_prediction creates them, a simulated crash, and a
+real DRIP client for the ``drip`` fixture's fake server.
+
+pytest-asyncio is not a dependency, so async tests are plain functions that
+hand a coroutine to ``asyncio.run``.
+"""
+import asyncio
+import datetime
+
+from benchmarks.stubs import StubBot, load_economy
+from helpers.SimplePointsManager import PointsManagerSingleton
+
+
+async def economy(directory, bot: StubBot = None):
+    """A loaded Economy cog whose store and event log live in ``directory``."""
+    return await load_economy(str(directory), bot)
+
+
+async def new_market(cog, options=("Yes", "No"), ends_in: datetime.timedelta = datetime.timedelta(days=1), creator: int = 1):
+    """Create, record and register an open market, as the create command does."""
+    from cogs.economy import Prediction
+
+    end_time = datetime.datetime.utcnow() + ends_in
+    prediction = Prediction("Will the tests pass?", end_time, list(options), creator, cog, "Tests")
+    prediction.id = await cog.store.insert_market(prediction)
+    cog.events.append(
+        'create',
+        market=prediction.id,
+        question=prediction.question,
+        category=prediction.category,
+        creator=creator,
+        end_time=end_time.isoformat(),
+        options=prediction.options,
+        liquidity=prediction.liquidity
+    )
+    cog.markets.add(prediction)
+    cog.schedule_deadlines(prediction)
+    return prediction
+
+
+async def stop(cog):
+    """Shut the cog down cleanly, flushing the store and the event log."""
+    await cog.cog_unload()
+
+
+async def crash(cog):
+    """
+    Stop the cog the way a killed process stops: events not yet written and
+    store changes not yet committed are lost, nothing is flushed.
+    """
+    await cog.scheduler.stop()
+    await cog.refresh_hub.stop()
+    await cog.settlement.stop()
+    for task in (cog.events._task, cog.store._flush_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    cog.events._buffer.clear()
+    cog.events._file.close()
+    cog.events._file = None
+    await cog.store.db.close()
+    cog.store.db = None
+
+
+def run_with_client(drip, scenario, breaker=None):
+    """Run ``scenario(points_manager)`` with a fresh client for the fake server."""
+    async def main():
+        points_manager = PointsManagerSingleton(base_url=drip.base_url, api_key="test", realm_id=drip.realm_id)
+        if breaker:
+            points_manager.breaker = breaker
+        await points_manager.initialize()
+        try:
+            return await scenario(points_manager)
+        finally:
+            await points_manager.cleanup()
+
+    return asyncio.run(main())
@@ -0,0 +1,62 @@
+"""Prediction's running per-option totals and the checker that recounts them."""
+import asyncio
+
+from tests.support import economy, new_market, stop
+
+
+def test_running_totals_follow_bets(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        prediction = await new_market(cog, options=("Yes", "No", "Maybe"))
+        shares = prediction.apply_bets([(1, "Yes", 100), (2, "No", 40), (1, "Yes", 60), (3, "Maybe", 0)])
+        assert shares[3] == 0
+        assert prediction.option_volume == {"Yes": 160, "No": 40, "Maybe": 0}
+        assert prediction.option_bettors == {"Yes": 1, "No": 1, "Maybe": 0}
+        assert prediction.option_shares["Yes"] == shares[0] + shares[2]
+        assert prediction.total_bets == 200
+        assert prediction.get_option_total_bets("Yes") == 160
+        assert prediction.get_odds() == {"Yes": 0.8, "No": 0.2, "Maybe": 0.0}
+        assert prediction.check_aggregates() == {}
+        await stop(cog)
+
+    asyncio.run(scenario())
+
+
+def test_checker_reports_drifted_totals(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        prediction = await new_market(cog)
+        prediction.apply_bets([(1, "Yes", 100), (2, "No", 50)])
+        yes = prediction.positions[0]
+        yes.total_amount += 5
+        yes.total_shares *= 1.01
+        prediction.total_bets -= 1
+        mismatches = prediction.check_aggregates()
+        assert set(mismatches) == {"Yes", "total_bets"}
+        assert mismatches["Yes"]["expected"][0] == 100
+        assert mismatches["Yes"]["actual"][0] == 105
+        assert mismatches["total_bets"] == {'expected': 150, 'actual': 149}
+        # Float noise within the tolerance is not a mismatch
+        yes.total_amount -= 5
+        yes.total_shares = yes.recount()[1] * (1 + 1e-9)
+        prediction.total_bets += 1
+        assert prediction.check_aggregates() == {}
+        await stop(cog)
+
+    asyncio.run(scenario())
+
+
+def test_totals_survive_a_restart(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        prediction = await new_market(cog)
+        prediction.apply_bets([(user, "Yes" if user % 3 else "No", 10 + user) for user in range(50)])
+        volume = prediction.option_volume
+        await stop(cog)
+        cog = await economy(tmp_path)
+        reloaded = cog.markets.get(prediction.id)
+        assert reloaded.option_volume == volume
+        assert reloaded.check_aggregates() == {}
+        await stop(cog)
+
+    asyncio.run(scenario())
@@ -0,0 +1,116 @@
+"""The DRIP client's balance cache: TTL, LRU eviction, write-through and reserves."""
+import asyncio
+
+from helpers.SimplePointsManager import PointsManagerSingleton
+from tests.support import run_with_client
+
+
+def fetches(drip):
+    return drip.requests["get_balance"]
+
+
+def test_fresh_balances_come_from_the_cache(drip):
+    async def scenario(points_manager):
+        points_manager.balance_ttl = 0.1
+        assert await points_manager.get_balance(1) == 1000
+        assert await points_manager.get_balance(1) == 1000
+        assert fetches(drip) == 1
+        await asyncio.sleep(0.15)
+        # Expired: fetched again
+        assert await points_manager.get_balance(1) == 1000
+        assert fetches(drip) == 2
+        assert await points_manager.get_balance(1, use_cache=False) == 1000
+        assert fetches(drip) == 3
+
+    run_with_client(drip, scenario)
+
+
+def test_concurrent_misses_share_one_fetch(drip):
+    async def scenario(points_manager):
+        balances = await asyncio.gather(*(points_manager.get_balance(1) for _ in range(20)))
+        assert balances == [1000] * 20
+        assert fetches(drip) == 1
+
+    run_with_client(drip, scenario)
+
+
+def test_least_recently_used_balance_is_evicted(drip):
+    async def scenario(points_manager):
+        points_manager.balance_cache_size = 2
+        await points_manager.get_balance(1)
+        await points_manager.get_balance(2)
+        await points_manager.get_balance(1)  # 2 is now the least recently used
+        await points_manager.get_balance(3)
+        assert list(points_manager._balances) == [1, 3]
+        assert fetches(drip) == 3
+        await points_manager.get_balance(1)
+        assert fetches(drip) == 3
+        await points_manager.get_balance(2)
+        assert fetches(drip) == 4
+
+    run_with_client(drip, scenario)
+
+
+def test_writes_go_through_to_the_cache(drip):
+    async def scenario(points_manager):
+        await points_manager.get_balance(1)
+        await points_manager.get_balance(2)
+        assert await points_manager.add_points(1, 50)
+        assert await points_manager.remove_points(2, 30)
+        assert await points_manager.transfer_points(1, 2, 100)
+        assert await points_manager.get_balance(1) == 950
+        assert await points_manager.get_balance(2) == 1070
+        assert fetches(drip) == 2
+
+    run_with_client(drip, scenario)
+
+
+def test_failed_writes_invalidate_the_cache(drip):
+    async def scenario(points_manager):
+        await points_manager.get_balance(1)
+        await points_manager.get_balance(2)
+        # DRIP refuses both for lack of funds; what it holds now is unknown to the client
+        assert not await points_manager.remove_points(1, 5000)
+        assert not await points_manager.transfer_points(2, 1, 5000)
+        assert 1 not in points_manager._balances and 2 not in points_manager._balances
+        assert await points_manager.get_balance(1) == 1000
+        assert fetches(drip) == 3
+
+    run_with_client(drip, scenario)
+
+
+def test_reserves_cannot_overdraw_the_cached_balance(drip):
+    async def scenario(points_manager):
+        assert await points_manager.reserve(1, 600)
+        # 1000 cached, 600 held: 400 left
+        assert not await points_manager.reserve(1, 401)
+        assert await points_manager.reserve(1, 400)
+        assert not await points_manager.reserve(1, 1)
+        assert points_manager.available_balance(1, 1000) == 0
+        points_manager.release(1, 600)
+        assert points_manager.available_balance(1, 1000) == 600
+        assert await points_manager.reserve(1, 600)
+        points_manager.release(1, 600)
+        points_manager.release(1, 400)
+        assert points_manager._reserved == {}
+        # Reserves are per user
+        assert await points_manager.reserve(2, 1000)
+        assert fetches(drip) == 2
+
+    run_with_client(drip, scenario)
+
+
+def test_concurrent_reserves_never_hold_more_than_the_balance(drip):
+    async def scenario(points_manager):
+        held = await asyncio.gather(*(points_manager.reserve(1, 300) for _ in range(10)))
+        assert held.count(True) == 3
+        assert points_manager._reserved[1] == 900
+
+    run_with_client(drip, scenario)
+
+
+def test_cache_settings_are_configurable(drip):
+    points_manager = PointsManagerSingleton(
+        base_url=drip.base_url, api_key="test", realm_id=drip.realm_id, balance_ttl=5, balance_cache_size=7
+    )
+    assert (points_manager.balance_ttl, points_manager.balance_cache_size) == (5, 7)
@@ -0,0 +1,79 @@
+"""batch_adjust: one DRIP call per user, a result per item, and dead letters for failed payouts."""
+import asyncio
+import datetime
+
+from benchmarks.stubs import StubBot
+from helpers.Payouts import compute_payouts
+from tests.support import economy, new_market, run_with_client
+
+
+def test_deltas_for_the_same_user_share_one_call(drip):
+    adjustments = [(1, 10), (2, 5), (1, 15), (3, 7), (1, -5), (4, 0)]
+
+    async def scenario(points_manager):
+        return await points_manager.batch_adjust(adjustments)
+
+    results = run_with_client(drip, scenario)
+    assert results == [(user_id, delta, True) for user_id, delta in adjustments]
+    # Users 1, 2 and 3 once each; a net zero change needs no call at all
+    assert drip.requests["token_balance"] == 3
+    assert drip.balances == {1: 1020, 2: 1005, 3: 1007}
+
+
+def test_a_failed_user_is_reported_on_each_of_its_items(drip):
+    # User 2's net debit is more than the 1000 points it has, so DRIP refuses it
+    adjustments = [(1, 50), (2, -5000), (3, 20), (2, 100)]
+
+    async def scenario(points_manager):
+        return await points_manager.batch_adjust(adjustments)
+
+    results = run_with_client(drip, scenario)
+    assert results == [(1, 50, True), (2, -5000, False), (3, 20, True), (2, 100, False)]
+    assert drip.balances[1] == 1050
+    assert drip.balances[2] == 1000
+    assert drip.balances[3] == 1020
+
+
+def test_repeating_a_keyed_batch_applies_it_once(drip):
+    adjustments = [(1, 10), (2, 20)]
+
+    async def scenario(points_manager):
+        first = await points_manager.batch_adjust(adjustments, key_prefix="settlement:9")
+        second = await points_manager.batch_adjust(adjustments, key_prefix="settlement:9")
+        return first, second
+
+    first, second = run_with_client(drip, scenario)
+    assert all(success for _, _, success in first + second)
+    assert drip.requests["token_balance"] == 4
+    assert drip.balances == {1: 1010, 2: 1020}
+
+
+def test_settlement_dead_letters_the_payouts_that_failed(drip, tmp_path):
+    winners = {10: 100, 11: 200, 12: 300}
+    drip.inject(400)  # The first payout request is refused
+
+    async def scenario(points_manager):
+        bot = StubBot()
+        bot.points_manager = points_manager
+        cog = await economy(tmp_path, bot)
+        prediction = await new_market(cog)
+        prediction.apply_bets([(user_id, "Yes", stake) for user_id, stake in winners.items()] + [(20, "No", 400)])
+        prediction.end_time = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+        assert await prediction.async_resolve("Yes")
+        progress = cog.settlement.progress[prediction.id]
+        while progress['credited'] + progress['failed'] < progress['total']:
+            await asyncio.sleep(0.01)
+        letters = list(points_manager.dead_letters)
+        await cog.cog_unload()
+        return prediction.id, progress, letters
+
+    market_id, progress, letters = run_with_client(drip, scenario)
+    assert progress['failed'] == 1
+    assert len(letters) == 1
+    failed = letters[0].user_id
+    assert letters[0].idempotency_key == f"settlement:{market_id}:{failed}"
+    payouts = {user_id: payout for user_id, _, payout in compute_payouts(list(winners), list(winners.values()), 1000).rows()}
+    assert letters[0].amount == payouts[failed]
+    assert drip.requests["token_balance"] == len(winners)
+    for user_id, payout in payouts.items():
+        assert drip.balances.get(user_id, 1000) == 1000 + (0 if user_id == failed else payout)
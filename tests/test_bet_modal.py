@@ -0,0 +1,95 @@
+"""The bet modal only records a bet the user has paid for, and refunds one the market rejects."""
+import asyncio
+import datetime
+
+from benchmarks.fake_discord import CallLog, FakeChannel, FakeInteraction, FakeMember
+from benchmarks.stubs import StubBot, StubPointsManager
+from tests.support import economy, new_market
+
+USER = 5
+
+
+class FailingTransfers(StubPointsManager):
+    """Every transfer fails, as when DRIP is down or the breaker is open."""
+
+    def __init__(self):
+        super().__init__()
+        self.held = 0
+
+    async def reserve(self, user_id, amount):
+        self.held += amount
+        return True
+
+    def release(self, user_id, amount):
+        self.held -= amount
+
+    async def transfer_points(self, from_user_id, to_user_id, amount, idempotency_key=None):
+        return False
+
+
+async def submit(cog, prediction, amount="100"):
+    from cogs.economy import AmountInput
+
+    calls = CallLog()
+    interaction = FakeInteraction(cog.bot, FakeMember(USER, calls), FakeChannel(calls))
+    modal = AmountInput(prediction, "Yes", cog)
+    modal.amount._value = amount
+    await modal.on_submit(interaction)
+    return interaction
+
+
+def test_bet_is_placed_after_deferring(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        prediction = await new_market(cog)
+        interaction = await submit(cog, prediction)
+        assert interaction.response.is_done()
+        assert interaction.messages[-1].startswith("Bet placed successfully!")
+        assert prediction.total_bets == 100
+        # Only the transfer into the pool charges the user
+        assert cog.bot.points_manager.adjustments == 1
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
+
+
+def test_failed_transfer_places_no_bet(tmp_path):
+    async def scenario():
+        bot = StubBot()
+        bot.points_manager = FailingTransfers()
+        cog = await economy(tmp_path, bot)
+        prediction = await new_market(cog)
+        interaction = await submit(cog, prediction)
+        assert "bet was not placed" in interaction.messages[-1]
+        assert prediction.total_bets == 0
+        assert bot.points_manager.held == 0
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
+
+
+def test_failed_refund_is_dead_lettered(tmp_path):
+    async def scenario():
+        bot = StubBot()
+        points_manager = bot.points_manager
+        transfers = []
+
+        async def transfer_points(from_user_id, to_user_id, amount, idempotency_key=None):
+            transfers.append((from_user_id, to_user_id, amount))
+            if from_user_id != USER:
+                return False  # The refund does not go through
+            # Betting closes while the stake is on its way in
+            prediction.end_time = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+            return True
+
+        points_manager.transfer_points = transfer_points
+        cog = await economy(tmp_path, bot)
+        prediction = await new_market(cog)
+        interaction = await submit(cog, prediction)
+        assert prediction.total_bets == 0
+        assert transfers == [(USER, 0, 100), (0, USER, 100)]
+        assert points_manager.dead_letters == [(USER, 100, f"bet-refund:{interaction.id}", 0)]
+        assert "will be retried" in interaction.messages[-1]
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
@@ -0,0 +1,110 @@
+"""Bursts of bets: each market applies its own bets in arrival order, and markets never wait on each other."""
+import asyncio
+import random
+
+from benchmarks.fake_discord import CallLog, FakeChannel, FakeInteraction, FakeMember
+from helpers import LMSR
+from helpers.BetQueue import BetQueue
+from tests.support import economy, new_market
+
+
+def test_a_burst_of_modal_submits_prices_like_a_sequential_replay(tmp_path, monkeypatch):
+    from cogs.economy import AmountInput, Prediction
+
+    rng = random.Random(3)
+    submitted = {}
+    place_bet = Prediction.place_bet
+
+    async def recording_place_bet(self, user_id, option, amount):
+        # The order bets reach each market's queue
+        submitted.setdefault(self.id, []).append((user_id, option, amount))
+        return await place_bet(self, user_id, option, amount)
+
+    batch_sizes = []
+    apply_bets = Prediction.apply_bets
+
+    def recording_apply_bets(self, batch):
+        batch_sizes.append(len(batch))
+        return apply_bets(self, batch)
+
+    monkeypatch.setattr(Prediction, "place_bet", recording_place_bet)
+    monkeypatch.setattr(Prediction, "apply_bets", recording_apply_bets)
+
+    async def scenario():
+        cog = await economy(tmp_path)
+        markets = [await new_market(cog), await new_market(cog, options=("Red", "Green", "Blue"))]
+        calls = CallLog()
+        channel = FakeChannel(calls)
+        submits = []
+        for i in range(300):
+            prediction = rng.choice(markets)
+            modal = AmountInput(prediction, rng.choice(prediction.options), cog)
+            modal.amount._value = str(rng.randint(10, 5000))
+            submits.append(modal.on_submit(FakeInteraction(cog.bot, FakeMember(1000 + i % 40, calls), channel)))
+        await asyncio.gather(*submits)
+        await cog.events.sync()
+        applied = {}
+        for event in cog.events.read():
+            if event['type'] == 'bet':
+                applied.setdefault(event['market'], []).append(event)
+
+        for prediction in markets:
+            bets = applied[prediction.id]
+            # Every bet went in, in the order it reached the market
+            assert [(bet['user'], bet['option'], bet['amount']) for bet in bets] == submitted[prediction.id]
+            # Each bet was priced from the LMSR state left by the bet before it
+            q = [0.0] * len(prediction.options)
+            for bet in bets:
+                index = prediction.option_index[bet['option']]
+                shares = LMSR.shares_for_cost(q, prediction.liquidity, index, bet['amount'])
+                assert bet['shares'] == shares
+                q[index] += shares
+            assert prediction._share_vector() == q
+            assert prediction.total_bets == sum(bet['amount'] for bet in bets)
+            assert prediction.check_aggregates() == {}
+        assert sum(len(bets) for bets in applied.values()) == 300
+        # The submits really were concurrent: bets queued behind each other and went in batches
+        assert len(batch_sizes) < 300
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
+
+
+def test_one_markets_backlog_does_not_hold_up_another():
+    async def scenario():
+        batches = {'busy': [], 'quiet': []}
+
+        def applier(name):
+            def apply_batch(batch):
+                batches[name].append(len(batch))
+                return [amount for _, amount in batch]
+            return apply_batch
+
+        busy = BetQueue(applier('busy'), max_batch=16)
+        quiet = BetQueue(applier('quiet'), max_batch=16)
+        backlog = [busy.submit(user_id, 10) for user_id in range(200)]
+        bet = quiet.submit(1, 99)
+        assert await bet == 99
+        # The quiet market's bet was applied while most of the busy market's were still queued
+        assert len(busy) > 100
+        assert await asyncio.gather(*backlog) == [10] * 200
+        assert batches == {'busy': [16] * 12 + [8], 'quiet': [1]}
+
+    asyncio.run(scenario())
+
+
+def test_a_failing_batch_fails_only_its_own_bets():
+    async def scenario():
+        def apply_batch(batch):
+            if any(amount < 0 for _, amount in batch):
+                raise ValueError("bad batch")
+            return [amount for _, amount in batch]
+
+        queue = BetQueue(apply_batch, max_batch=2)
+        futures = [queue.submit(1, 5), queue.submit(2, -1), queue.submit(3, 7)]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        assert isinstance(results[0], ValueError) and isinstance(results[1], ValueError)
+        assert results[2] == 7
+        assert len(queue) == 0
+
+    asyncio.run(scenario())
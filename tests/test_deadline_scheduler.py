@@ -0,0 +1,122 @@
+"""DeadlineScheduler: deadlines fire once, in order, and can be moved or cancelled."""
+import asyncio
+import datetime
+
+from helpers.DeadlineScheduler import DeadlineScheduler
+
+
+def due_in(seconds):
+    return datetime.datetime.utcnow() + datetime.timedelta(seconds=seconds)
+
+
+def recorder(fired, name):
+    async def callback():
+        fired.append(name)
+    return callback
+
+
+def test_deadlines_fire_in_due_order():
+    async def scenario():
+        scheduler = DeadlineScheduler()
+        fired = []
+        scheduler.start()
+        for name, seconds in (("c", 0.15), ("a", 0.05), ("b", 0.1)):
+            scheduler.schedule(name, due_in(seconds), recorder(fired, name))
+        assert scheduler.pending == 3
+        await asyncio.sleep(0.3)
+        assert fired == ["a", "b", "c"]
+        assert scheduler.pending == 0
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_past_deadlines_fire_right_away():
+    async def scenario():
+        scheduler = DeadlineScheduler()
+        fired = []
+        # Scheduled before start, as cog_load does for deadlines missed while the bot was down
+        scheduler.schedule("missed", due_in(-3600), recorder(fired, "missed"))
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        assert fired == ["missed"]
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_cancel_and_reschedule():
+    async def scenario():
+        scheduler = DeadlineScheduler()
+        fired = []
+        scheduler.start()
+        # A long sleep must be cut short when an earlier deadline arrives
+        scheduler.schedule("later", due_in(3600), recorder(fired, "later"))
+        scheduler.schedule("cancelled", due_in(0.05), recorder(fired, "cancelled"))
+        scheduler.schedule("moved", due_in(3600), recorder(fired, "moved"))
+        scheduler.schedule("moved", due_in(0.05), recorder(fired, "moved"))
+        assert scheduler.cancel("cancelled") is True
+        assert scheduler.cancel("cancelled") is False
+        assert "cancelled" not in scheduler and "moved" in scheduler
+        await asyncio.sleep(0.2)
+        assert fired == ["moved"]
+        assert scheduler.pending == 1
+        assert scheduler.next_deadline() > datetime.datetime.utcnow()
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_heap_stays_ordered_through_many_cancels():
+    scheduler = DeadlineScheduler()
+    now = datetime.datetime.utcnow()
+    for i in range(200):
+        scheduler.schedule(i, now + datetime.timedelta(seconds=(i * 37) % 200), recorder([], i))
+    for i in range(0, 200, 3):
+        scheduler.cancel(i)
+    order = []
+    while len(scheduler):
+        order.append(scheduler._pop()[0])
+    assert order == sorted(order)
+    assert len(order) == 200 - len(range(0, 200, 3))
+
+
+def test_a_failing_callback_does_not_stop_the_others():
+    async def scenario():
+        scheduler = DeadlineScheduler()
+        fired = []
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        scheduler.start()
+        scheduler.schedule("broken", due_in(0.01), broken)
+        scheduler.schedule("after", due_in(0.05), recorder(fired, "after"))
+        await asyncio.sleep(0.15)
+        assert fired == ["after"]
+        await scheduler.stop()
+
+    asyncio.run(scenario())
+
+
+def test_stop_cancels_running_callbacks():
+    async def scenario():
+        scheduler = DeadlineScheduler()
+        started = asyncio.Event()
+        cancelled = []
+
+        async def slow():
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        scheduler.start()
+        scheduler.schedule("slow", due_in(0), slow)
+        await asyncio.wait_for(started.wait(), 1)
+        await scheduler.stop()
+        assert cancelled == [True]
+
+    asyncio.run(scenario())
@@ -0,0 +1,62 @@
+"""Incremental page packing gives the same pages as packing from scratch."""
+import random
+
+from helpers.EmbedPager import EmbedPager
+
+
+def fresh_pages(items, char_budget, max_fields):
+    pager = EmbedPager(char_budget, max_fields)
+    pager.layout(list(items))
+    return pager.pages()
+
+
+def test_fields_fill_pages_up_to_the_limits():
+    pager = EmbedPager(char_budget=100, max_fields=3)
+    assert pager.layout([(i, 30) for i in range(7)]) == [(0, 3), (3, 6), (6, 7)]
+    assert pager.layout([(i, 60) for i in range(3)]) == [(0, 1), (1, 2), (2, 3)]
+    assert pager.page(10) == (2, 3)
+
+
+def test_in_place_changes_match_a_fresh_layout():
+    rng = random.Random(7)
+    for trial in range(200):
+        pager = EmbedPager(char_budget=500, max_fields=5)
+        items = [(i, rng.randint(10, 200)) for i in range(rng.randint(0, 60))]
+        pager.layout(items)
+        next_key = len(items)
+        for _ in range(20):
+            before = [items[start:stop] for start, stop in pager.pages()]
+            for _ in range(rng.randint(1, 4)):
+                roll = rng.random()
+                if roll < 0.4 and items:
+                    index = rng.randrange(len(items))
+                    items[index] = (items[index][0], rng.randint(10, 200))
+                    pager.replace(index, *items[index])
+                elif roll < 0.7:
+                    index = rng.randint(0, len(items))
+                    items.insert(index, (next_key, rng.randint(10, 200)))
+                    pager.insert(index, *items[index])
+                    next_key += 1
+                elif items:
+                    index = rng.randrange(len(items))
+                    del items[index]
+                    pager.remove(index)
+            repacked = pager.repack()
+            assert pager.pages() == fresh_pages(items, 500, 5)
+
+            # Pages outside the repacked range hold the same fields as before
+            after = [items[start:stop] for start, stop in pager.pages()]
+            first, stop = repacked or (len(after), len(after))
+            assert after[:first] == before[:first] or repacked is None
+            tail = len(after) - stop
+            if tail:
+                assert [[key for key, _ in page] for page in after[stop:]] == [[key for key, _ in page] for page in before[-tail:]]
+
+
+def test_repack_stops_where_pages_line_up_again():
+    pager = EmbedPager(char_budget=1000, max_fields=5)
+    pager.layout([(i, 10) for i in range(100)])
+    pager.replace(42, 42, 20)
+    # Same field count per page, so only the page holding field 42 is looked at
+    assert pager.repack() == (8, 9)
+    assert pager.pages() == fresh_pages([(i, 20 if i == 42 else 10) for i in range(100)], 1000, 5)
@@ -0,0 +1,64 @@
+"""LMSR market maker: prices, cost and its closed-form inverse."""
+import math
+
+import pytest
+
+from helpers import LMSR
+
+B = 10000
+
+
+def test_new_market_prices_are_uniform():
+    for outcomes in (2, 3, 10):
+        assert LMSR.prices([0.0] * outcomes, B) == pytest.approx([1 / outcomes] * outcomes)
+
+
+def test_prices_sum_to_one_and_follow_demand():
+    q = [3000.0, -500.0, 12000.0]
+    prices = LMSR.prices(q, B)
+    assert sum(prices) == pytest.approx(1.0)
+    assert prices[2] > prices[0] > prices[1]
+    # Binary prices are the logistic function of the share difference
+    assert LMSR.prices([q[0], q[1]], B)[0] == pytest.approx(1 / (1 + math.exp(-(q[0] - q[1]) / B)))
+
+
+def test_shares_for_cost_inverts_cost_to_buy():
+    q = [2500.0, 0.0, 800.0]
+    for index in range(3):
+        for points in (1, 100, 5000, 250000):
+            shares = LMSR.shares_for_cost(q, B, index, points)
+            assert LMSR.cost_to_buy(q, B, index, shares) == pytest.approx(points, rel=1e-9)
+    assert LMSR.shares_for_cost(q, B, 0, 0) == 0.0
+
+
+def test_buying_raises_the_price_and_each_share_costs_under_one_point():
+    q = [0.0, 0.0]
+    before = LMSR.prices(q, B)[0]
+    shares = LMSR.shares_for_cost(q, B, 0, 1000)
+    assert shares > 1000  # Every share costs less than the point it pays out
+    q[0] += shares
+    assert LMSR.prices(q, B)[0] > before
+
+
+def test_quote_all_matches_single_quotes():
+    q = [100.0, 4000.0, -2000.0, 0.0]
+    prices, shares = LMSR.quote_all(q, B, 750)
+    assert prices == pytest.approx(LMSR.prices(q, B))
+    assert shares == pytest.approx([LMSR.shares_for_cost(q, B, i, 750) for i in range(len(q))])
+    assert LMSR.quote_all(q, B, 0)[1] == [0.0] * len(q)
+
+
+def test_lopsided_markets_do_not_overflow():
+    q = [5_000_000.0, 0.0]
+    prices = LMSR.prices(q, B)
+    assert prices == pytest.approx([1.0, 0.0])
+    assert math.isfinite(LMSR.cost(q, B))
+    assert math.isfinite(LMSR.shares_for_cost(q, B, 1, 100))
+
+
+def test_max_loss_bounds_the_subsidy():
+    assert LMSR.max_loss(2, B) == pytest.approx(B * math.log(2))
+    # Buying one outcome without limit costs at most max_loss less than the shares pay out
+    q = [0.0, 0.0, 0.0]
+    shares = 10 * B
+    assert shares - LMSR.cost_to_buy(q, B, 0, shares) <= LMSR.max_loss(3, B)
@@ -0,0 +1,67 @@
+"""The event loop watchdog: lag measured on the loop, stalls caught from its helper thread."""
+import asyncio
+import time
+
+from helpers.LoopWatchdog import LOOP_STALLS, LoopWatchdog
+
+
+def block_the_loop(seconds):
+    time.sleep(seconds)
+
+
+def test_a_blocked_loop_is_reported_with_what_blocked_it():
+    async def blocking_task():
+        block_the_loop(0.4)
+
+    async def scenario():
+        watchdog = LoopWatchdog(interval=0.02, threshold=0.1)
+        stalls = LOOP_STALLS.labels().value
+        watchdog.start()
+        try:
+            await asyncio.sleep(0.1)
+            await asyncio.create_task(blocking_task(), name="blocker")
+            await asyncio.sleep(0.1)
+        finally:
+            await watchdog.stop()
+        return watchdog, LOOP_STALLS.labels().value - stalls
+
+    watchdog, counted = asyncio.run(scenario())
+    assert counted == 1
+    [stall] = watchdog.stalls
+    assert 0.3 <= stall.duration < 1.0
+    assert watchdog.max_lag == stall.duration
+    # The helper thread caught the loop thread inside the blocking call
+    assert stall.task.startswith("blocker")
+    assert "block_the_loop" in stall.stack
+
+
+def test_short_lag_is_measured_but_not_a_stall():
+    async def scenario():
+        watchdog = LoopWatchdog(interval=0.02, threshold=0.2)
+        watchdog.start()
+        try:
+            await asyncio.sleep(0.05)
+            block_the_loop(0.06)
+            await asyncio.sleep(0.05)
+        finally:
+            await watchdog.stop()
+        return watchdog
+
+    watchdog = asyncio.run(scenario())
+    assert not watchdog.stalls
+    assert 0.03 <= watchdog.max_lag < 0.2
+    assert watchdog._pending is None
+
+
+def test_stop_ends_the_task_and_the_thread():
+    async def scenario():
+        watchdog = LoopWatchdog(interval=0.02, threshold=0.1)
+        watchdog.start()
+        thread = watchdog._thread
+        await asyncio.sleep(0.05)
+        await watchdog.stop()
+        return watchdog, thread
+
+    watchdog, thread = asyncio.run(scenario())
+    assert not thread.is_alive()
+    assert watchdog._task is None and watchdog._thread is None
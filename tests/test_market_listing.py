@@ -0,0 +1,78 @@
+"""The shared /list_predictions listing stays identical to one built from scratch while only touching what changed."""
+import asyncio
+import datetime
+import random
+
+from tests.support import economy, new_market
+
+
+async def refreshed_with_rebuild(cog):
+    """Refresh the cog's listing and build another from scratch at the same moment."""
+    from cogs.economy import MarketListing
+
+    while True:
+        await cog.listing.refresh()
+        listing = MarketListing(cog)
+        cog.markets.on_change = cog.listing.mark_changed  # Keep change tracking with the cog's listing
+        await listing.refresh()
+        # A market may have closed in between; then try again
+        if not cog.listing.stale():
+            return listing
+
+
+def test_incremental_refresh_matches_a_rebuild(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        rng = random.Random(3)
+        # Half the markets close during the run and move from the active to the pending section
+        markets = [
+            await new_market(cog, ends_in=datetime.timedelta(days=1) if i % 2 else datetime.timedelta(seconds=rng.uniform(0.05, 0.6)))
+            for i in range(60)
+        ]
+        await cog.listing.refresh()
+
+        for step in range(40):
+            await asyncio.sleep(0.02)
+            prediction = rng.choice(markets)
+            roll = rng.random()
+            if roll < 0.7:
+                prediction.apply_bets([(rng.randint(1, 50), rng.choice(prediction.options), rng.randint(10, 5000))])
+            elif roll < 0.85 and not prediction.resolved:
+                await prediction.async_resolve(prediction.options[0])
+            else:
+                markets.append(await new_market(cog))
+            expected = await refreshed_with_rebuild(cog)
+            listing = cog.listing
+            assert listing.rows == expected.rows
+            assert listing.pager.pages() == expected.pager.pages()
+            for page in range(listing.page_count):
+                assert listing.page(page) == expected.page(page)
+                assert listing.page_key(page) == expected.page_key(page)
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
+
+
+def test_bet_renders_only_its_market(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        markets = [await new_market(cog) for _ in range(50)]
+        await cog.listing.refresh()
+
+        rendered = []
+        get_name = cog.users.get_name
+
+        async def counting(user_id):
+            rendered.append(user_id)  # Once per rendered field
+            return await get_name(user_id)
+
+        cog.users.get_name = counting
+        markets[17].apply_bets([(10, "Yes", 100)])
+        assert cog.listing.stale()
+        await cog.listing.refresh()
+        assert len(rendered) == 1
+        assert cog.listing.fields[markets[17].id][0] == markets[17].version
+        assert not cog.listing.stale()
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
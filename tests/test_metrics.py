@@ -0,0 +1,110 @@
+"""The metrics registry and its Prometheus text exposition."""
+import asyncio
+import socket
+
+import aiohttp
+import pytest
+
+from helpers.Metrics import CONTENT_TYPE, MetricsRegistry, MetricsServer
+
+
+def test_counters_and_gauges_render_in_the_exposition_format():
+    registry = MetricsRegistry()
+    bets = registry.counter("bets_total", "Bets placed", ("outcome",))
+    bets.labels("ok").inc()
+    bets.labels("ok").inc(2)
+    bets.labels("refused").inc()
+    registry.gauge("queue_depth", "Bets waiting").set(4)
+    registry.gauge("markets", "Markets by status", ("status",), function=lambda: [((0,), 3), ((1,), 5)])
+
+    assert registry.render() == (
+        "# HELP bets_total Bets placed\n"
+        "# TYPE bets_total counter\n"
+        'bets_total{outcome="ok"} 3\n'
+        'bets_total{outcome="refused"} 1\n'
+        "# HELP queue_depth Bets waiting\n"
+        "# TYPE queue_depth gauge\n"
+        "queue_depth 4\n"
+        "# HELP markets Markets by status\n"
+        "# TYPE markets gauge\n"
+        'markets{status="0"} 3\n'
+        'markets{status="1"} 5\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative_and_end_at_inf():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", ("op",), buckets=(0.1, 0.01, 1.0))
+    for value in (0.005, 0.01, 0.5, 3.0):
+        latency.labels("bet").observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines == [
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{op="bet",le="0.01"} 2',
+        'latency_seconds_bucket{op="bet",le="0.1"} 2',
+        'latency_seconds_bucket{op="bet",le="1.0"} 3',
+        'latency_seconds_bucket{op="bet",le="+Inf"} 4',
+        'latency_seconds_sum{op="bet"} 3.515',
+        'latency_seconds_count{op="bet"} 4',
+    ]
+
+
+def test_help_and_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter("errors_total", "Errors by message\nwith a \\ in it", ("message",)).labels('said "no"\n').inc()
+    assert registry.render().splitlines() == [
+        "# HELP errors_total Errors by message\\nwith a \\\\ in it",
+        "# TYPE errors_total counter",
+        'errors_total{message="said \\"no\\"\\n"} 1',
+    ]
+
+
+def test_a_failing_gauge_callback_drops_only_its_samples():
+    registry = MetricsRegistry()
+    registry.gauge("broken", "Raises", function=lambda: 1 / 0)
+    registry.gauge("fine", "Works", function=lambda: 2.5)
+    assert registry.render().splitlines() == [
+        "# HELP broken Raises",
+        "# TYPE broken gauge",
+        "# HELP fine Works",
+        "# TYPE fine gauge",
+        "fine 2.5",
+    ]
+
+
+def test_registering_a_name_again_returns_the_same_metric():
+    registry = MetricsRegistry()
+    counter = registry.counter("reloads_total", "Reloads")
+    counter.inc()
+    assert registry.counter("reloads_total", "Reloads") is counter
+    with pytest.raises(ValueError):
+        registry.gauge("reloads_total", "Reloads")
+    with pytest.raises(ValueError):
+        registry.counter("reloads_total", "Reloads", ("cog",))
+    with pytest.raises(ValueError):
+        registry.counter("labelled_total", "Labelled", ("a", "b")).labels("only one")
+
+
+def test_server_serves_the_registry():
+    registry = MetricsRegistry()
+    registry.counter("scrapes_total", "Scrapes").inc()
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    async def scenario():
+        server = MetricsServer(registry, port=port)
+        await server.start()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as response:
+                    return response.status, response.headers["Content-Type"], await response.text()
+        finally:
+            await server.stop()
+
+    status, content_type, body = asyncio.run(scenario())
+    assert status == 200
+    assert content_type == CONTENT_TYPE
+    assert body == registry.render()
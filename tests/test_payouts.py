@@ -0,0 +1,47 @@
+"""compute_payouts: winners split the pool by stake, exactly and to the point."""
+import numpy as np
+
+from helpers.Payouts import compute_payouts
+
+
+def test_pool_is_paid_out_in_full_and_in_proportion():
+    stakes = [100, 250, 333, 1, 7]
+    pool = 10_001
+    table = compute_payouts(np.arange(len(stakes)), stakes, pool)
+    assert table.total == pool
+    total = sum(stakes)
+    for stake, payout in zip(stakes, table.payouts.tolist()):
+        assert abs(payout - stake * pool / total) < 1
+
+
+def test_leftover_points_go_to_the_largest_remainders():
+    # 10 / 3 each leaves 1 point over; the tie goes to the first position
+    table = compute_payouts([5, 6, 7], [1, 1, 1], 10)
+    assert table.payouts.tolist() == [4, 3, 3]
+    # 7 * 2 / 5 = 2.8 beats 3 * 2 / 5 = 1.2 for the spare point
+    table = compute_payouts([1, 2], [3, 7], 4)
+    assert table.payouts.tolist() == [1, 3]
+
+
+def test_rows_and_lookup_by_user():
+    table = compute_payouts([10, 20], [30, 10], 80)
+    assert list(table.rows()) == [(10, 30, 60), (20, 10, 20)]
+    assert table.for_user(20) == 20
+    assert table.for_user(99) == 0
+    assert len(table) == 2
+
+
+def test_nothing_to_split():
+    assert compute_payouts([1, 2], [0, 0], 100).payouts.tolist() == [0, 0]
+    assert compute_payouts([1, 2], [5, 5], 0).payouts.tolist() == [0, 0]
+    assert len(compute_payouts([], [], 100)) == 0
+
+
+def test_amounts_too_big_for_int64_products_stay_exact():
+    stakes = [2 ** 40, 3 * 2 ** 40 + 1, 12345]
+    pool = 2 ** 62 + 17
+    table = compute_payouts([1, 2, 3], stakes, pool)
+    assert table.total == pool
+    total = sum(stakes)
+    for stake, payout in zip(stakes, table.payouts.tolist()):
+        assert abs(payout - stake * pool // total) <= 1
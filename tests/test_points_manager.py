@@ -0,0 +1,130 @@
+"""The DRIP client's retries, circuit breaker and dead letters, against the fake DRIP server."""
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.fake_drip import TIMEOUT
+from helpers import SimplePointsManager
+from helpers.SimplePointsManager import CircuitBreaker
+from tests.support import run_with_client
+
+USER = 42
+
+
+def test_transient_errors_are_retried(drip):
+    drip.inject(503, 502)
+
+    async def scenario(points_manager):
+        assert await points_manager.add_points(USER, 50)
+
+    run_with_client(drip, scenario)
+    assert drip.requests["token_balance"] == 3
+    assert drip.balances[USER] == 1050
+
+
+def test_timeout_is_retried_with_the_same_key(drip):
+    drip.inject(TIMEOUT)
+
+    async def scenario(points_manager):
+        assert await points_manager.transfer_points(USER, 7, 100, idempotency_key="bet:1")
+
+    run_with_client(drip, scenario)
+    assert drip.requests["transfer"] == 2
+    assert drip.balances[USER] == 900
+    assert drip.balances[7] == 1100
+
+
+def test_retry_after_is_honoured(drip):
+    drip.inject((429, 0.3))
+
+    async def scenario(points_manager):
+        started = time.perf_counter()
+        assert await points_manager.add_points(USER, 5)
+        return time.perf_counter() - started
+
+    assert run_with_client(drip, scenario) >= 0.3
+    assert drip.requests["token_balance"] == 2
+
+
+def test_client_errors_are_not_retried(drip):
+    async def scenario(points_manager):
+        assert not await points_manager.remove_points(USER, 5000, dead_letter=True)
+        assert not points_manager.dead_letters
+
+    run_with_client(drip, scenario)
+    assert drip.requests["token_balance"] == 1
+
+
+def test_breaker_opens_then_probes_and_closes(drip):
+    drip.inject(503, 503)
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+
+    async def scenario(points_manager):
+        assert not await points_manager.add_points(USER, 10)
+        assert breaker.state == "open"
+        sent = drip.requests["token_balance"]
+        # Refused without a request while open
+        assert not await points_manager.add_points(USER, 10)
+        assert drip.requests["token_balance"] == sent
+
+        await asyncio.sleep(0.25)
+        assert breaker.state == "half-open"
+        assert await points_manager.add_points(USER, 10)
+        assert breaker.state == "closed"
+
+    run_with_client(drip, scenario, breaker)
+    assert drip.balances[USER] == 1010
+
+
+def test_cancelled_probe_does_not_wedge_breaker(drip):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+
+    async def scenario(points_manager):
+        breaker.record_failure()
+        await asyncio.sleep(0.15)
+        drip.inject(TIMEOUT)
+        probe = asyncio.create_task(points_manager.add_points(USER, 10))
+        await asyncio.sleep(0.05)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        # The next request gets to probe instead of being refused forever
+        assert await points_manager.add_points(USER, 10)
+        assert breaker.state == "closed"
+
+    run_with_client(drip, scenario, breaker)
+    assert drip.balances[USER] == 1010
+
+
+def test_dead_letters_replay_once(drip):
+    drip.inject(*[503] * SimplePointsManager.MAX_ATTEMPTS)
+    replayed = []
+
+    async def scenario(points_manager):
+        assert not await points_manager.add_points(USER, 25, idempotency_key="payout:1", dead_letter=True)
+        assert len(points_manager.dead_letters) == 1
+        points_manager.dead_letters[0].on_replayed = lambda: replayed.append(True)
+        assert await points_manager.replay_dead_letters() == 1
+        assert not points_manager.dead_letters
+        # Replaying the same key again is dropped by DRIP
+        assert await points_manager.add_points(USER, 25, idempotency_key="payout:1")
+
+    run_with_client(drip, scenario)
+    assert replayed == [True]
+    assert drip.balances[USER] == 1025
+
+
+def test_dead_lettered_transfers_replay_as_transfers(drip):
+    drip.inject(*[503] * SimplePointsManager.MAX_ATTEMPTS)
+    bot = 7
+
+    async def scenario(points_manager):
+        assert not await points_manager.transfer_points(bot, USER, 100, idempotency_key="bet-refund:1")
+        points_manager.dead_letter(USER, 100, "bet-refund:1", from_user_id=bot)
+        assert await points_manager.replay_dead_letters() == 1
+
+    run_with_client(drip, scenario)
+    # The refund moved the bot's points back; none were created
+    assert drip.balances == {bot: 900, USER: 1100}
+    assert drip.requests["token_balance"] == 0
@@ -0,0 +1,54 @@
+"""PositionBook: one row per bettor, running totals, and the hash table over user ids."""
+import math
+
+from helpers.PositionBook import PositionBook
+
+
+def test_top_ups_stay_in_one_row():
+    book = PositionBook()
+    assert book.add(7, 100, 2.5) is True
+    assert book.add(8, 50, 1.0) is True
+    assert book.add(7, 25, 0.5) is False
+    assert len(book) == 2
+    assert book.get(7) == (125, 3.0)
+    assert book.get(8) == (50, 1.0)
+    assert book.get(9) is None
+    assert 7 in book and 9 not in book
+    assert list(book) == [(7, 125, 3.0), (8, 50, 1.0)]
+    assert (book.total_amount, book.total_shares) == (175, 4.0)
+
+
+def test_lookups_survive_table_growth_and_collisions():
+    book = PositionBook()
+    # Multiples of a power of two share their low bits, so they probe into each other
+    user_ids = [i << 20 for i in range(1, 2000)] + list(range(1, 2000))
+    for i, user_id in enumerate(user_ids):
+        book.add(user_id, i + 1, 0.1)
+    for i, user_id in enumerate(user_ids):
+        book.add(user_id, 1, 0.1)
+    assert len(book) == len(user_ids)
+    for i, user_id in enumerate(user_ids):
+        amount, shares = book.get(user_id)
+        assert amount == i + 2
+        assert math.isclose(shares, 0.2)
+    assert book.get(0) is None
+
+
+def test_running_totals_match_a_recount():
+    book = PositionBook()
+    for user_id in range(500):
+        book.add(user_id % 97, user_id, user_id / 3)
+    volume, shares = book.recount()
+    assert volume == book.total_amount
+    assert math.isclose(shares, book.total_shares)
+
+
+def test_columns_are_copies_that_do_not_block_adds():
+    book = PositionBook()
+    book.add(1, 10, 1.5)
+    user_ids, amounts, shares = book.columns()
+    book.add(2, 20, 2.5)
+    assert user_ids.tolist() == [1]
+    assert amounts.tolist() == [10]
+    assert shares.tolist() == [1.5]
+    assert [column.tolist() for column in book.columns()] == [[1, 2], [10, 20], [1.5, 2.5]]
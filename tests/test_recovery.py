@@ -0,0 +1,137 @@
+"""Crash recovery: the store snapshot plus the event log after its checkpoint."""
+import asyncio
+
+from helpers.EventLog import EventLog, read_events
+from tests.support import crash, economy, new_market
+
+
+def test_store_checkpoint_never_passes_durable_log(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        prediction = await new_market(cog)
+        prediction.apply_bets([(10, "Yes", 100), (11, "No", 50)])
+        # The log writer has not run yet; the flush has to wait for it
+        await cog.store.flush()
+        assert cog.store.checkpoint_seq == cog.events.last_seq
+        assert cog.events.durable_seq >= cog.store.checkpoint_seq
+        await crash(cog)
+
+    asyncio.run(scenario())
+
+
+def test_acknowledged_bets_survive_repeated_crashes(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        prediction = await new_market(cog)
+        market_id = prediction.id
+        acknowledged = 0
+        for round in range(3):
+            prediction = cog.markets.get(market_id)
+            for user in range(3):
+                shares = await prediction.place_bet(100 * round + user, "Yes", 50)
+                assert shares > 0
+                # What the bet modal does before it tells the user the bet went through
+                await cog.events.sync()
+                acknowledged += 50
+            # Checkpoint part of the way through, then place one bet that is never acknowledged
+            await cog.store.flush()
+            prediction.apply_bets([(999, "No", 10)])
+            await crash(cog)
+            cog = await economy(tmp_path)
+            assert cog.markets.get(market_id).total_bets in (acknowledged, acknowledged + 10)
+            acknowledged = cog.markets.get(market_id).total_bets
+
+        seqs = [event['seq'] for event in read_events(str(tmp_path / "events"))]
+        assert seqs == sorted(set(seqs))
+        assert cog.events.last_seq >= cog.store.checkpoint_seq
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
+
+
+def test_log_continues_after_store_checkpoint(tmp_path):
+    async def scenario():
+        log = EventLog(str(tmp_path))
+        await log.open()
+        log.append('bet', market=1)
+        await log.close()
+
+        # The store has seen events up to 7 that never reached this log
+        log = EventLog(str(tmp_path))
+        await log.open(min_seq=7)
+        assert log.append('bet', market=1) == 8
+        await log.sync()
+        await log.close()
+        assert [event['seq'] for event in read_events(str(tmp_path))] == [1, 8]
+
+    asyncio.run(scenario())
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    async def scenario():
+        log = EventLog(str(tmp_path))
+        await log.open()
+        for _ in range(3):
+            log.append('bet', market=1)
+        await log.close()
+        path = tmp_path / "events-000000000001.jsonl"
+        with open(path, 'ab') as f:
+            f.write(b'{"seq":4,"ty')
+
+        log = EventLog(str(tmp_path))
+        await log.open()
+        assert log.last_seq == 3
+        log.append('bet', market=1)
+        await log.close()
+        assert [event['seq'] for event in read_events(str(tmp_path))] == [1, 2, 3, 4]
+
+    asyncio.run(scenario())
+
+
+def test_new_markets_wait_for_a_flush_in_progress(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        first = await new_market(cog)
+        async with cog.store._flush_lock:
+            # A commit here would take along whatever the flush had written so far
+            insert = asyncio.ensure_future(new_market(cog))
+            await asyncio.sleep(0.05)
+            assert not insert.done()
+        second = await insert
+        assert second.id == first.id + 1
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
+
+
+def test_settlement_plan_commits_with_the_pending_state(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        prediction = await new_market(cog)
+        prediction.apply_bets([(10, "Yes", 100), (11, "No", 50)])
+        prediction.resolved = True
+        prediction.result = "Yes"
+        cog.store.mark_market_dirty(prediction)
+
+        commits = []
+        commit = cog.store.db.commit
+
+        async def counting_commit():
+            commits.append(cog.store.pending_writes)
+            await commit()
+
+        cog.store.db.commit = counting_commit
+        await cog.store.plan_settlement(prediction.id, [(10, 'payout', 100, 150), (11, 'loss', 50, 0)])
+        # The plan, the market state and the checkpoint went in one commit
+        assert len(commits) == 1
+        assert cog.store.pending_writes == 0
+        assert cog.store.checkpoint_seq == cog.events.last_seq
+        await crash(cog)
+
+        cog = await economy(tmp_path)
+        rows = await cog.store.load_unfinished_settlements()
+        assert [(row['user_id'], row['kind'], row['result']) for row in rows] == [(10, 'payout', "Yes"), (11, 'loss', "Yes")]
+        assert cog.markets.get(prediction.id).total_bets == 150
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+"""Resolution votes settle a market exactly once, and credits are committed before they count."""
+import asyncio
+import datetime
+
+from benchmarks.fake_discord import CallLog, FakeChannel, FakeInteraction, FakeMember
+from tests.support import economy, new_market
+
+
+async def closed_market(cog):
+    prediction = await new_market(cog)
+    prediction.apply_bets([(10, "Yes", 100), (11, "No", 300), (12, "Yes", 50)])
+    prediction.end_time = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    return prediction
+
+
+def test_concurrent_votes_resolve_once(tmp_path):
+    from cogs.economy import RESOLUTION_VOTES, RESOLVER_ROLE_IDS, VoteButton
+
+    async def scenario():
+        cog = await economy(tmp_path)
+        prediction = await closed_market(cog)
+        settled = []
+        settle = cog.settlement.settle
+
+        async def counting_settle(market, entries):
+            settled.append(market.id)
+            await settle(market, entries)
+
+        cog.settlement.settle = counting_settle
+        calls = CallLog()
+        channel = FakeChannel(calls)
+        clicks = [
+            FakeInteraction(cog.bot, FakeMember(100 + i, calls, RESOLVER_ROLE_IDS), channel)
+            for i in range(RESOLUTION_VOTES + 2)
+        ]
+        # Every click is in flight at once, so several see the threshold reached
+        await asyncio.gather(*(VoteButton(prediction.id, 0, "Yes").callback(click) for click in clicks))
+
+        assert settled == [prediction.id]
+        assert prediction.result == "Yes"
+        assert calls.for_op("background")["channel.send"] == 1
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
+
+
+def test_resolving_twice_is_a_no_op(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        prediction = await closed_market(cog)
+        assert await prediction.async_resolve("Yes")
+        assert not await prediction.async_resolve("No")
+        assert prediction.result == "Yes"
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
+
+
+def test_credits_are_committed_before_they_count(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        prediction = await closed_market(cog)
+        await prediction.async_resolve("Yes")
+        while cog.settlement.progress[prediction.id]['credited'] < cog.settlement.progress[prediction.id]['total']:
+            await asyncio.sleep(0.01)
+        # Everything counted as credited is already marked in the database, not just queued
+        assert not cog.store._credited
+        async with cog.store.db.execute(
+            "SELECT user_id, kind, credited FROM settlements WHERE market_id = ? ORDER BY user_id", (prediction.id,)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        assert rows == [(10, 'payout', 1), (11, 'loss', 1), (12, 'payout', 1)]
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
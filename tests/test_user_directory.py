@@ -0,0 +1,88 @@
+"""UserDirectory: gateway cache first, then an LRU with TTL, and one REST call per id at a time."""
+import asyncio
+import types
+
+import discord
+
+from benchmarks.stubs import StubBot, StubUser
+from helpers.UserDirectory import UserDirectory
+
+MISSING = 404
+
+
+class CountingBot(StubBot):
+    """Counts fetch_user calls; ids in ``missing`` are not found, as for a deleted account."""
+
+    def __init__(self, missing=(), cached=()):
+        super().__init__()
+        self.fetches = 0
+        self.missing = set(missing)
+        self.cached = {user_id: StubUser(user_id) for user_id in cached}
+
+    def get_user(self, user_id):
+        return self.cached.get(user_id)
+
+    async def fetch_user(self, user_id):
+        self.fetches += 1
+        await asyncio.sleep(0.01)
+        if user_id in self.missing:
+            raise discord.NotFound(types.SimpleNamespace(status=MISSING, reason="Not Found"), "Unknown User")
+        return StubUser(user_id)
+
+
+def test_concurrent_lookups_of_one_id_make_one_fetch():
+    async def scenario():
+        bot = CountingBot()
+        users = UserDirectory(bot)
+        found = await asyncio.gather(*(users.get_user(7) for _ in range(50)))
+        assert {user.id for user in found} == {7}
+        assert bot.fetches == 1
+        assert await users.get_name(7) == "user7"
+        assert bot.fetches == 1
+
+    asyncio.run(scenario())
+
+
+def test_gateway_cache_needs_no_fetch():
+    async def scenario():
+        bot = CountingBot(cached=[3])
+        users = UserDirectory(bot)
+        assert (await users.get_user(3)).id == 3
+        assert users.get_cached(3).id == 3
+        assert bot.fetches == 0
+
+    asyncio.run(scenario())
+
+
+def test_missing_users_are_cached_for_a_short_time():
+    async def scenario():
+        bot = CountingBot(missing=[9])
+        users = UserDirectory(bot, missing_ttl=0.1)
+        results = await asyncio.gather(*(users.get_user(9) for _ in range(10)))
+        assert results == [None] * 10
+        for _ in range(5):
+            assert await users.get_name(9) == "9"
+        assert users.get_cached(9) is None
+        assert bot.fetches == 1
+        await asyncio.sleep(0.15)
+        assert await users.get_user(9) is None
+        assert bot.fetches == 2
+
+    asyncio.run(scenario())
+
+
+def test_entries_expire_and_the_oldest_are_evicted():
+    async def scenario():
+        bot = CountingBot()
+        users = UserDirectory(bot, ttl=0.1, max_size=2)
+        for user_id in (1, 2, 1, 3):
+            await users.get_user(user_id)
+        assert bot.fetches == 3
+        # 2 was the least recently used when 3 came in
+        await users.get_user(2)
+        assert bot.fetches == 4
+        await asyncio.sleep(0.15)
+        await users.get_user(3)
+        assert bot.fetches == 5
+
+    asyncio.run(scenario())
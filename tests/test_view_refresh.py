@@ -0,0 +1,105 @@
+"""The refresh hub's render passes, and list pages only re-rendering when their own contents change."""
+import asyncio
+
+from benchmarks.fake_discord import CallLog, FakeChannel, FakeInteraction, FakeMember, FakeMessage
+from tests.support import economy, new_market
+
+
+async def list_panel(cog, page, channel):
+    from cogs.economy import MarketListPanel
+
+    panel = MarketListPanel(cog, page)
+    edit = await panel.render()
+    panel.stored_interaction = FakeMessage(channel)
+    cog.refresh_hub.subscribe(panel, sent=edit)
+    return panel
+
+
+def test_bet_only_refreshes_its_own_page(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        await cog.refresh_hub.stop()  # Passes are driven by hand below
+        for _ in range(40):
+            await new_market(cog)
+        await cog.listing.refresh()
+        assert cog.listing.page_count > 2
+
+        channel = FakeChannel(CallLog())
+        first = [await list_panel(cog, 0, channel) for _ in range(3)]
+        last = [await list_panel(cog, cog.listing.page_count - 1, channel) for _ in range(3)]
+
+        # Bet on a market shown on the last page only
+        start, stop = cog.listing.pager.page(cog.listing.page_count - 1)
+        target = cog.markets.get(cog.listing.rows[start])
+        target.apply_bets([(10, "Yes", 100)])
+        misses = cog.render_cache.misses
+        await cog.refresh_hub._render_changed()
+
+        edited = {message.id for message, _, _ in cog.refresh_hub._pending_edits.values()}
+        assert edited == {panel.stored_interaction.id for panel in last}
+        # The three panels on the changed page share one new render
+        assert cog.render_cache.misses == misses + 1
+        assert all(cog.refresh_hub._subscriptions[panel.stored_interaction.id].last_key == panel.render_key() for panel in first + last)
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
+
+
+def test_render_pass_yields_between_subscriptions(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        await cog.refresh_hub.stop()
+        await new_market(cog)
+        channel = FakeChannel(CallLog())
+        for _ in range(50):
+            await list_panel(cog, 0, channel)
+        cog.markets.get(1).apply_bets([(10, "Yes", 100)])
+
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        ticks = 0
+        await cog.refresh_hub._render_changed()
+        task.cancel()
+        assert ticks >= 50
+        await cog.cog_unload()
+
+    asyncio.run(scenario())
+
+
+def test_a_bet_while_the_list_message_is_sent_is_not_missed(tmp_path):
+    async def scenario():
+        cog = await economy(tmp_path)
+        await cog.refresh_hub.stop()
+        prediction = await new_market(cog)
+        calls = CallLog()
+        interaction = FakeInteraction(cog.bot, FakeMember(5, calls), FakeChannel(calls))
+        send = interaction.followup.send
+
+        async def send_during_a_bet(*args, **kwargs):
+            # The panel has rendered; the bet lands before the hub subscribes it
+            prediction.apply_bets([(10, "Yes", 100)])
+            return await send(*args, **kwargs)
+
+        interaction.followup.send = send_during_a_bet
+        await cog.list_predictions.callback(cog, interaction)
+        [(message_id, subscription)] = cog.refresh_hub._subscriptions.items()
+        assert cog.listing.stale()
+
+        await cog.refresh_hub._render_changed()
+        assert list(cog.refresh_hub._pending_edits) == [message_id]
+        assert subscription.last_key == subscription.view.render_key() is not None
+        # Nothing changed since: the next pass leaves the message alone
+        cog.refresh_hub._pending_edits.clear()
+        await cog.refresh_hub._render_changed()
+        assert not cog.refresh_hub._pending_edits
+        await cog.cog_unload()
+
+    asyncio.run(scenario())